@@ -5,6 +5,7 @@ Adapted to load sensitive values from environment variables (.env).
 """
 
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -19,6 +20,8 @@ load_dotenv(dotenv_path)
 SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY", "unsafe-default-secret-change-me")
 DEBUG = os.environ.get("DJANGO_DEBUG", "False").lower() in ("1", "true", "yes")
 ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "").split(",") if os.environ.get("DJANGO_ALLOWED_HOSTS") else []
+# manage.py test (the test runner forces DEBUG off, so settings that follow DEBUG check this too)
+TESTING = sys.argv[1:2] == ['test']
 
 # Application definition
 INSTALLED_APPS = [
@@ -33,19 +36,24 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # first, so its timings and query counts cover the rest of the stack
+    'hrapp.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # read-your-writes: pins a client to the primary after it writes (hrapp.routing)
+    'hrapp.routing.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'MajorProjectUpgrade.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for hrapp.profiling
+        'BACKEND': 'hrapp.profiling.ProfilingDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,6 +81,28 @@ DATABASES = {
     }
 }
 
+# Read replica for the reporting views (hrapp.routing). Enabled by setting
+# DB_REPLICA_HOST and/or DB_REPLICA_NAME; the other connection settings default
+# to the primary's. Reads fall back to the primary when the replica lags by
+# more than REPLICA_MAX_LAG_SECONDS (checked every REPLICA_CHECK_SECONDS), and
+# for REPLICA_PIN_SECONDS after a client writes.
+REPLICA_DB_ALIAS = 'replica'
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES[REPLICA_DB_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASS', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # tests read the test primary through this alias
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['hrapp.routing.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', 5))
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
 
 # Email (use environment variables)
 EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
@@ -83,6 +113,11 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() in ("1", "true", "yes")
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Broadcast notifications: messages per SMTP batch, send rate cap and retries
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 50))
+NOTIFICATION_RATE_PER_MINUTE = int(os.environ.get('NOTIFICATION_RATE_PER_MINUTE', 600))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 3))
+
 
 # Static & media
 STATIC_URL = '/static/'
@@ -90,6 +125,67 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Reports: worker processes used to render PDF report charts in parallel
+REPORT_CHART_WORKERS = int(os.environ.get('REPORT_CHART_WORKERS', 4))
+# matplotlib/pandas/reportlab load on the first chart or report; set on a dedicated
+# reporting worker pool to import them at startup instead
+REPORTING_PRELOAD = os.environ.get('REPORTING_PRELOAD', 'False').lower() in ("1", "true", "yes")
+
+# Admin bulk account actions: selections above the limit run in the background
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+ADMIN_BULK_SYNC_LIMIT = int(os.environ.get('ADMIN_BULK_SYNC_LIMIT', 200))
+# generated credential CSVs: kept outside MEDIA_ROOT (never served), deleted on
+# download or after the TTL, whichever comes first
+PRIVATE_STORAGE_ROOT = os.environ.get('PRIVATE_STORAGE_ROOT', str(BASE_DIR / 'private'))
+CREDENTIAL_EXPORT_TTL_MINUTES = int(os.environ.get('CREDENTIAL_EXPORT_TTL_MINUTES', 60))
+
+# Attendance analytics: shift start for lateness (local time), grace period, result cache TTL
+SHIFT_START = os.environ.get('SHIFT_START', '09:00')
+LATE_GRACE_MINUTES = int(os.environ.get('LATE_GRACE_MINUTES', 5))
+ATTENDANCE_ANALYTICS_CACHE_SECONDS = int(os.environ.get('ATTENDANCE_ANALYTICS_CACHE_SECONDS', 300))
+
+# Employee import: worker processes computing face encodings for enrollment photos
+FACE_ENCODING_WORKERS = int(os.environ.get('FACE_ENCODING_WORKERS', os.cpu_count() or 2))
+
+# Camera footage analytics (manage.py analyze_videos): worker processes, YOLO weights
+# (person detector, optional helmet detector), every Nth frame analysed, and the
+# counting line as a fraction of frame height
+VIDEO_ANALYTICS_DIR = os.environ.get('VIDEO_ANALYTICS_DIR', str(BASE_DIR / 'hrapp' / 'static' / 'videos'))
+VIDEO_ANALYTICS_WORKERS = int(os.environ.get('VIDEO_ANALYTICS_WORKERS', os.cpu_count() or 2))
+VIDEO_PERSON_MODEL = os.environ.get('VIDEO_PERSON_MODEL', 'yolov8n.pt')
+VIDEO_HELMET_MODEL = os.environ.get('VIDEO_HELMET_MODEL', '')
+VIDEO_SAMPLE_EVERY = int(os.environ.get('VIDEO_SAMPLE_EVERY', 5))
+VIDEO_COUNT_LINE = float(os.environ.get('VIDEO_COUNT_LINE', 0.5))
+
+# Kiosk: bearer token the kiosk presents to fetch the face gallery (/data/faces/)
+KIOSK_API_TOKEN = os.environ.get('KIOSK_API_TOKEN', '')
+# gallery versions handed out stay behind encodings younger than this (stamps commit out of order)
+FACE_GALLERY_SETTLE_SECONDS = int(os.environ.get('FACE_GALLERY_SETTLE_SECONDS', 60))
+
+# Kiosk ingestion: where attendance-system.py writes its raw attendance rows
+KIOSK_DB_ALIAS = os.environ.get('KIOSK_DB_ALIAS', 'default')
+KIOSK_ATTENDANCE_TABLE = os.environ.get('KIOSK_ATTENDANCE_TABLE', 'attendance')
+# the high-water mark stays behind raw rows younger than this (ids commit out of order)
+KIOSK_INGEST_SETTLE_SECONDS = int(os.environ.get('KIOSK_INGEST_SETTLE_SECONDS', 60))
+# Helmet-violation snapshots: the kiosk's metadata table and its KIOSK_VIOLATIONS_DIR
+KIOSK_VIOLATIONS_TABLE = os.environ.get('KIOSK_VIOLATIONS_TABLE', 'helmet_violations')
+VIOLATION_SNAPSHOT_DIR = os.environ.get('VIOLATION_SNAPSHOT_DIR', str(MEDIA_ROOT / 'violations'))
+
+# Live dashboard counters (hrapp.live): PostgreSQL NOTIFY channel shared with the kiosk
+LIVE_METRICS_CHANNEL = os.environ.get('LIVE_METRICS_CHANNEL', 'hr_live')
+
+# Occupancy time series (hrapp.timeseries, manage.py record_occupancy): how often
+# minute/hour rollups are written, and how long minute rollups are kept
+TIMESERIES_FLUSH_SECONDS = int(os.environ.get('TIMESERIES_FLUSH_SECONDS', 60))
+TIMESERIES_MINUTE_RETENTION_DAYS = int(os.environ.get('TIMESERIES_MINUTE_RETENTION_DAYS', 7))
+
+# Request profiling (hrapp.profiling): Server-Timing header, per-view stats, query budgets.
+# Over-budget views raise instead of logging when strict (default: with DEBUG, and under tests).
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True').lower() in ("1", "true", "yes")
+PROFILING_STRICT_BUDGETS = os.environ.get('PROFILING_STRICT_BUDGETS', str(DEBUG or TESTING)).lower() in ("1", "true", "yes")
+# URL name -> max queries; overrides @query_budget on the view
+PROFILING_QUERY_BUDGETS = {}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -1,12 +1,12 @@
 import sys
 import os
+import json
+import time
 import cv2
 import numpy as np
-import face_recognition
 from datetime import datetime
 import sqlite3
 
-from ultralytics import YOLO
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout,
     QHBoxLayout, QWidget, QTableWidget, QTableWidgetItem, QHeaderView,
@@ -47,6 +47,83 @@ CREATE TABLE IF NOT EXISTS attendance (
 """)
 conn.commit()
 
+# ---------- live dashboard events ----------
+# Sent with NOTIFY on the attendance database; the HR web app listens on
+# the same channel (hrapp.live) and updates its dashboard counters.
+LIVE_CHANNEL = os.environ.get("LIVE_METRICS_CHANNEL", "hr_live")
+CAMERA_NAME = os.environ.get("KIOSK_CAMERA_NAME", "kiosk")
+VIOLATION_REPEAT_SECONDS = 60   # one violation per worker (or stranger's track) per minute
+OCCUPANCY_MIN_INTERVAL = 1.0    # at most one occupancy update per second
+
+
+def notifyLive(event):
+    try:
+        cursor.execute("SELECT pg_notify(%s, %s);", (LIVE_CHANNEL, json.dumps(event)))
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        print("Live event error:", e)
+
+
+# ---------- violation snapshots ----------
+# JPEG evidence of helmet violations, written off the frame loop (see
+# vision.violations); the HR app serves them from VIOLATION_SNAPSHOT_DIR,
+# so point both at the same directory.
+from vision.violations import CREATE_TABLE as CREATE_VIOLATIONS_TABLE, UNRECOGNIZED, ViolationRecorder
+
+VIOLATIONS_DIR = os.environ.get("KIOSK_VIOLATIONS_DIR", "violations")
+cursor.execute(CREATE_VIOLATIONS_TABLE)
+conn.commit()
+
+
+def connectDB():
+    return psycopg2.connect(host=PG_HOST, port=PG_PORT, dbname=PG_DB, user=PG_USER, password=PG_PASS)
+
+
+# ---------- face gallery ----------
+# With KIOSK_GALLERY_URL set (e.g. https://hr.example.com/data/faces/) the
+# kiosk loads pre-computed encodings from the HR server; otherwise it
+# encodes the photos in IMAGES_PATH. Either way changes are picked up in
+# the background every GALLERY_REFRESH_SECONDS without a restart.
+from vision.frames import AllocationMeter, FramePipeline
+from vision.gallery import GalleryWatcher, ImageFolder, ServerGallery
+
+GALLERY_URL = os.environ.get("KIOSK_GALLERY_URL", "")
+GALLERY_TOKEN = os.environ.get("KIOSK_API_TOKEN", "")
+GALLERY_CACHE = os.environ.get("KIOSK_GALLERY_CACHE", "face_gallery.bin")
+GALLERY_REFRESH_SECONDS = float(os.environ.get("KIOSK_GALLERY_REFRESH_SECONDS", "30"))
+IMAGES_PATH = "images"
+
+# ---------- frame buffers ----------
+# KIOSK_FRAME_BUFFERS=0 re-allocates every buffer per frame (the old
+# behaviour); KIOSK_ALLOCATION_STATS=1 prints allocation/timing per frame
+# so the two can be compared.
+FRAME_BUFFERS = os.environ.get("KIOSK_FRAME_BUFFERS", "1") == "1"
+ALLOCATION_STATS = os.environ.get("KIOSK_ALLOCATION_STATS", "0") == "1"
+
+# ---------- inference worker processes ----------
+# KIOSK_INFERENCE_WORKERS=N runs face recognition in N worker processes and
+# helmet detection in KIOSK_DETECTOR_WORKERS more, reading frames from a
+# ring of KIOSK_FRAME_SLOTS shared-memory slots (see vision.inference).
+# 0 (the default) runs both on the UI thread.
+from vision.inference import FaceRecognizer, FrameRing, HelmetDetector, InferencePool
+
+HELMET_MODEL_PATH = r"hemletYoloV8_100epochs.pt"  # where you saved the helmet model
+INFERENCE_WORKERS = int(os.environ.get("KIOSK_INFERENCE_WORKERS", "0"))
+DETECTOR_WORKERS = int(os.environ.get("KIOSK_DETECTOR_WORKERS", "1"))
+FRAME_SLOTS = int(os.environ.get("KIOSK_FRAME_SLOTS", "8"))
+
+# ---------- cross-camera re-identification ----------
+# With KIOSK_REID_ADDRESS (host:port of `python -m vision.reid`) and
+# REID_AUTHKEY set, every confirmed person track gets a site-wide id from
+# the shared gallery, and the dashboard shows deduplicated site occupancy
+# instead of the sum over cameras (see vision.reid).
+from vision.reid import BoxTracker, ReidClient, appearance_embedding, body_box, parse_address
+
+REID_ADDRESS = os.environ.get("KIOSK_REID_ADDRESS", "")
+REID_AUTHKEY = os.environ.get("REID_AUTHKEY", "")
+REID_REFRESH_FRAMES = 10        # re-send a known track's appearance every N frames
+
 
 # ==========================
 # HELPER FUNCTIONS
@@ -54,45 +131,29 @@ conn.commit()
 
 
 # ---------- markAttendance adapted for Postgres ----------
-def markAttendance(name):
+def markAttendance(employeeid):
     """
-    Insert only once per day for a name.
+    Insert only once per day for an employee. The ``name`` column holds the
+    employeeid, which is what hrapp.ingestion resolves first.
     Returns True if a new row was inserted, False otherwise.
     """
-    # Check if a record exists for this name today
+    # Check if a record exists for this employee today
     cursor.execute(
         "SELECT 1 FROM attendance WHERE name = %s AND DATE(time) = CURRENT_DATE LIMIT 1;",
-        (name,)
+        (employeeid,)
     )
     record = cursor.fetchone()
     if record is None:
         # Insert new attendance with current timestamp
         cursor.execute(
             "INSERT INTO attendance (name, time) VALUES (%s, NOW()) RETURNING id;",
-            (name,)
+            (employeeid,)
         )
         conn.commit()
         return True
     return False
 
 
-def loadImages(path):
-    images = []
-    classNames = []
-    if not os.path.isdir(path):
-        print(f"[WARN] Images folder '{path}' not found.")
-        return images, classNames
-
-    for cl in os.listdir(path):
-        cur_path = os.path.join(path, cl)
-        img = cv2.imread(cur_path)
-        if img is None:
-            continue
-        images.append(img)
-        classNames.append(os.path.splitext(cl)[0])
-    return images, classNames
-
-
 # ==========================
 # MAIN APPLICATION
 # ==========================
@@ -106,25 +167,41 @@ class AttendanceSystem(QMainWindow):
         self.timer.timeout.connect(self.updateFrame)
         self.cap = cv2.VideoCapture(0)
 
-        # ---- YOLO helmet model ----
-        # Change this to where you saved hemletYoloV8_100epochs.pt
-        model_path = r"hemletYoloV8_100epochs.pt"
-        self.helmet_model = YOLO(model_path)
-        print("Helmet model classes:", self.helmet_model.names)
-
-        # auto-detect helmet class ids (class names containing 'helmet')
-        self.HELMET_CLASS_IDS = [
-            i for i, n in self.helmet_model.names.items()
-            if "helmet" in str(n).lower()
-        ]
-        if not self.HELMET_CLASS_IDS:
-            # fallback: treat all classes as helmet
-            self.HELMET_CLASS_IDS = list(self.helmet_model.names.keys())
-        print("Using helmet class ids:", self.HELMET_CLASS_IDS)
+        # ---- YOLO helmet model and face recognition ----
+        # in this process, or in worker processes fed through shared memory
+        self.pool = None
+        self.ring = None
+        self.retiredRings = []
+        if INFERENCE_WORKERS:
+            self.pool = InferencePool({
+                "helmets": (HelmetDetector, (HELMET_MODEL_PATH,), DETECTOR_WORKERS),
+                "faces": (FaceRecognizer, (), INFERENCE_WORKERS),
+            })
+        else:
+            self.helmetDetector = HelmetDetector(HELMET_MODEL_PATH)
+            self.faceRecognizer = FaceRecognizer()
+            self.frames = FramePipeline(reuse=FRAME_BUFFERS)
+        self.allocationMeter = AllocationMeter() if ALLOCATION_STATS else None
 
         self.encodeListKnown = []
+        self.employeeIds = []
         self.classNames = []
+        self.displayNames = {}  # employeeid -> name, for the UI only
+        self.galleryWatcher = None
         self.knownFaces = {}  # to avoid double marking per session
+        self.violations = ViolationRecorder(
+            VIOLATIONS_DIR, connectDB, CAMERA_NAME, repeat_seconds=VIOLATION_REPEAT_SECONDS
+        )
+        self.lastOccupancy = None
+        self.lastOccupancySent = 0.0
+        self.tracker = BoxTracker()
+        self.reid = (ReidClient(parse_address(REID_ADDRESS), REID_AUTHKEY.encode(), CAMERA_NAME)
+                     if REID_ADDRESS else None)
+        self.personIds = {}  # confirmed track id -> site-wide person id
+        self.frameCount = 0
+        self.lastReidSent = 0.0
+        self.lastSiteOccupancy = None
+        self.lastSiteOccupancySent = 0.0
         self.totalCount = 0
 
         self.initUI()
@@ -204,34 +281,84 @@ class AttendanceSystem(QMainWindow):
     # LOGIC
     # --------------------------
     def startRecognition(self):
-        path = "images"
-        images, classNames = loadImages(path)
-
-        self.encodeListKnown = []
-        self.classNames = []
-        self.knownFaces.clear()
-        self.totalCount = 0
+        if self.galleryWatcher is None:
+            if GALLERY_URL:
+                source = ServerGallery(GALLERY_URL, GALLERY_TOKEN, GALLERY_CACHE)
+            else:
+                source = ImageFolder(IMAGES_PATH)
+            index = source.load()
+            self.applyGallery(index)
+            self.galleryWatcher = GalleryWatcher(source, index, GALLERY_REFRESH_SECONDS)
+            self.galleryWatcher.start()
+        else:
+            # pressing Start again re-scans now; today's dedupe state is kept
+            self.galleryWatcher.refresh_now()
 
-        for img, name in zip(images, classNames):
-            if img is None:
-                print(f"[WARN] Could not read image for {name}")
-                continue
+        self.updateAttendanceTableFromDB()
+        if not self.timer.isActive():
+            self.timer.start(30)
+
+    def applyGallery(self, index):
+        # only called on the UI thread, between frames
+        self.encodeListKnown = index.encodings
+        self.employeeIds = index.employeeids
+        self.classNames = index.names
+        self.displayNames = dict(zip(index.employeeids, index.names))
+        # faces are labelled with employeeids; names can repeat and change
+        if self.pool:
+            self.pool.call("faces", "set_gallery", index.encodings, index.employeeids)
+        else:
+            self.faceRecognizer.set_gallery(index.encodings, index.employeeids)
+        print(f"[INFO] Total registered people: {len(self.classNames)}")
 
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            encodes = face_recognition.face_encodings(rgb_img)
-            if len(encodes) == 0:
-                print(f"[WARN] No face found in image for {name}, skipping")
-                continue
+    def displayName(self, employeeid):
+        return self.displayNames.get(employeeid, employeeid).upper()
 
-            self.encodeListKnown.append(encodes[0])
-            self.classNames.append(name)
-            print(f"[INFO] Registered person: {name}")
+    def reportViolation(self, employeeid, face_box):
+        # debounced and queued; captured off-thread after the face loop
+        if self.violations.report(employeeid, face_box):
+            notifyLive({"type": "violation", "camera": CAMERA_NAME, "employeeid": employeeid})
 
-        print(f"[INFO] Total registered people: {len(self.classNames)}")
+    def reportOccupancy(self, count):
+        now = time.monotonic()
+        if count == self.lastOccupancy or now - self.lastOccupancySent < OCCUPANCY_MIN_INTERVAL:
+            return
+        self.lastOccupancy, self.lastOccupancySent = count, now
+        notifyLive({"type": "occupancy", "camera": CAMERA_NAME, "count": count})
 
-        self.updateAttendanceTableFromDB()
-        self.totalCountLabel.setText("Total Workers Recognized: 0")
-        self.timer.start(30)
+    def reportSiteOccupancy(self, count):
+        now = time.monotonic()
+        if count == self.lastSiteOccupancy or now - self.lastSiteOccupancySent < OCCUPANCY_MIN_INTERVAL:
+            return
+        self.lastSiteOccupancy, self.lastSiteOccupancySent = count, now
+        notifyLive({"type": "site_occupancy", "camera": CAMERA_NAME, "count": count})
+
+    def reidentify(self, frame, face_boxes):
+        # runs before anything is drawn, so embeddings see the clean frame
+        confirmed, ended = self.tracker.update([body_box(box, frame.shape) for box in face_boxes])
+        self.frameCount += 1
+        tracks = []
+        for track_id, box in confirmed:
+            # a known track's appearance is only refreshed now and then
+            if track_id in self.personIds and self.frameCount % REID_REFRESH_FRAMES:
+                continue
+            embedding = appearance_embedding(frame, box)
+            if embedding is not None:
+                tracks.append((track_id, embedding))
+        for track_id in ended:
+            self.personIds.pop(track_id, None)
+
+        now = time.monotonic()
+        # an empty request still refreshes the site count about once a second
+        if not tracks and not ended and now - self.lastReidSent < OCCUPANCY_MIN_INTERVAL:
+            return
+        self.lastReidSent = now
+        reply = self.reid.assign(tracks, ended)
+        if reply is None:
+            return
+        personIds, siteOccupancy = reply
+        self.personIds.update(zip((track_id for track_id, _ in tracks), personIds))
+        self.reportSiteOccupancy(siteOccupancy)
 
     def has_helmet_for_face(self, face_box, helmet_boxes):
         """
@@ -250,7 +377,20 @@ class AttendanceSystem(QMainWindow):
         return False
 
     def updateFrame(self):
-        ret, frame = self.cap.read()
+        index = self.galleryWatcher.take() if self.galleryWatcher else None
+        if index is not None:
+            self.applyGallery(index)
+        if self.allocationMeter:
+            self.allocationMeter.start()
+        if self.pool:
+            self.updateFrameParallel()
+            if self.allocationMeter:
+                self.allocationMeter.stop()
+            return
+
+        # decodes into the reused frame buffer and fills the model-input
+        # tensor and small RGB image (see vision.frames)
+        ret, frame = self.frames.read(self.cap)
         if not ret:
             return
 
@@ -259,83 +399,98 @@ class AttendanceSystem(QMainWindow):
         # --------------------------
         helmet_boxes = []
         try:
-            results = self.helmet_model(frame, conf=0.5, verbose=False)
-            for r in results:
-                if r.boxes is None:
-                    continue
-                for box in r.boxes:
-                    cls_id = int(box.cls[0])
-                    if cls_id in self.HELMET_CLASS_IDS:
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        helmet_boxes.append(
-                            (int(x1), int(y1), int(x2), int(y2))
-                        )
+            helmet_boxes = self.helmetDetector.detect(self.frames)
         except Exception as e:
             print("Helmet detection error:", e)
 
         # --------------------------
         # 2) FACE RECOGNITION
         # --------------------------
-        small_frame = cv2.resize(frame, (0, 0), None, 0.25, 0.25)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-        facesCurFrame = face_recognition.face_locations(rgb_small_frame)
-        encodesCurFrame = face_recognition.face_encodings(
-            rgb_small_frame, facesCurFrame
-        )
+        faces = self.faceRecognizer.recognize(self.frames.small_rgb)
+
+        self.handleFrame(frame, helmet_boxes, faces)
+
+        if self.allocationMeter:
+            self.allocationMeter.stop(self.frames)
+
+    def updateFrameParallel(self):
+        # the camera decodes into a free shared slot; the workers read it in place
+        if self.ring is None:
+            ret, frame = self.cap.read()
+            if not ret:
+                return
+            self.ring = FrameRing(frame.shape, FRAME_SLOTS)
+        slot = self.ring.acquire()
+        if slot is None:
+            # every slot is still being worked on: drop this frame rather than fall behind
+            self.cap.grab()
+        else:
+            ret, frame = self.cap.read(self.ring.frames[slot])
+            if not ret:
+                self.ring.release(slot)
+            elif not np.shares_memory(frame, self.ring.frames[slot]):
+                # the resolution changed; frames in flight finish in the old ring
+                self.ring.release(slot)
+                self.retiredRings.append(self.ring)
+                self.ring = FrameRing(frame.shape, FRAME_SLOTS)
+            else:
+                self.pool.submit(self.ring, slot)
 
-        for encodeFace, faceLoc in zip(encodesCurFrame, facesCurFrame):
-            if not self.encodeListKnown:
-                continue
+        for ring, slot, results in self.pool.completed():
+            self.handleFrame(ring.frames[slot], results["helmets"] or [], results["faces"] or [])
+            ring.release(slot)
+        for ring in [ring for ring in self.retiredRings if ring.idle()]:
+            self.retiredRings.remove(ring)
+            self.pool.forget(ring)
+            ring.close()
 
-            matches = face_recognition.compare_faces(
-                self.encodeListKnown, encodeFace, tolerance=0.5
-            )
-            faceDis = face_recognition.face_distance(
-                self.encodeListKnown, encodeFace
-            )
-            best_match_index = np.argmin(faceDis)
+    def handleFrame(self, frame, helmet_boxes, faces):
+        """Attendance, violations and drawing for one frame; ``faces`` is ``[(face box, employeeid or None)]``."""
+        self.reportOccupancy(len(faces))
 
-            name = "Unrecognized"
-            has_helmet = False
+        faceLabels = []
 
-            # scale back to original frame
-            top, right, bottom, left = faceLoc
-            top *= 4
-            right *= 4
-            bottom *= 4
-            left *= 4
+        for face_box, match in faces:
+            if len(self.encodeListKnown) == 0:
+                continue
 
-            face_box = (left, top, right, bottom)
+            name = self.displayName(match) if match is not None else "Unrecognized"
 
-            if matches[best_match_index]:
-                has_helmet = self.has_helmet_for_face(face_box, helmet_boxes)
+            has_helmet = self.has_helmet_for_face(face_box, helmet_boxes)
 
+            if match is not None:
                 if has_helmet:
-                    if best_match_index < len(self.classNames):
-                        name = self.classNames[best_match_index].upper()
-                    else:
-                        name = "UNKNOWN"
-
                     # Only mark attendance when helmet is on
-                    if name not in self.knownFaces and name not in ["UNKNOWN"]:
-                        marked = markAttendance(name)
+                    if match not in self.knownFaces:
+                        marked = markAttendance(match)
                         if marked:
                             self.totalCount += 1
                             self.totalCountLabel.setText(
                                 f"Total Workers Recognized: {self.totalCount}"
                             )
                             self.updateAttendanceTable(name)
-                        self.knownFaces[name] = True
+                        self.knownFaces[match] = True
+                else:
+                    self.reportViolation(match, face_box)
+            elif not has_helmet:
+                self.reportViolation(UNRECOGNIZED, face_box)
 
-            # Draw face box + label
+            # Draw face box + label (after the loop, so evidence is unmarked)
             if name == "Unrecognized" or not has_helmet:
                 color = (0, 0, 255)  # red
                 label = "NO HELMET" if name != "Unrecognized" else name
             else:
                 color = (0, 255, 0)  # green
                 label = name
+            faceLabels.append((face_box, color, label))
+
+        # one frame copy for all of this frame's violations, before drawing
+        self.violations.flush(frame)
+
+        if self.reid:
+            self.reidentify(frame, [face_box for face_box, _ in faces])
 
+        for (left, top, right, bottom), color, label in faceLabels:
             cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
             cv2.putText(
                 frame,
@@ -393,12 +548,12 @@ class AttendanceSystem(QMainWindow):
         self.tableWidget.setRowCount(0)
         cursor.execute("SELECT name, time FROM attendance ORDER BY name;")
         rows = cursor.fetchall()
-        for name, time in rows:
+        for employeeid, stamp in rows:
             rowPosition = self.tableWidget.rowCount()
             self.tableWidget.insertRow(rowPosition)
-            self.tableWidget.setItem(rowPosition, 0, QTableWidgetItem(name))
-            # time will be a Python datetime object; format it:
-            self.tableWidget.setItem(rowPosition, 1, QTableWidgetItem(time.strftime('%Y-%m-%d %H:%M:%S')))
+            self.tableWidget.setItem(rowPosition, 0, QTableWidgetItem(self.displayName(employeeid)))
+            # stamp will be a Python datetime object; format it:
+            self.tableWidget.setItem(rowPosition, 1, QTableWidgetItem(stamp.strftime('%Y-%m-%d %H:%M:%S')))
         self.totalCount = len(rows)
         self.totalCountLabel.setText(f"Total Workers Recognized: {self.totalCount}")
 
@@ -407,6 +562,16 @@ class AttendanceSystem(QMainWindow):
     # --------------------------
     def closeApp(self):
         self.timer.stop()
+        if self.galleryWatcher:
+            self.galleryWatcher.stop()
+        self.violations.close()
+        if self.pool:
+            self.pool.close()
+            for ring in [self.ring, *self.retiredRings]:
+                if ring is not None:
+                    ring.close()
+        if self.reid:
+            self.reid.close()
         self.cap.release()
         cv2.destroyAllWindows()
         conn.close()
@@ -0,0 +1,172 @@
+"""
+Bulk user-account creation and password resets for the Employee admin.
+
+Existing users are looked up with one ``in_bulk`` query, new users are
+inserted with ``bulk_create`` and resets written with ``bulk_update``.
+PBKDF2 hashing, which dominates the cost, is spread over a process pool.
+Generated credentials go to a one-time CSV download (``CredentialExport``)
+instead of an admin message. The CSV is written to PRIVATE_STORAGE_ROOT
+(never served directly) under a random name, and deleted on download or
+CREDENTIAL_EXPORT_TTL_MINUTES after it was written, whichever comes
+first. Selections larger than ADMIN_BULK_SYNC_LIMIT are processed on a
+background thread.
+"""
+import csv
+import io
+import logging
+import os
+import secrets
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import workers
+from .hashing import hash_passwords, init_worker
+from .models import Employee, CredentialExport
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK = 50
+
+get_dispatcher = workers.dispatcher('credential-exports')
+get_hash_pool = workers.process_pool(
+    'PASSWORD_HASH_WORKERS', initializer=init_worker,
+    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'MajorProjectUpgrade.settings'),),
+)
+
+
+def generate_passwords(count):
+    """Return ``(plaintexts, hashes)`` for ``count`` new random passwords."""
+    plain = [secrets.token_urlsafe(10) for _ in range(count)]  # ~10-12 chars
+    chunks = [plain[i:i + HASH_CHUNK] for i in range(0, len(plain), HASH_CHUNK)]
+    if len(chunks) > 1:
+        hashed = [h for chunk in get_hash_pool().map(hash_passwords, chunks) for h in chunk]
+    else:
+        hashed = hash_passwords(plain)
+    return plain, hashed
+
+
+# ---------- the two actions ----------
+def create_accounts(employee_ids):
+    """Returns ``(created [(username, password)], skipped [username])``."""
+    employees = list(Employee.objects.filter(pk__in=employee_ids)
+                     .order_by('employeeid').values_list('employeeid', 'email'))
+    usernames = [str(employeeid) for employeeid, _ in employees]
+    existing = User.objects.in_bulk(usernames, field_name='username')
+
+    todo = [(str(employeeid), email or '') for employeeid, email in employees if str(employeeid) not in existing]
+    plain, hashed = generate_passwords(len(todo))
+    users = [User(username=username, email=email, password=pwd_hash, is_staff=False, is_superuser=False)
+             for (username, email), pwd_hash in zip(todo, hashed)]
+    User.objects.bulk_create(users, batch_size=1000)
+
+    created = [(username, pwd) for (username, _), pwd in zip(todo, plain)]
+    skipped = [u for u in usernames if u in existing]
+    return created, skipped
+
+
+def reset_passwords(employee_ids):
+    """Returns ``(changed [(username, password)], not_found [username])``."""
+    usernames = [str(u) for u in Employee.objects.filter(pk__in=employee_ids)
+                 .order_by('employeeid').values_list('employeeid', flat=True)]
+    users = User.objects.in_bulk(usernames, field_name='username')
+
+    found = [users[u] for u in usernames if u in users]
+    plain, hashed = generate_passwords(len(found))
+    for user, pwd_hash in zip(found, hashed):
+        user.password = pwd_hash
+    User.objects.bulk_update(found, ['password'], batch_size=1000)
+
+    changed = [(user.username, pwd) for user, pwd in zip(found, plain)]
+    not_found = [u for u in usernames if u not in users]
+    return changed, not_found
+
+
+# ---------- credential exports ----------
+def start_export(user, action, employee_ids):
+    """
+    Run ``action`` for ``employee_ids``; small selections finish before this
+    returns, larger ones are handed to the background dispatcher.
+    """
+    expire_exports()
+    export = CredentialExport.objects.create(action=action, requested_by=user)
+    employee_ids = list(employee_ids)
+    if len(employee_ids) <= settings.ADMIN_BULK_SYNC_LIMIT:
+        run_export(export.id, employee_ids)
+        export.refresh_from_db()
+    else:
+        export_id = export.id
+        transaction.on_commit(lambda: get_dispatcher().submit(run_background_export, export_id, employee_ids))
+    return export
+
+
+def run_background_export(export_id, employee_ids):
+    close_old_connections()
+    try:
+        run_export(export_id, employee_ids)
+    finally:
+        close_old_connections()
+
+
+def run_export(export_id, employee_ids):
+    export = CredentialExport.objects.get(pk=export_id)
+    try:
+        with transaction.atomic():
+            if export.action == CredentialExport.CREATE:
+                rows, skipped = create_accounts(employee_ids)
+            else:
+                rows, skipped = reset_passwords(employee_ids)
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(['username', 'password'])
+            writer.writerows(rows)
+            export.file.save("credentials.csv", ContentFile(buf.getvalue().encode()), save=False)
+            export.processed = len(rows)
+            export.skipped = ", ".join(skipped)
+            export.status = CredentialExport.DONE
+    except Exception:
+        logger.error("Credential export %s failed:\n%s", export_id, traceback.format_exc())
+        export.status = CredentialExport.FAILED
+        export.error = traceback.format_exc()
+    export.finished_at = timezone.now()
+    export.save()
+    if export.file:
+        timer = threading.Timer(export_ttl().total_seconds(), expire_export, args=(export_id,))
+        timer.daemon = True
+        timer.start()
+
+
+# ---------- expiry ----------
+def export_ttl():
+    return timedelta(minutes=settings.CREDENTIAL_EXPORT_TTL_MINUTES)
+
+
+def is_expired(export):
+    return export.finished_at is not None and timezone.now() - export.finished_at >= export_ttl()
+
+
+def expire_export(export_id):
+    """Delete one export's CSV (the timer set when it was written)."""
+    close_old_connections()
+    try:
+        export = CredentialExport.objects.filter(pk=export_id).exclude(file='').first()
+        if export is not None:
+            export.file.delete(save=True)
+    finally:
+        close_old_connections()
+
+
+def expire_exports():
+    """
+    Delete every CSV past the TTL. Catches files whose timer was lost to a
+    restart; the download view refuses expired exports either way.
+    """
+    cutoff = timezone.now() - export_ttl()
+    for export in CredentialExport.objects.exclude(file='').filter(finished_at__lt=cutoff):
+        export.file.delete(save=True)
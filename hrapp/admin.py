@@ -1,82 +1,109 @@
 # hrapp/admin.py
 from django.contrib import admin, messages
-from django.contrib.auth.models import User
-from django.utils.html import format_html_join
+from django.utils.html import format_html
 from django.urls import reverse
-import secrets
 
-from .models import Employee, Attendance, PerformanceReview, LeaveApplication
+from .models import (
+    Employee, Attendance, PerformanceReview, LeaveApplication, ReportJob, LegacyMonthlyAttendance,
+    Broadcast, BroadcastDelivery, CredentialExport, EmployeeImport, VideoAnalysis, UnmatchedKioskRow,
+)
+from . import accounts, gallery
+
+def report_export(request, export, done_label, skipped_label):
+    link = reverse('credential_export_download', args=[export.pk])
+    if export.status == CredentialExport.PENDING:
+        messages.info(request, format_html(
+            'Processing in the background. <a href="{}">Download the credentials file</a> once it is ready.', link))
+        return
+    if export.status == CredentialExport.FAILED:
+        messages.error(request, f"Failed: {export.error.strip().splitlines()[-1]}")
+        return
+    if export.processed:
+        messages.success(request, format_html(
+            '{} {} user(s). <a href="{}">Download the credentials file</a> (one-time download).',
+            done_label, export.processed, link))
+    if export.skipped:
+        messages.info(request, f"{skipped_label}: {export.skipped}")
 
 @admin.action(description="Create user accounts for selected employees")
 def create_user_accounts(modeladmin, request, queryset):
-    created = []
-    skipped = []
-    for emp in queryset:
-        username = str(emp.employeeid)
-        try:
-            user = User.objects.get(username=username)
-            skipped.append(username)
-            continue
-        except User.DoesNotExist:
-            # create user
-            email = emp.email or ''
-            pwd = secrets.token_urlsafe(10)  # ~10-12 chars
-            user = User.objects.create_user(username=username, email=email)
-            user.set_password(pwd)
-            user.is_staff = False
-            user.is_superuser = False
-            user.save()
-
-
-            try:
-                if hasattr(emp, 'user'):
-                    emp.user = user
-                    emp.save()
-                    linked = True
-                else:
-                    linked = False
-            except Exception:
-                linked = False
-
-            created.append((username, pwd, linked))
-
-
-    if created:
-        lines = []
-        for username, pwd, linked in created:
-            lines.append(f"{username} : {pwd} {'(linked)' if linked else ''}")
-        messages.success(request, "Created users:\n" + "\n".join(lines))
-    if skipped:
-        messages.info(request, "Skipped (already existed): " + ", ".join(skipped))
-    if not created and not skipped:
+    employee_ids = list(queryset.values_list('pk', flat=True))
+    if not employee_ids:
         messages.warning(request, "No employees selected.")
+        return
+    export = accounts.start_export(request.user, CredentialExport.CREATE, employee_ids)
+    report_export(request, export, "Created", "Skipped (already existed)")
 
 @admin.action(description="Reset password for selected employees (generates new password)")
 def reset_employee_passwords(modeladmin, request, queryset):
-    changed = []
-    not_found = []
-    for emp in queryset:
-        username = str(emp.employeeid)
-        try:
-            user = User.objects.get(username=username)
-            new_pwd = secrets.token_urlsafe(10)
-            user.set_password(new_pwd)
-            user.save()
-            changed.append((username, new_pwd))
-        except User.DoesNotExist:
-            not_found.append(username)
-
-    if changed:
-        messages.success(request, "Passwords reset:\n" + "\n".join(f"{u} : {p}" for u, p in changed))
-    if not_found:
-        messages.info(request, "No user found for: " + ", ".join(not_found))
+    employee_ids = list(queryset.values_list('pk', flat=True))
+    if not employee_ids:
+        messages.warning(request, "No employees selected.")
+        return
+    export = accounts.start_export(request.user, CredentialExport.RESET, employee_ids)
+    report_export(request, export, "Reset passwords for", "No user found for")
 
 class EmployeeAdmin(admin.ModelAdmin):
-    list_display = ('employeeid', 'name', 'email', 'GENDER', 'AGE')
+    list_display = ('employeeid', 'name', 'email', 'department', 'GENDER', 'AGE')
     search_fields = ('employeeid', 'name', 'email')
+    readonly_fields = ('face_encoded_at',)
     actions = [create_user_accounts, reset_employee_passwords]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'photo' not in form.changed_data:
+            return
+        # encode once here; the kiosk picks it up with its next gallery sync
+        error = gallery.enroll_photo(obj)
+        obj.save(update_fields=['face_encoding', 'face_encoded_at', 'updated_at'])
+        if error:
+            messages.warning(request, f"Photo saved, but no face was enrolled: {error}")
+        elif obj.photo:
+            messages.info(request, f"Face enrolled for {obj.name}.")
+
 admin.site.register(Employee, EmployeeAdmin)
+
+@admin.action(description="Approve selected leave applications")
+def approve_leave(modeladmin, request, queryset):
+    # save() rather than update() so updated_at moves (it is part of the analytics cache key)
+    changed = 0
+    for application in queryset.exclude(status=LeaveApplication.APPROVED):
+        clash = (LeaveApplication.objects.approved()
+                 .filter(employee_id=application.employee_id)
+                 .overlapping(application.start_date, application.end_date)
+                 .exclude(pk=application.pk)
+                 .first())
+        if clash is not None:
+            messages.warning(request, f"Not approved, overlaps approved leave {clash}: {application}")
+            continue
+        application.status = LeaveApplication.APPROVED
+        application.save(update_fields=['status', 'updated_at'])
+        changed += 1
+    messages.success(request, f"Approved {changed} leave application(s).")
+
+@admin.action(description="Reject selected leave applications")
+def reject_leave(modeladmin, request, queryset):
+    changed = 0
+    for application in queryset.exclude(status=LeaveApplication.REJECTED):
+        application.status = LeaveApplication.REJECTED
+        application.save(update_fields=['status', 'updated_at'])
+        changed += 1
+    messages.success(request, f"Rejected {changed} leave application(s).")
+
+class LeaveApplicationAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'leave_type', 'start_date', 'end_date', 'status', 'applied_at')
+    list_filter = ('status', 'leave_type')
+    search_fields = ('employee__employeeid', 'employee__name')
+    date_hierarchy = 'start_date'
+    list_select_related = ('employee',)
+    actions = [approve_leave, reject_leave]
 admin.site.register(Attendance)
 admin.site.register(PerformanceReview)
-admin.site.register(LeaveApplication)
+admin.site.register(LeaveApplication, LeaveApplicationAdmin)
+admin.site.register(ReportJob)
+admin.site.register(LegacyMonthlyAttendance)
+admin.site.register(Broadcast)
+admin.site.register(BroadcastDelivery)
+admin.site.register(EmployeeImport)
+admin.site.register(VideoAnalysis)
+admin.site.register(UnmatchedKioskRow)
@@ -0,0 +1,234 @@
+"""
+Per-employee attendance analytics over a date range.
+
+Everything is computed in the database, in two grouped queries over the
+``attendance_date_idx`` range:
+
+* ``presence_totals`` – days present, first check-in and last check-out.
+* ``check_in_patterns`` – average check-in time, lateness and
+  consecutive-day streaks, in a single window-function query. The
+  check-in minute-of-day is extracted once per row, in the current time
+  zone, and compared with SHIFT_START plus LATE_GRACE_MINUTES. Streaks
+  use the gaps-and-islands technique. An "open day" is any date on which
+  anyone checked in. Each open day is numbered with ``ROW_NUMBER()``,
+  and each employee's days are numbered again per employee. Within a run
+  of consecutive open days the difference between the two numbers stays
+  the same. Weekends and site holidays therefore do not break a streak.
+
+Approved leave (``hrapp.leave``) excuses an absence. ``leave_days`` counts
+the open days an employee was on approved leave and did not come in.
+Presence rate is days present / (open days - leave days), so leave is not
+counted as a no-show. ``presence_totals`` finds the check-ins made during
+a leave with a correlated EXISTS on ``leave_employee_period_idx``, and
+``hrapp.leave.approved_leave_days`` reads only the leaves that overlap the
+range.
+
+Results are cached per (range, filters, shift) for
+ATTENDANCE_ANALYTICS_CACHE_SECONDS. The key includes an attendance
+version (``attendance_version``) and a version of the overlapping
+leaves, so new check-ins, check-outs, corrections and approvals are seen
+immediately.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Count, Exists, Max, Min, OuterRef
+from django.utils import timezone
+
+from . import leave
+from .models import Employee, Attendance, LeaveApplication
+
+CACHE_PREFIX = 'attendance-analytics'
+
+
+def parse_shift_start(value):
+    """'HH:MM' -> minutes after midnight."""
+    parsed = datetime.strptime(value, '%H:%M')
+    return parsed.hour * 60 + parsed.minute
+
+
+def format_minutes(minutes):
+    return f"{int(minutes) // 60:02d}:{int(minutes) % 60:02d}"
+
+
+def employee_filter(department=None, employeeid=None):
+    """Employees to report on, or None for everyone."""
+    if not department and not employeeid:
+        return None
+    employees = Employee.objects.all()
+    if department:
+        employees = employees.filter(department=department)
+    if employeeid:
+        employees = employees.filter(employeeid=employeeid)
+    return employees
+
+
+# ---------- queries ----------
+def presence_totals(start, end, employees):
+    qs = Attendance.objects.between(start, end)
+    if employees is not None:
+        qs = qs.filter(employee__in=employees.values('id'))
+    during_leave = Exists(LeaveApplication.objects.approved().filter(
+        employee=OuterRef('employee_id'), start_date__lte=OuterRef('date'), end_date__gte=OuterRef('date')))
+    return (qs.values('employee_id')
+            .annotate(days_present=Count('id'), first_in=Min('check_in'), last_out=Max('check_out'),
+                      present_on_leave=Count('id', filter=during_leave))
+            .order_by())
+
+
+def open_dates(start, end):
+    """Days in the range on which anyone checked in (an index-only scan of attendance_date_idx)."""
+    return set(Attendance.objects.between(start, end).values_list('date', flat=True).distinct().order_by())
+
+
+def check_in_patterns(start, end, employees, shift_start, grace):
+    """
+    ``(open_days, {employee_id: (avg_check_in, late_days, avg_late_minutes,
+    longest_streak, current_streak)})``. The current streak is the run that
+    reaches the last open day of the range.
+    """
+    # raw SQL bypasses the router; ask it, so this read follows the ORM ones (replica or primary)
+    connection = connections[router.db_for_read(Attendance)]
+    qn = connection.ops.quote_name
+    attendance, date = qn(Attendance._meta.db_table), qn('date')
+    tzname = timezone.get_current_timezone_name() if settings.USE_TZ else None
+    hour_sql, hour_params = connection.ops.datetime_extract_sql('hour', f'a.{qn("check_in")}', (), tzname)
+    minute_sql, minute_params = connection.ops.datetime_extract_sql('minute', f'a.{qn("check_in")}', (), tzname)
+    employee_clause, employee_params = '', ()
+    if employees is not None:
+        employee_sql, employee_params = employees.values('id').query.sql_with_params()
+        employee_clause = f"AND a.employee_id IN ({employee_sql})"
+
+    late_after = shift_start + grace
+    sql = f"""
+        WITH open_days AS (
+            SELECT day, ROW_NUMBER() OVER (ORDER BY day) AS day_no
+            FROM (SELECT DISTINCT {date} AS day FROM {attendance} WHERE {date} BETWEEN %s AND %s) AS d
+        ),
+        visits AS (
+            SELECT a.employee_id, o.day_no,
+                   o.day_no - ROW_NUMBER() OVER (PARTITION BY a.employee_id ORDER BY a.{date}) AS island,
+                   {hour_sql} * 60 + {minute_sql} AS minute_of_day
+            FROM {attendance} a
+            JOIN open_days o ON o.day = a.{date}
+            WHERE a.{date} BETWEEN %s AND %s {employee_clause}
+        ),
+        runs AS (
+            SELECT employee_id, COUNT(*) AS length, MAX(day_no) AS last_day_no,
+                   SUM(minute_of_day) AS minutes,
+                   SUM(CASE WHEN minute_of_day > %s THEN 1 ELSE 0 END) AS late_days,
+                   SUM(CASE WHEN minute_of_day > %s THEN minute_of_day - %s ELSE 0 END) AS late_minutes
+            FROM visits
+            GROUP BY employee_id, island
+        )
+        SELECT r.employee_id,
+               SUM(r.minutes) * 1.0 / SUM(r.length),
+               SUM(r.late_days),
+               SUM(r.late_minutes),
+               MAX(r.length),
+               MAX(CASE WHEN r.last_day_no = t.open_days THEN r.length ELSE 0 END),
+               t.open_days
+        FROM runs r
+        CROSS JOIN (SELECT COUNT(*) AS open_days FROM open_days) t
+        GROUP BY r.employee_id, t.open_days
+    """
+    params = [start, end, *hour_params, *minute_params, start, end, *employee_params,
+              late_after, late_after, shift_start]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        open_days = Attendance.objects.between(start, end).values('date').distinct().count()
+        return open_days, {}
+
+    patterns = {}
+    for employee_id, avg_check_in, late_days, late_minutes, longest, current, _ in rows:
+        avg_late = late_minutes / late_days if late_days else None
+        patterns[employee_id] = (avg_check_in, late_days, avg_late, longest, current)
+    return rows[0][6], patterns
+
+
+# ---------- report ----------
+def attendance_version(start, end):
+    """
+    Changes whenever an attendance row is added, edited (check-out,
+    correction) or deleted within ``start..end``: the newest ``updated_at``
+    (``attendance_updated_idx``) and the row count over the range
+    (``attendance_date_idx``).
+    """
+    latest = Attendance.objects.aggregate(latest=Max('updated_at'))['latest']
+    count = Attendance.objects.between(start, end).count()
+    return f"{count}-{latest.timestamp() if latest else 0}"
+
+
+def attendance_analytics(start, end, department=None, employeeid=None, shift_start=None):
+    shift_start = shift_start or settings.SHIFT_START
+    grace = settings.LATE_GRACE_MINUTES
+    key = ':'.join(str(part) for part in (
+        CACHE_PREFIX, start, end, department or '', employeeid or '', shift_start, grace,
+        attendance_version(start, end),
+        leave.leave_version(start, end)))
+    result = cache.get(key)
+    if result is None:
+        result = build_analytics(start, end, employee_filter(department, employeeid),
+                                 parse_shift_start(shift_start), grace)
+        cache.set(key, result, settings.ATTENDANCE_ANALYTICS_CACHE_SECONDS)
+    return result
+
+
+def build_analytics(start, end, employees, shift_start, grace):
+    totals = {row['employee_id']: row for row in presence_totals(start, end, employees)}
+    open_days, patterns = check_in_patterns(start, end, employees, shift_start, grace)
+    on_leave = leave.approved_leave_days(start, end, employees)
+    days_open = open_dates(start, end) if on_leave else set()
+    people = (employees if employees is not None else Employee.objects.all())
+    people = people.order_by('employeeid').values_list('id', 'employeeid', 'name', 'department')
+
+    results = []
+    for pk, employeeid, name, department in people:
+        row = totals.get(pk, {})
+        days = row.get('days_present', 0)
+        # open days on approved leave, less the ones they came in anyway
+        leave_days = len(on_leave.get(pk, set()) & days_open) - row.get('present_on_leave', 0)
+        expected = open_days - leave_days
+        avg_check_in, late_days, avg_late, longest, current = patterns.get(pk, (None, 0, None, 0, 0))
+        results.append({
+            'employeeid': employeeid,
+            'name': name,
+            'department': department,
+            'days_present': days,
+            'leave_days': leave_days,
+            'presence_rate': round(days / expected, 4) if expected else None,
+            'first_in': row.get('first_in'),
+            'last_out': row.get('last_out'),
+            'avg_check_in': format_minutes(avg_check_in) if avg_check_in is not None else None,
+            'late_days': int(late_days),
+            'avg_late_minutes': round(avg_late, 1) if avg_late is not None else None,
+            'longest_streak': longest,
+            'current_streak': current,
+        })
+
+    present = [r for r in results if r['days_present']]
+    rates = [r['presence_rate'] for r in results if r['presence_rate'] is not None]
+    return {
+        'start': start,
+        'end': end,
+        'open_days': open_days,
+        'shift_start': format_minutes(shift_start),
+        'late_grace_minutes': grace,
+        'summary': {
+            'employees': len(results),
+            'present_at_least_once': len(present),
+            'avg_presence_rate': (round(sum(rates) / len(rates), 4) if rates else None),
+            'leave_days': sum(r['leave_days'] for r in results),
+            'late_check_ins': sum(r['late_days'] for r in results),
+        },
+        'results': results,
+    }
+
+
+def default_range(days=30):
+    end = timezone.localdate()
+    return end - timedelta(days=days - 1), end
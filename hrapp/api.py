@@ -0,0 +1,347 @@
+import base64
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+
+from . import analytics, gallery, leave
+from .profiling import query_budget
+from .routing import replica_reads
+from .models import Employee, Attendance
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_ANALYTICS_DAYS = 366
+
+# fields a client may ask for with ?fields=a,b,c (id is always included)
+EMPLOYEE_FIELDS = (
+    'id', 'employeeid', 'name', 'email', 'phone_no', 'address', 'dob',
+    'GENDER', 'AGE', 'department', 'updated_at',
+)
+ATTENDANCE_FIELDS = (
+    'id', 'employee_id', 'employee__employeeid', 'employee__name', 'date',
+    'check_in', 'check_out',
+)
+
+
+# ---------- cursor helpers ----------
+def encode_cursor(values):
+    # isoformat() keeps microseconds, which DjangoJSONEncoder would truncate
+    values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def after_cursor(order, values):
+    """
+    Build the keyset predicate "row comes after ``values``" for an
+    ``order_by``-style tuple such as ('name', 'id') or ('-name', '-id').
+    Raises ValueError when ``values`` does not hold one value per field.
+    """
+    if not isinstance(values, list) or len(values) != len(order):
+        raise ValueError("cursor does not match the sort order")
+    keys = [f.lstrip('-') for f in order]
+    q = Q()
+    for i, field in enumerate(order):
+        op = 'lt' if field.startswith('-') else 'gt'
+        ties = dict(zip(keys[:i], values[:i]))
+        q |= Q(**ties, **{f'{keys[i]}__{op}': values[i]})
+    return q
+
+
+def parse_page_size(request, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(request.GET.get('limit', default))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def parse_fields(request, allowed):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(allowed)
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def keyset_page(values_fn, fields, order, limit):
+    """
+    Run ``values_fn(*fields)`` (``qs.values`` or ``qs.values_list``) for one
+    page and return ``(rows, next_cursor)``; ``next_cursor`` is None on the
+    last page. Ordering keys missing from ``fields`` are fetched but dropped.
+    """
+    keys = [f.lstrip('-') for f in order]
+    select = list(fields) + [k for k in keys if k not in fields]
+    rows = list(values_fn(*select).order_by(*order)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor([last[k] for k in keys])
+        else:
+            next_cursor = encode_cursor([last[select.index(k)] for k in keys])
+
+    width = len(fields)
+    if rows and isinstance(rows[0], dict):
+        rows = [{f: row[f] for f in fields} for row in rows]
+    else:
+        rows = [row[:width] for row in rows]
+    return rows, next_cursor
+
+
+def paginated_response(request, qs, fields, order, limit):
+    """
+    Fetch one keyset page of ``qs`` ordered by ``order`` and serialize it
+    straight from ``values_list`` rows. The cursor for the next page is the
+    ordering key of the last row; the ETag is a hash of the body so
+    unchanged pages come back as 304.
+    """
+    rows, next_cursor = keyset_page(qs.values_list, fields, order, limit)
+    return etag_json_response(request, {
+        'results': [dict(zip(fields, row)) for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    })
+
+
+def etag_json_response(request, payload):
+    """JSON response with an ETag of the body, so unchanged results come back as 304."""
+    body = json.dumps(payload, cls=DjangoJSONEncoder)
+    etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def parse_date_range(request, default, max_days):
+    """``(start, end)`` from ?start=&end= (ISO dates, inclusive), falling back to ``default``."""
+    start, end = default
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        if value:
+            parsed = parse_date(value)
+            if parsed is None:
+                raise ValueError(f"{name} must be an ISO 8601 date")
+            if name == 'start':
+                start = parsed
+            else:
+                end = parsed
+    if start > end:
+        raise ValueError("start must not be after end")
+    if (end - start).days >= max_days:
+        raise ValueError(f"The range may span at most {max_days} days")
+    return start, end
+
+
+def bad_request(message):
+    return JsonResponse({'error': message}, status=400)
+
+
+def kiosk_or_staff(view_func):
+    """Allow staff sessions, or the kiosk presenting ``Authorization: Bearer <KIOSK_API_TOKEN>``."""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        token = settings.KIOSK_API_TOKEN
+        auth = request.headers.get('Authorization', '')
+        if token and auth.startswith('Bearer ') and constant_time_compare(auth[len('Bearer '):], token):
+            return view_func(request, *args, **kwargs)
+        if request.user.is_active and request.user.is_staff:
+            return view_func(request, *args, **kwargs)
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    return _wrapped
+
+
+# ---------- endpoints ----------
+@require_GET
+@kiosk_or_staff
+@replica_reads
+def employee_data(request):
+    """
+    Keyset-paginated employee feed, ordered by (updated_at, id).
+
+    Query params: fields, limit, cursor, since (ISO datetime), gender, age.
+    Clients doing incremental sync keep the last ``next_cursor`` (or the
+    newest ``updated_at`` they saw as ``since``) and only get changed rows.
+    """
+    try:
+        fields = parse_fields(request, EMPLOYEE_FIELDS)
+        limit = parse_page_size(request)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    qs = Employee.objects.all()
+
+    since = request.GET.get('since')
+    if since:
+        since_dt = parse_datetime(since)
+        if since_dt is None:
+            return bad_request("since must be an ISO 8601 datetime")
+        qs = qs.filter(updated_at__gt=since_dt)
+
+    gender = request.GET.get('gender')
+    if gender:
+        qs = qs.filter(GENDER__iexact=gender)
+    age = request.GET.get('age')
+    if age:
+        qs = qs.filter(AGE=age)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            updated_at, last_id = decode_cursor(cursor)
+            updated_at = parse_datetime(updated_at)
+            if updated_at is None or not isinstance(last_id, int):
+                raise ValueError("Invalid cursor")
+            qs = qs.filter(after_cursor(('updated_at', 'id'), [updated_at, last_id]))
+        except (ValueError, TypeError):
+            return bad_request("Invalid cursor")
+
+    return paginated_response(request, qs, fields, ('updated_at', 'id'), limit)
+
+
+@require_GET
+@kiosk_or_staff
+@replica_reads
+def attendance_data(request):
+    """
+    Keyset-paginated attendance feed, ordered by id (rows are append-only).
+
+    Query params: fields, limit, cursor, since (ISO date), employeeid.
+    """
+    try:
+        fields = parse_fields(request, ATTENDANCE_FIELDS)
+        limit = parse_page_size(request)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    qs = Attendance.objects.all()
+
+    since = request.GET.get('since')
+    if since:
+        since_date = parse_date(since)
+        if since_date is None:
+            return bad_request("since must be an ISO 8601 date")
+        qs = qs.filter(date__gte=since_date)
+
+    employeeid = request.GET.get('employeeid')
+    if employeeid:
+        qs = qs.filter(employee__employeeid=employeeid)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            (last_id,) = decode_cursor(cursor)
+            if not isinstance(last_id, int):
+                raise ValueError("Invalid cursor")
+        except (ValueError, TypeError):
+            return bad_request("Invalid cursor")
+        qs = qs.filter(id__gt=last_id)
+
+    return paginated_response(request, qs, fields, ('id',), limit)
+
+
+@query_budget(10)
+@require_GET
+@kiosk_or_staff
+@replica_reads
+def attendance_analytics(request):
+    """
+    Per-employee presence rate, check-in / check-out times, lateness,
+    consecutive-day streaks and approved leave over a date range (see
+    hrapp.analytics).
+
+    Query params: start, end (ISO dates, default the last 30 days),
+    department, employeeid, shift_start (HH:MM, default SHIFT_START).
+    """
+    try:
+        start, end = parse_date_range(request, analytics.default_range(), MAX_ANALYTICS_DAYS)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    shift_start = request.GET.get('shift_start')
+    if shift_start:
+        try:
+            analytics.parse_shift_start(shift_start)
+        except ValueError:
+            return bad_request("shift_start must be HH:MM")
+
+    result = analytics.attendance_analytics(
+        start, end,
+        department=request.GET.get('department'),
+        employeeid=request.GET.get('employeeid'),
+        shift_start=shift_start,
+    )
+    return etag_json_response(request, result)
+
+
+@query_budget(3)
+@require_GET
+@kiosk_or_staff
+@replica_reads
+def leave_calendar(request):
+    """
+    Who is out between two dates: the leaves overlapping the range and,
+    for each day, the employee ids on leave (see hrapp.leave).
+
+    Query params: start, end (ISO dates, default the next two weeks),
+    department, status (comma-separated, default approved).
+    """
+    try:
+        start, end = parse_date_range(request, leave.default_range(), leave.MAX_CALENDAR_DAYS)
+        statuses = leave.parse_statuses(request.GET.get('status'))
+    except ValueError as e:
+        return bad_request(str(e))
+    result = leave.leave_calendar(start, end, request.GET.get('department'), statuses)
+    return etag_json_response(request, result)
+
+
+@query_budget(6)
+@require_GET
+@kiosk_or_staff
+def face_gallery(request):
+    """
+    The kiosk's face gallery in the binary format described in hrapp.faces.
+
+    Query params: since (a gallery version the client already holds) to
+    get only the entries changed after it. Answers If-None-Match with 304
+    while the gallery is unchanged.
+    """
+    try:
+        since = int(request.GET.get('since') or 0)
+    except ValueError:
+        return bad_request("since must be a gallery version")
+
+    version, enrolled = gallery.gallery_state()
+    not_modified = get_conditional_response(request, etag=gallery.gallery_etag(version, enrolled, since))
+    if not_modified is not None:
+        return not_modified
+
+    version, enrolled, body = gallery.export_gallery(since)
+    response = HttpResponse(body, content_type='application/octet-stream')
+    response['ETag'] = gallery.gallery_etag(version, enrolled, since)
+    response['X-Gallery-Version'] = str(version)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class HrappConfig(AppConfig):
     name = 'hrapp'
+
+    def ready(self):
+        # connect the summary-table and live-counter signal handlers
+        from . import live, summaries  # noqa: F401
+        if settings.REPORTING_PRELOAD:
+            from . import reports
+            reports.load_reporting()
@@ -0,0 +1,290 @@
+"""
+Load benchmarks for the HR endpoints at realistic data sizes.
+
+``seed`` fills the (test) database with synthetic employees, one
+attendance row per employee per working day going back as far as needed,
+and performance reviews. It uses batched ``bulk_create``, which bypasses
+the summary signals, so the summary tables are rebuilt afterwards.
+
+``run_scenario`` requests one URL ``requests`` times from ``concurrency``
+threads, each with its own logged-in test client and database
+connection. It records per-request latency, the SQL queries each request
+ran (counted with an execute wrapper, like ``hrapp.profiling``), and the
+peak Python heap of one extra request traced on its own with tracemalloc.
+
+Results are saved as JSON baselines; ``compare`` diffs a run against one
+and flags what got slower. The ``benchmark`` command ties it together.
+"""
+import json
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from . import summaries
+from .models import Attendance, Employee, PerformanceReview
+
+# (name, url name, query string); generate_pdf last, its job renders in the background
+SCENARIOS = [
+    ('data', 'data', 'limit=100'),
+    ('data_large_page', 'data', 'limit=1000'),
+    ('data_filtered', 'data', 'gender=Female&limit=100'),
+    ('attendance_data', 'attendance_data', 'limit=100'),
+    ('table', 'table', ''),
+    ('table_search', 'table', 'q=Patel'),
+    ('plot_attendance', 'plot_attendance', ''),
+    ('plot_gender', 'plot_gender', ''),
+    ('plot_age', 'plot_age', ''),
+    ('plot_attendanceagain', 'plot_attendanceagain', ''),
+    ('historical_data', 'historical_data', ''),
+    ('generate_csv', 'generate_csv', ''),
+    ('generate_pdf', 'generate_pdf', ''),
+]
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya',
+               'Rahul', 'Meera', 'Karan', 'Isha', 'Aditya', 'Pooja', 'Sanjay', 'Neha']
+LAST_NAMES = ['Sharma', 'Patel', 'Singh', 'Kumar', 'Gupta', 'Reddy', 'Iyer', 'Nair',
+              'Das', 'Joshi', 'Mehta', 'Rao', 'Verma', 'Shah', 'Bose', 'Pillai']
+DEPARTMENTS = ['Assembly', 'Welding', 'Logistics', 'Maintenance', 'Quality', 'Safety', 'HR', 'Finance']
+RATINGS = ['Excellent', 'Good', 'Average', 'Needs improvement']
+FEEDBACK = ['Consistently meets targets.', 'Strong safety record.', 'Needs to improve punctuality.',
+            'Helps train new staff.', 'Good teamwork on the night shift.']
+
+BENCHMARK_USER = 'benchmark-admin'
+
+
+# ---------- seeding ----------
+def seeded_counts():
+    return {
+        'employees': Employee.objects.count(),
+        'attendance': Attendance.objects.count(),
+        'reviews': PerformanceReview.objects.count(),
+    }
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fake_employees(count, rng):
+    today = timezone.localdate()
+    for n in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        age = rng.randint(19, 62)
+        yield Employee(
+            employeeid=f"BENCH{n:07d}",
+            name=f"{first} {last}",
+            email=f"{first}.{last}.{n}@example.com".lower(),
+            phone_no=f"9{rng.randint(0, 999999999):09d}",
+            address=f"{rng.randint(1, 999)} Industrial Area, Sector {rng.randint(1, 60)}",
+            dob=today - timedelta(days=age * 365 + rng.randint(0, 364)),
+            GENDER=rng.choice(['Male', 'Female']),
+            AGE=age,
+            department=rng.choice(DEPARTMENTS),
+        )
+
+
+def fake_attendance(employee_ids, count, rng):
+    """``count`` rows: every employee on each day, newest day last, over as many days as needed."""
+    tz = timezone.get_current_timezone()
+    days = -(-count // len(employee_ids))
+    first_day = timezone.localdate() - timedelta(days=days - 1)
+    made = 0
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        for employee_id in employee_ids:
+            if made == count:
+                return
+            check_in = datetime(day.year, day.month, day.day, 8, 0, tzinfo=tz) + timedelta(minutes=rng.randint(0, 90))
+            made += 1
+            yield Attendance(employee_id=employee_id, date=day, check_in=check_in,
+                             check_out=check_in + timedelta(hours=8, minutes=rng.randint(0, 120)))
+
+
+def fake_reviews(employee_ids, count, rng):
+    for n in range(count):
+        yield PerformanceReview(employee_id=employee_ids[n % len(employee_ids)],
+                                performance=rng.choice(RATINGS), feedbacks=rng.choice(FEEDBACK))
+
+
+def seed(employees, attendance, reviews, batch_size=5000, seed_value=0, progress=None):
+    """Insert synthetic rows into an empty database and rebuild the summary tables."""
+    rng = random.Random(seed_value)
+
+    def insert(label, model, rows, total):
+        done = 0
+        started = time.perf_counter()
+        for batch in batched(rows, batch_size):
+            model.objects.bulk_create(batch, batch_size=batch_size)
+            done += len(batch)
+            if progress:
+                progress(f"{label}: {done}/{total}")
+        if progress:
+            progress(f"{label}: {total} rows in {time.perf_counter() - started:.1f}s")
+
+    insert('employees', Employee, fake_employees(employees, rng), employees)
+    employee_ids = list(Employee.objects.order_by('id').values_list('id', flat=True))
+    if employee_ids:
+        insert('attendance', Attendance, fake_attendance(employee_ids, attendance, rng), attendance)
+        insert('reviews', PerformanceReview, fake_reviews(employee_ids, reviews, rng), reviews)
+    summaries.rebuild_summaries()
+
+
+def benchmark_user():
+    user, _ = get_user_model().objects.get_or_create(
+        username=BENCHMARK_USER, defaults={'is_staff': True, 'is_superuser': True})
+    return user
+
+
+# ---------- measuring ----------
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def timed_get(client, url):
+    """``(status, seconds, queries)`` for one GET, counting queries on every connection."""
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(count))
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+    return response.status_code, elapsed, queries
+
+
+def peak_memory(client, url):
+    """Peak traced heap (bytes) of one request, measured with nothing else running."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        client.get(url)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def run_scenario(url, user, requests=50, concurrency=4):
+    # warm up caches and imports, then trace memory, before timing anything
+    warm = Client(raise_request_exception=False)
+    warm.force_login(user)
+    warm.get(url)
+    peak = peak_memory(warm, url)
+
+    # one logged-in client per thread; sessions are written here, not while timing
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    clients = []
+    for share in shares:
+        if share:
+            clients.append((Client(raise_request_exception=False), share))
+            clients[-1][0].force_login(user)
+
+    def worker(client, count):
+        try:
+            return [timed_get(client, url) for _ in range(count)]
+        finally:
+            connections.close_all()  # this thread's own connections
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [r for part in pool.map(worker, *zip(*clients)) for r in part]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(seconds * 1000 for _, seconds, _ in results)
+    return {
+        'requests': len(results),
+        'errors': sum(1 for status, _, _ in results if status >= 400),
+        'statuses': sorted({status for status, _, _ in results}),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+        'rps': round(len(results) / wall, 1) if wall else 0.0,
+        'queries': max((queries for _, _, queries in results), default=0),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run(scenarios=None, requests=50, concurrency=4, progress=None):
+    """Run the named scenarios (default: all); returns ``{name: stats}``."""
+    user = benchmark_user()
+    results = {}
+    for name, url_name, query in SCENARIOS:
+        if scenarios and name not in scenarios:
+            continue
+        url = reverse(url_name) + (f"?{query}" if query else '')
+        results[name] = run_scenario(url, user, requests, concurrency)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+# ---------- baselines ----------
+def save_baseline(path, scale, concurrency, results):
+    with open(path, 'w') as f:
+        json.dump({
+            'created': timezone.now().isoformat(),
+            'scale': scale,
+            'concurrency': concurrency,
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, results, threshold=0.2):
+    """
+    ``[(name, metric, before, after, change)]`` for every metric of every
+    scenario in both runs, and the subset that regressed: p50/p95 latency
+    or peak memory up by more than ``threshold``, any increase in queries,
+    or new errors. p99 is shown but too noisy over a few dozen requests to
+    fail a run on.
+    """
+    rows, regressions = [], []
+    for name, after in results.items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kib', 'errors'):
+            old, new = before.get(metric, 0), after.get(metric, 0)
+            change = (new - old) / old if old else (0.0 if new == old else float('inf'))
+            row = (name, metric, old, new, change)
+            rows.append(row)
+            if metric in ('queries', 'errors'):
+                regressed = new > old
+            else:
+                regressed = metric != 'p99_ms' and change > threshold
+            if regressed:
+                regressions.append(row)
+    return rows, regressions
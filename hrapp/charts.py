@@ -0,0 +1,95 @@
+"""
+Matplotlib chart builders shared by the plot views and the PDF report.
+
+This module deliberately does not import Django: ``render_chart`` runs in
+report worker processes, which only receive plain row lists.
+
+matplotlib and pandas are the heaviest imports in the project, so nothing
+imports this module at load time. The chart views and the report builder
+import it on first use, and a web worker that never serves a chart never
+loads them (see REPORTING_PRELOAD for a dedicated reporting pool).
+"""
+import io
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+
+# ---------- plotting helpers ----------
+def frame(rows, columns=None):
+    """DataFrame from a list of tuples (with ``columns``) or of dicts."""
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+def fig_to_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+def plot_monthly_attendance_df(df):
+    # df: Month (first day of month), Attendance (check-ins that month)
+    if df.empty:
+        return None
+    attendance = pd.Series(
+        pd.to_numeric(df['Attendance'], errors='coerce').fillna(0).values,
+        index=[pd.Timestamp(m).strftime('%b %Y') for m in df['Month']],
+    )
+    fig, ax = plt.subplots(figsize=(8,6))
+    attendance.plot(kind='bar', ax=ax)
+    ax.set_title('Monthly Attendance Analysis')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Total Attendance')
+    return fig
+
+def plot_gender_distribution_df(df):
+    if 'GENDER' in df.columns:
+        df['GENDER'] = df['GENDER'].fillna('UNKNOWN').str.upper()
+        gender_distribution = df['GENDER'].value_counts()
+        fig, ax = plt.subplots(figsize=(8,6))
+        gender_distribution.plot(kind='pie', autopct='%1.1f%%', ax=ax)
+        ax.set_ylabel('')
+        return fig
+    return None
+
+def plot_age_distribution_df(df):
+    if 'AGE' in df.columns:
+        fig, ax = plt.subplots(figsize=(10,6))
+        ax.hist(df['AGE'].dropna(), bins=10, edgecolor='black')
+        ax.set_title('Age Distribution Analysis')
+        ax.set_xlabel('AGE')
+        ax.set_ylabel('Number of Employees')
+        return fig
+    return None
+
+def plot_attendance_by_name_df(df, title='Attendance Analysis'):
+    # df: Name, Days (days present in the period)
+    if df.empty:
+        return None
+    fig, ax = plt.subplots(figsize=(10,6))
+    df.groupby('Name')['Days'].sum().plot(kind='bar', ax=ax)
+    ax.set_title(title)
+    ax.set_xlabel('Name')
+    ax.set_ylabel('Days Present')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    return fig
+
+
+# ---------- process-pool entry point ----------
+CHARTS = {
+    'attendance': plot_monthly_attendance_df,
+    'gender': plot_gender_distribution_df,
+    'age': plot_age_distribution_df,
+    'attendance_by_name': lambda df: plot_attendance_by_name_df(df, 'Attendance Analysis (By Name)'),
+}
+
+def render_chart(kind, rows, columns):
+    """
+    Build chart ``kind`` from ``rows``/``columns`` and return PNG bytes,
+    or None when there is nothing to plot. Safe to call in a subprocess.
+    """
+    fig = CHARTS[kind](frame(rows, columns))
+    if fig is None:
+        return None
+    return fig_to_png(fig)
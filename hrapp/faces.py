@@ -0,0 +1,99 @@
+"""
+Face encoding for employee enrollment photos, and the binary gallery
+format the kiosk loads.
+
+Like ``charts``, this module does not import Django: ``encode_faces`` runs
+in import worker processes and only receives raw image bytes, and the
+kiosk reads galleries with ``unpack_gallery``. numpy, Pillow and
+face_recognition are imported lazily so the web process never loads dlib
+just to reference the function.
+
+Gallery layout (little-endian)::
+
+    0   8s  magic b"HRFACES1"
+    8   I   count   - number of encodings
+    12  I   dim     - values per encoding (128)
+    16  Q   version - newest face_encoded_at, in microseconds since the epoch
+    24  I   index_length
+    28  I   reserved
+    32      count * dim float64 encodings, row i belongs to index["employeeids"][i]
+    ...     index: UTF-8 JSON {"employeeids", "names", "removed", "enrolled"}
+
+The encodings start at a fixed offset, so a cached gallery file can be
+opened with ``numpy.memmap`` without copying.
+"""
+import io
+import json
+import struct
+
+GALLERY_MAGIC = b'HRFACES1'
+GALLERY_HEADER = struct.Struct('<8sIIQII')
+ENCODING_DIM = 128
+ENCODING_BYTES = ENCODING_DIM * 8
+
+# photos are shrunk to this longest side before detection; enrollment
+# shots are close-ups, and HOG detection cost grows with pixel count
+MAX_SIDE = 800
+
+
+def encode_face(data):
+    """Return ``(encoding_bytes, error)`` for one photo; exactly one face is required."""
+    import numpy as np
+    import face_recognition
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    image.thumbnail((MAX_SIDE, MAX_SIDE))
+    pixels = np.asarray(image)
+
+    locations = face_recognition.face_locations(pixels)
+    if not locations:
+        return None, "no face found in photo"
+    if len(locations) > 1:
+        return None, f"{len(locations)} faces found in photo"
+    encoding = face_recognition.face_encodings(pixels, locations)[0]
+    return np.asarray(encoding, dtype=np.float64).tobytes(), None
+
+
+def encode_faces(photos):
+    """``encode_face`` over a chunk of photos; per-photo failures become errors."""
+    results = []
+    for data in photos:
+        try:
+            results.append(encode_face(data))
+        except ImportError:
+            raise
+        except Exception as e:
+            results.append((None, f"unreadable photo ({e})"))
+    return results
+
+
+# ---------- gallery format ----------
+def pack_gallery(version, employeeids, names, encodings, removed=(), enrolled=None):
+    """``encodings`` are float64 byte strings as stored on ``Employee.face_encoding``."""
+    index = json.dumps({
+        'employeeids': list(employeeids),
+        'names': list(names),
+        'removed': list(removed),
+        'enrolled': len(employeeids) if enrolled is None else enrolled,
+    }).encode()
+    header = GALLERY_HEADER.pack(GALLERY_MAGIC, len(employeeids), ENCODING_DIM, version, len(index), 0)
+    return b''.join([header, *encodings, index])
+
+
+def unpack_gallery(buffer):
+    """
+    Read a gallery from bytes or a memory map; returns ``(version, index,
+    encodings)`` where ``encodings`` is a ``(count, dim)`` float64 array
+    sharing memory with ``buffer``.
+    """
+    import numpy as np
+
+    magic, count, dim, version, index_length, _ = GALLERY_HEADER.unpack_from(buffer, 0)
+    if magic != GALLERY_MAGIC:
+        raise ValueError("Not a face gallery")
+    offset = GALLERY_HEADER.size
+    encodings = np.frombuffer(buffer, dtype='<f8', count=count * dim, offset=offset).reshape(count, dim)
+    start = offset + count * dim * 8
+    index = json.loads(bytes(buffer[start:start + index_length]).decode())
+    return version, index, encodings
@@ -0,0 +1,180 @@
+"""
+Batch analytics over the recorded camera footage shown on the camera page.
+
+``analyze_videos`` fingerprints every video in VIDEO_ANALYTICS_DIR. The
+fingerprint is a SHA-256 of the file contents plus the analysis options,
+so a video whose file and options have not changed is skipped. Changed
+videos are probed and cut into frame ranges. The ranges of all videos go
+to one process pool together (``hrapp.video`` does the per-range work),
+so a single long video still uses every core. The partial results are
+merged per video into a ``VideoAnalysis`` row: average and peak worker
+count, line crossings, helmet violations, and a per-second timeline.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from django.conf import settings
+
+from . import workers
+from .models import VideoAnalysis
+from .video import analyze_range, probe_video
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv'}
+# fewer frames than this per range is not worth a task (each range seeks and loads models)
+MIN_RANGE_FRAMES = 300
+# ranges per worker: enough to even out videos of different lengths
+RANGES_PER_WORKER = 4
+
+get_video_pool = workers.process_pool('VIDEO_ANALYTICS_WORKERS')
+
+
+def analysis_options():
+    return {
+        'person_model': settings.VIDEO_PERSON_MODEL,
+        'helmet_model': settings.VIDEO_HELMET_MODEL,
+        'sample_every': settings.VIDEO_SAMPLE_EVERY,
+        'line': settings.VIDEO_COUNT_LINE,
+        'conf': 0.4,
+    }
+
+
+def video_files(names=None):
+    """Video file names in VIDEO_ANALYTICS_DIR (or just ``names``), sorted."""
+    directory = settings.VIDEO_ANALYTICS_DIR
+    if names:
+        return sorted(names)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f for f in os.listdir(directory)
+                  if os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS)
+
+
+def fingerprint(path, options):
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def frame_ranges(frames, size, sample_every):
+    """``[start, stop)`` ranges of about ``size`` frames, each starting on a sampled frame."""
+    size = max(sample_every, size - size % sample_every)
+    return [(start, min(start + size, frames)) for start in range(0, frames, size)]
+
+
+def merge_ranges(parts, fps):
+    samples = sum(p['samples'] for p in parts)
+    buckets = {}
+    for part in parts:
+        for second, (total, count, peak, violations) in part['buckets'].items():
+            merged = buckets.setdefault(second, [0, 0, 0, 0])
+            merged[0] += total
+            merged[1] += count
+            merged[2] = max(merged[2], peak)
+            merged[3] = max(merged[3], violations)
+    return {
+        'avg_workers': round(sum(p['workers'] for p in parts) / samples, 2) if samples else 0,
+        'peak_workers': max((p['peak'] for p in parts), default=0),
+        'crossings': sum(p['crossings'] for p in parts),
+        # person-seconds without a helmet
+        'violations': sum(b[3] for b in buckets.values()),
+        'timeline': [[second, round(total / count, 2), peak, violations]
+                     for second, (total, count, peak, violations) in sorted(buckets.items())],
+    }
+
+
+# ---------- runner ----------
+def analyze_videos(names=None, force=False, progress=None):
+    """
+    Analyze changed videos; returns ``{name: 'analyzed' | 'unchanged' |
+    'failed: ...'}``. ``progress(name, outcome)`` is called per video.
+    """
+    options = analysis_options()
+    directory = settings.VIDEO_ANALYTICS_DIR
+    existing = {a.video: a for a in VideoAnalysis.objects.all()}
+    outcomes = {}
+
+    def finish(name, outcome):
+        outcomes[name] = outcome
+        if progress:
+            progress(name, outcome)
+
+    pending = {}
+    for name in video_files(names):
+        path = os.path.join(directory, name)
+        try:
+            digest = fingerprint(path, options)
+        except OSError as e:
+            finish(name, f"failed: {e}")
+            continue
+        analysis = existing.get(name)
+        if not force and analysis and analysis.fingerprint == digest and not analysis.error:
+            finish(name, 'unchanged')
+            continue
+        pending[name] = (path, digest)
+    if not pending:
+        return outcomes
+
+    pool = get_video_pool()
+    probes = {name: pool.submit(probe_video, path) for name, (path, _) in pending.items()}
+    videos = {}
+    for name, future in probes.items():
+        try:
+            videos[name] = future.result()
+        except Exception as e:
+            save_failure(name, pending[name][1], e)
+            finish(name, f"failed: {e}")
+
+    # one range size for all videos, so the pool stays busy to the end
+    total_frames = sum(frames for frames, _ in videos.values())
+    size = max(MIN_RANGE_FRAMES,
+               -(-total_frames // (settings.VIDEO_ANALYTICS_WORKERS * RANGES_PER_WORKER)))
+    futures = {
+        name: [pool.submit(analyze_range, pending[name][0], start, stop, fps, options)
+               for start, stop in frame_ranges(frames, size, options['sample_every'])]
+        for name, (frames, fps) in videos.items()
+    }
+
+    for name, parts in futures.items():
+        frames, fps = videos[name]
+        try:
+            stats = merge_ranges([f.result() for f in parts], fps)
+        except Exception as e:
+            logger.exception("Video analysis of %s failed", name)
+            save_failure(name, pending[name][1], e)
+            finish(name, f"failed: {e}")
+            continue
+        VideoAnalysis.objects.update_or_create(video=name, defaults={
+            'fingerprint': pending[name][1],
+            'frames': frames,
+            'fps': fps,
+            'duration': frames / fps if fps else 0,
+            'error': '',
+            **stats,
+        })
+        finish(name, 'analyzed')
+    return outcomes
+
+
+def save_failure(name, digest, error):
+    VideoAnalysis.objects.update_or_create(video=name, defaults={
+        'fingerprint': digest,
+        'error': str(error) or error.__class__.__name__,
+    })
+
+
+# ---------- display ----------
+def sparkline(timeline, width=300, height=40):
+    """SVG polyline points of average workers per second."""
+    if len(timeline) < 2:
+        return ''
+    first, last = timeline[0][0], timeline[-1][0]
+    top = max(point[1] for point in timeline) or 1
+    span = (last - first) or 1
+    return ' '.join(f"{(second - first) * width / span:.1f},{height - avg * height / top:.1f}"
+                    for second, avg, _, _ in timeline)
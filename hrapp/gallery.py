@@ -0,0 +1,111 @@
+"""
+Face gallery: the 128-d encodings stored on ``Employee`` and their export
+to the kiosk.
+
+An encoding is computed once per photo (admin upload or bulk import) on
+the shared face-encoding process pool, and stamped with
+``face_encoded_at``. The newest settled stamp (below) is the gallery
+version. The kiosk downloads the whole gallery at startup in a single
+request, in the binary format described in ``hrapp.faces``. Later it
+asks only for entries changed since its version, so a new hire costs one
+encoding and one small download.
+
+A stamp is taken before its transaction commits, so an encoding can
+become visible after a later-stamped one. The version handed to the
+kiosk therefore never passes an encoding younger than
+FACE_GALLERY_SETTLE_SECONDS: those are sent again in each delta until
+they are old enough that every earlier stamp has committed.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .faces import encode_faces, pack_gallery
+from .models import Employee
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_version(stamp):
+    return (stamp - EPOCH) // timedelta(microseconds=1) if stamp else 0
+
+
+def from_version(version):
+    return EPOCH + timedelta(microseconds=version)
+
+
+# ---------- enrollment ----------
+def encode_photo(data):
+    """``(encoding, error)`` for one photo, computed on the face-encoding pool."""
+    from .imports import get_face_pool
+    try:
+        [(encoding, error)] = get_face_pool().submit(encode_faces, [data]).result()
+    except Exception as e:
+        return None, f"face encoding unavailable ({e})"
+    return encoding, error
+
+
+def set_encoding(employee, encoding):
+    employee.face_encoding = encoding
+    employee.face_encoded_at = timezone.now()
+
+
+def enroll_photo(employee):
+    """
+    (Re)compute ``employee``'s encoding from its current photo, or clear it
+    when the photo was removed. Does not save; returns an error or None.
+    """
+    if not employee.photo:
+        set_encoding(employee, None)
+        return None
+    with employee.photo.open('rb') as f:
+        encoding, error = encode_photo(f.read())
+    set_encoding(employee, encoding)
+    return error
+
+
+# ---------- export ----------
+def gallery_state():
+    """``(version, enrolled)``: cheap enough to answer conditional requests."""
+    state = Employee.objects.aggregate(
+        last=Max('face_encoded_at'),
+        enrolled=Count('id', filter=~Q(face_encoding=None)),
+    )
+    return settled_version(state['last']), state['enrolled']
+
+
+def settled_version(last):
+    """The newest stamp ``last``, held back to FACE_GALLERY_SETTLE_SECONDS ago."""
+    if last is None:
+        return 0
+    return to_version(min(last, timezone.now() - timedelta(seconds=settings.FACE_GALLERY_SETTLE_SECONDS)))
+
+
+def gallery_etag(version, enrolled, since=0):
+    return f'"faces-{version}-{enrolled}-{since}"'
+
+
+def export_gallery(since=0):
+    """
+    The packed gallery. With ``since`` (a version the client already has)
+    only encodings stamped after it are included, plus the employeeids
+    whose encoding was cleared in the meantime under ``removed``.
+    """
+    version, enrolled = gallery_state()
+    qs = Employee.objects.order_by('id')
+    if since:
+        qs = qs.filter(face_encoded_at__gt=from_version(since))
+    else:
+        qs = qs.exclude(face_encoding=None)
+
+    employeeids, names, encodings, removed = [], [], [], []
+    for employeeid, name, encoding in qs.values_list('employeeid', 'name', 'face_encoding').iterator(chunk_size=2000):
+        if encoding is None:
+            removed.append(employeeid)
+            continue
+        employeeids.append(employeeid)
+        names.append(name)
+        encodings.append(bytes(encoding))
+    return version, enrolled, pack_gallery(version, employeeids, names, encodings, removed, enrolled)
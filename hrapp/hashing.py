@@ -0,0 +1,19 @@
+"""
+Password hashing for worker processes.
+
+Kept free of model imports so a spawned worker can unpickle these
+functions before Django is set up; ``init_worker`` sets it up once per
+process so ``make_password`` honours PASSWORD_HASHERS.
+"""
+import os
+
+
+def init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords):
+    from django.contrib.auth.hashers import make_password
+    return [make_password(pwd) for pwd in passwords]
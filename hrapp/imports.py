@@ -0,0 +1,402 @@
+"""
+Bulk employee import with face enrollment.
+
+An ``EmployeeImport`` holds an uploaded CSV/XLSX of employees and an
+optional ZIP of photos (named ``<employeeid>.jpg`` or ``<name>.jpg``, the
+kiosk's own convention). ``run_import`` streams the sheet once, validating
+row by row, and upserts each batch with a single
+``bulk_create(update_conflicts=True)`` keyed on employeeid; only columns
+present in the file are overwritten. Photos are encoded on a process pool
+while the database work for later batches carries on, and the encodings
+are written back with ``bulk_update`` (stamped for the kiosk gallery, see
+``hrapp.gallery``). Progress and per-row errors are recorded on the job
+as it runs.
+"""
+import csv
+import io
+import logging
+import os
+import traceback
+import zipfile
+from collections import deque
+from concurrent.futures import Future
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.validators import validate_email
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.text import get_valid_filename
+
+from . import summaries, workers
+from .faces import encode_faces
+from .models import Employee, EmployeeImport
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+# photos per worker task: large enough to amortise pickling, small enough to spread
+FACE_CHUNK = 16
+MAX_REPORTED_ERRORS = 1000
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# accepted header spellings -> Employee field
+COLUMNS = {
+    'employeeid': 'employeeid', 'employee_id': 'employeeid', 'employee id': 'employeeid',
+    'name': 'name',
+    'email': 'email',
+    'phone_no': 'phone_no', 'phone': 'phone_no',
+    'address': 'address',
+    'dob': 'dob', 'date_of_birth': 'dob', 'date of birth': 'dob',
+    'gender': 'GENDER',
+    'age': 'AGE',
+    'department': 'department',
+}
+REQUIRED_COLUMNS = ('employeeid', 'name')
+MAX_LENGTHS = {'employeeid': 50, 'name': 200, 'phone_no': 20, 'GENDER': 20, 'department': 100}
+
+get_dispatcher = workers.dispatcher('employee-imports')
+get_face_pool = workers.process_pool('FACE_ENCODING_WORKERS')
+
+
+# ---------- reading ----------
+def is_xlsx(field_file):
+    return field_file.name.lower().endswith('.xlsx')
+
+
+def read_rows(field_file):
+    """Yield every row (header first) of a CSV or XLSX upload as a list."""
+    with field_file.open('rb') as f:
+        if is_xlsx(field_file):
+            # optional dependency, only needed for spreadsheet uploads
+            from openpyxl import load_workbook
+            workbook = load_workbook(f, read_only=True, data_only=True)
+            try:
+                for row in workbook.active.iter_rows(values_only=True):
+                    yield list(row)
+            finally:
+                workbook.close()
+        else:
+            yield from csv.reader(io.TextIOWrapper(f, encoding='utf-8-sig', newline=''))
+
+
+def count_rows(field_file):
+    if is_xlsx(field_file):
+        from openpyxl import load_workbook
+        with field_file.open('rb') as f:
+            workbook = load_workbook(f, read_only=True)
+            try:
+                return max((workbook.active.max_row or 1) - 1, 0)
+            finally:
+                workbook.close()
+    return max(sum(1 for _ in read_rows(field_file)) - 1, 0)
+
+
+def photo_index(archive):
+    """Upper-cased file stem -> ZipInfo for every image in the archive."""
+    index = {}
+    for info in archive.infolist():
+        stem, ext = os.path.splitext(os.path.basename(info.filename))
+        if info.is_dir() or ext.lower() not in PHOTO_EXTENSIONS or stem.startswith('.'):
+            continue
+        index.setdefault(stem.strip().upper(), info)
+    return index
+
+
+# ---------- validation ----------
+def as_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet numbers, e.g. employeeid 1001.0
+    return str(value).strip()
+
+
+def clean_row(fields, values):
+    """Map one raw row onto Employee fields; returns ``(data, error)``."""
+    data = {}
+    for field, value in zip(fields, values):
+        if field is None:
+            continue
+        if value is not None and not isinstance(value, (date, datetime, int, float)):
+            value = as_text(value) or None
+        data[field] = value
+    for field in fields:
+        if field is not None:
+            data.setdefault(field, None)
+
+    for field, limit in MAX_LENGTHS.items():
+        if data.get(field) is not None:
+            data[field] = as_text(data[field])
+            if len(data[field]) > limit:
+                return None, f"{field} is longer than {limit} characters"
+    if not data.get('employeeid'):
+        return None, "employeeid is required"
+    if not data.get('name'):
+        return None, "name is required"
+
+    if data.get('email'):
+        try:
+            validate_email(data['email'])
+        except ValidationError:
+            return None, f"invalid email {data['email']!r}"
+    if data.get('address') is not None:
+        data['address'] = as_text(data['address'])
+
+    dob = data.get('dob')
+    if isinstance(dob, datetime):
+        data['dob'] = dob.date()
+    elif dob is not None and not isinstance(dob, date):
+        try:
+            data['dob'] = parse_date(as_text(dob))
+        except ValueError:
+            data['dob'] = None
+        if data['dob'] is None:
+            return None, f"dob {dob!r} is not a YYYY-MM-DD date"
+
+    age = data.get('AGE')
+    if age is not None:
+        try:
+            data['AGE'] = int(float(age))
+        except (TypeError, ValueError):
+            return None, f"age {age!r} is not a number"
+        if not 0 <= data['AGE'] <= 150:
+            return None, f"age {data['AGE']} is out of range"
+    return data, None
+
+
+# ---------- import job ----------
+def create_import(user, source, photos=None):
+    """Store the uploaded files on a new pending ``EmployeeImport``."""
+    job = EmployeeImport(requested_by=user if user is not None and user.is_authenticated else None)
+    job.source.save(os.path.basename(source.name), source, save=False)
+    if photos:
+        job.photos.save(os.path.basename(photos.name), photos, save=False)
+    job.save()
+    return job
+
+
+def start_import(user, source, photos=None):
+    """Create an import and hand it to the background dispatcher."""
+    with transaction.atomic():
+        job = create_import(user, source, photos)
+        job_id = job.id
+        transaction.on_commit(lambda: get_dispatcher().submit(run_background_import, job_id))
+    return job
+
+
+def run_background_import(import_id):
+    close_old_connections()
+    try:
+        run_import(import_id)
+    finally:
+        close_old_connections()
+
+
+def run_import(import_id, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Run a pending import to completion. ``progress(job)`` is called after
+    every batch. Returns the job, or None if it was already claimed.
+    """
+    claimed = (EmployeeImport.objects
+               .filter(pk=import_id, status=EmployeeImport.PENDING)
+               .update(status=EmployeeImport.RUNNING, started_at=timezone.now()))
+    if not claimed:
+        return None
+    job = EmployeeImport.objects.get(pk=import_id)
+    try:
+        EmployeeImporter(job, batch_size, progress).run()
+        job.status = EmployeeImport.DONE
+    except Exception:
+        tb = traceback.format_exc()
+        logger.error("Employee import %s failed:\n%s", import_id, tb)
+        job.status = EmployeeImport.FAILED
+        job.error = tb
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+class EmployeeImporter:
+    def __init__(self, job, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        self.job = job
+        self.batch_size = batch_size
+        self.progress = progress
+        self.errors = []
+        self.seen = {}            # employeeid -> row number, to catch duplicates in the file
+        self.pending_faces = deque()
+        self.faces_unavailable = None
+        self.photo_storage = Employee._meta.get_field('photo').storage
+
+    def run(self):
+        job = self.job
+        job.total_rows = count_rows(job.source)
+        job.save(update_fields=['total_rows'])
+
+        archive = zipfile.ZipFile(job.photos.open('rb')) if job.photos else None
+        self.photos = photo_index(archive) if archive else {}
+        self.archive = archive
+        try:
+            rows = read_rows(job.source)
+            header = next(rows, None)
+            if header is None:
+                raise ValueError("The employee file is empty.")
+            fields = self.parse_header(header)
+
+            batch = []
+            for row_no, values in enumerate(rows, start=2):
+                if not any(v not in (None, '') for v in values):
+                    continue
+                job.processed_rows += 1
+                data, error = clean_row(fields, values)
+                if error is None:
+                    first = self.seen.setdefault(data['employeeid'], row_no)
+                    if first != row_no:
+                        error = f"duplicate employeeid {data['employeeid']!r} (first seen on row {first})"
+                if error:
+                    job.invalid += 1
+                    self.add_error(row_no, error)
+                    continue
+                batch.append((row_no, data))
+                if len(batch) >= self.batch_size:
+                    self.write_batch(batch, fields)
+                    batch = []
+            if batch:
+                self.write_batch(batch, fields)
+            self.collect_faces(wait=True)
+        finally:
+            if archive:
+                archive.close()
+                job.photos.close()
+
+        # the upserts bypass the summary signals
+        summaries.rebuild_employee_stats()
+        job.total_rows = job.processed_rows
+        self.save_progress()
+
+    def parse_header(self, header):
+        fields, unknown = [], []
+        for name in header:
+            key = as_text(name).lower() if name is not None else ''
+            field = COLUMNS.get(key)
+            if field is None and key:
+                unknown.append(as_text(name))
+            fields.append(field if field not in fields else None)
+        missing = [c for c in REQUIRED_COLUMNS if c not in fields]
+        if missing:
+            raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+        if unknown:
+            self.add_error(1, f"ignored unknown column(s): {', '.join(unknown)}")
+        return fields
+
+    def add_error(self, row_no, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"row {row_no}: {message}")
+
+    # ---------- per batch ----------
+    def write_batch(self, batch, fields):
+        employeeids = [data['employeeid'] for _, data in batch]
+        # hand the photos to the workers first so encoding overlaps the upsert
+        self.submit_faces(batch)
+
+        update_fields = [f for f in fields if f not in (None, 'employeeid')] + ['updated_at']
+        with transaction.atomic():
+            existing = set(Employee.objects.filter(employeeid__in=employeeids)
+                           .values_list('employeeid', flat=True))
+            Employee.objects.bulk_create(
+                [Employee(**data) for _, data in batch],
+                update_conflicts=True,
+                unique_fields=['employeeid'],
+                update_fields=update_fields,
+            )
+        self.job.created += len(batch) - len(existing)
+        self.job.updated += len(existing)
+
+        self.collect_faces(wait=False)
+        self.save_progress()
+
+    def submit_faces(self, batch):
+        matched = []
+        for row_no, data in batch:
+            info = self.photos.get(data['employeeid'].upper()) or self.photos.get(data['name'].upper())
+            if info is not None:
+                matched.append((row_no, data['employeeid'], info))
+
+        for i in range(0, len(matched), FACE_CHUNK):
+            chunk = matched[i:i + FACE_CHUNK]
+            images = [self.archive.read(info) for _, _, info in chunk]
+            future = None
+            if not self.faces_unavailable:
+                try:
+                    future = get_face_pool().submit(encode_faces, images)
+                except Exception as e:
+                    # a broken pool refuses work; keep importing without faces
+                    self.faces_unavailable = f"face encoding unavailable ({e})"
+            if future is None:
+                # still store the photos (after the batch's upsert), but not as encodings
+                future = Future()
+                future.set_exception(RuntimeError(self.faces_unavailable))
+            self.pending_faces.append((future, chunk, images))
+            # bound the photo bytes held in memory while workers catch up
+            while len(self.pending_faces) > settings.FACE_ENCODING_WORKERS * 4:
+                self.collect_one()
+
+    def collect_faces(self, wait):
+        while self.pending_faces and (wait or self.pending_faces[0][0].done()):
+            self.collect_one()
+
+    def collect_one(self):
+        future, chunk, images = self.pending_faces.popleft()
+        try:
+            results = future.result()
+        except Exception as e:
+            # face_recognition missing in the workers, or a worker died
+            if not self.faces_unavailable:
+                self.faces_unavailable = f"face encoding unavailable ({e})"
+            results = [(None, self.faces_unavailable)] * len(chunk)
+
+        encoded, photos_only = {}, {}
+        for (row_no, employeeid, info), data, (encoding, error) in zip(chunk, images, results):
+            photo = self.save_photo(employeeid, info, data)
+            if error:
+                # keep the current encoding: a failed photo must not un-enroll anyone
+                photos_only[employeeid] = photo
+                self.job.face_errors += 1
+                self.add_error(row_no, f"photo {info.filename}: {error}")
+            else:
+                encoded[employeeid] = (photo, encoding)
+                self.job.faces_enrolled += 1
+
+        pks = dict(Employee.objects.filter(employeeid__in=[*encoded, *photos_only])
+                   .values_list('employeeid', 'id'))
+        now = timezone.now()
+        Employee.objects.bulk_update(
+            [Employee(pk=pks[e], photo=photo, face_encoding=encoding, face_encoded_at=now, updated_at=now)
+             for e, (photo, encoding) in encoded.items() if e in pks],
+            ['photo', 'face_encoding', 'face_encoded_at', 'updated_at'],
+        )
+        Employee.objects.bulk_update(
+            [Employee(pk=pks[e], photo=photo, updated_at=now) for e, photo in photos_only.items() if e in pks],
+            ['photo', 'updated_at'],
+        )
+
+    def save_photo(self, employeeid, info, data):
+        ext = os.path.splitext(info.filename)[1].lower()
+        name = f"employee_photos/{get_valid_filename(employeeid)}{ext}"
+        # replace rather than accumulate name_<suffix> copies on re-import
+        if self.photo_storage.exists(name):
+            self.photo_storage.delete(name)
+        return self.photo_storage.save(name, ContentFile(data))
+
+    def save_progress(self):
+        job = self.job
+        job.row_errors = "\n".join(self.errors)
+        EmployeeImport.objects.filter(pk=job.pk).update(
+            total_rows=job.total_rows, processed_rows=job.processed_rows,
+            created=job.created, updated=job.updated, invalid=job.invalid,
+            faces_enrolled=job.faces_enrolled, face_errors=job.face_errors,
+            row_errors=job.row_errors,
+        )
+        if self.progress:
+            self.progress(job)
@@ -0,0 +1,249 @@
+"""
+Bridge from the kiosk's raw ``attendance(id, name, time)`` table into
+``hrapp.Attendance``.
+
+Rows are read in id order after a stored high-water mark
+(``IngestionCursor``). Each batch is inserted with one ``bulk_create`` and
+the mark is advanced in the same transaction, so a crash either keeps or
+discards the whole batch and a restart resumes where it stopped. Inserts
+also ignore (employee, date) conflicts, which makes replaying a batch
+harmless.
+
+The id is a SERIAL, handed out when a kiosk transaction inserts, not
+when it commits. With several writers a row can become visible after
+rows with higher ids. So the mark never passes a row younger than
+KIOSK_INGEST_SETTLE_SECONDS: recent rows are ingested straight away but
+read again on the next batch, until they are old enough that any
+transaction holding a lower id has committed or rolled back. The window
+also has to cover clock skew between the kiosk database and this server.
+
+Rows whose name matches no employee are not dropped. Once the mark
+passes them they are parked in ``UnmatchedKioskRow`` and retried
+whenever the employee table changes (e.g. the new hire's record is
+added after the kiosk enrolled them).
+"""
+import logging
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import OperationalError, ProgrammingError, connections, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import live, summaries
+from .models import Employee, Attendance, IngestionCursor, UnmatchedKioskRow
+
+logger = logging.getLogger(__name__)
+
+KIOSK_SOURCE = 'kiosk-attendance'
+DEFAULT_BATCH_SIZE = 5000
+
+
+class EmployeeResolver:
+    """
+    Maps kiosk names (enrollment image filenames, upper-cased by the kiosk)
+    to Employee ids. Both employeeid and name are accepted; employeeid wins
+    on clashes. The map is reloaded when a batch brings a name it has not
+    seen before, so new hires are picked up without a restart; names that
+    still do not match are remembered and do not trigger further reloads
+    until ``refresh`` sees the employee table change.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.departments = {}
+        self.missing = set()
+        self.version = None
+        self.retried_version = None  # employee version the parked rows were last retried at
+        self.reload()
+
+    @staticmethod
+    def employee_version():
+        row = Employee.objects.aggregate(n=Count('id'), last=Max('updated_at'))
+        return row['n'], row['last']
+
+    def refresh(self):
+        """Reload if any employee was added, edited or deleted since the last load; returns whether it did."""
+        if self.employee_version() == self.version:
+            return False
+        self.reload()
+        self.missing = {k for k in self.missing if k not in self.ids}
+        return True
+
+    def reload(self):
+        self.version = self.employee_version()
+        by_name, by_employeeid, departments = {}, {}, {}
+        rows = Employee.objects.values_list('id', 'employeeid', 'name', 'department')
+        for pk, employeeid, name, department in rows.iterator(chunk_size=5000):
+            by_name.setdefault(name.strip().upper(), pk)
+            by_employeeid[employeeid.strip().upper()] = pk
+            departments[pk] = department
+        by_name.update(by_employeeid)
+        self.ids, self.departments = by_name, departments
+
+    def resolve(self, names):
+        keys = {n: n.strip().upper() for n in names}
+        if any(k not in self.ids and k not in self.missing for k in keys.values()):
+            self.reload()
+            self.missing = {k for k in self.missing if k not in self.ids}
+        self.missing.update(k for k in keys.values() if k not in self.ids)
+        return {n: self.ids.get(k) for n, k in keys.items()}
+
+
+def query_kiosk_table(name, sql, params):
+    """
+    Rows of ``sql`` against the kiosk's raw table ``name`` (substituted for
+    ``{table}``, quoted); none while the kiosk has not created the table.
+    """
+    alias = settings.KIOSK_DB_ALIAS
+    connection = connections[alias]
+    try:
+        # inside a transaction, a savepoint keeps a failed statement from breaking it
+        savepoint = transaction.atomic(using=alias) if connection.in_atomic_block else nullcontext()
+        with savepoint, connection.cursor() as cursor:
+            cursor.execute(sql.format(table=connection.ops.quote_name(name)), params)
+            return cursor.fetchall()
+    except (ProgrammingError, OperationalError):
+        if name in connection.introspection.table_names():
+            raise
+        return []
+
+
+def fetch_raw_rows(after, limit):
+    """Raw rows after ``after``; none while the kiosk has not created its table."""
+    return query_kiosk_table(settings.KIOSK_ATTENDANCE_TABLE,
+                             "SELECT id, name, time FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+                             [after, limit])
+
+
+def as_aware(value):
+    # the kiosk writes naive local TIMESTAMPs
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def record_check_ins(resolver, rows):
+    """
+    Insert the first check-in per employee and day among raw
+    ``(id, name, time)`` rows. Returns ``(inserted, unmatched rows)``.
+    """
+    ids = resolver.resolve({name for _, name, _ in rows})
+    # first check-in of the day wins, matching the kiosk's own dedupe
+    first_seen = {}
+    unmatched = []
+    for row in rows:
+        _, name, stamp = row
+        employee_id = ids[name]
+        if employee_id is None:
+            unmatched.append(row)
+            continue
+        check_in = as_aware(stamp)
+        key = (employee_id, timezone.localdate(check_in))
+        if key not in first_seen or check_in < first_seen[key]:
+            first_seen[key] = check_in
+    if not first_seen:
+        return 0, unmatched
+
+    days = [day for _, day in first_seen]
+    span = Attendance.objects.filter(employee_id__in={e for e, _ in first_seen},
+                                     date__range=(min(days), max(days)))
+    existing = set(span.values_list('employee_id', 'date'))
+    new = [Attendance(employee_id=e, date=day, check_in=stamp)
+           for (e, day), stamp in first_seen.items() if (e, day) not in existing]
+    if not new:
+        return 0, unmatched
+    Attendance.objects.bulk_create(new, batch_size=1000, ignore_conflicts=True)
+    # ignore_conflicts does not say which rows went in: a concurrent writer
+    # may have taken the day first, so count the rows holding our check-in
+    stored = set(span.values_list('employee_id', 'date', 'check_in'))
+    new = [row for row in new if (row.employee_id, row.date, row.check_in) in stored]
+
+    counts = {}
+    for row in new:
+        key = (row.date, resolver.departments.get(row.employee_id))
+        counts[key] = counts.get(key, 0) + 1
+    summaries.bump_attendance_counts(counts)
+    today = timezone.localdate()
+    check_ins = sum(1 for row in new if row.date == today)
+    if check_ins:
+        transaction.on_commit(lambda: live.publish({'type': 'check_ins', 'count': check_ins}))
+    return len(new), unmatched
+
+
+def settled_position(rows, now=None):
+    """
+    The id the mark may advance to: the last row before the first one
+    younger than KIOSK_INGEST_SETTLE_SECONDS, or None if that is the first.
+    """
+    now = timezone.now() if now is None else now
+    cutoff = now - timedelta(seconds=settings.KIOSK_INGEST_SETTLE_SECONDS)
+    position = None
+    for raw_id, _, stamp in rows:
+        if as_aware(stamp) > cutoff:
+            break
+        position = raw_id
+    return position
+
+
+def ingest_batch(resolver, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Ingest one batch. Returns ``(read, inserted, unmatched)``, where
+    ``read`` counts the rows the mark moved past; ``read == 0`` means the
+    feed is drained up to the settle window.
+    """
+    with transaction.atomic():
+        cursor, _ = IngestionCursor.objects.select_for_update().get_or_create(source=KIOSK_SOURCE)
+        rows = fetch_raw_rows(cursor.position, batch_size)
+        if not rows:
+            return 0, 0, 0
+
+        inserted, unmatched = record_check_ins(resolver, rows)
+        position = settled_position(rows)
+        if position is None:
+            return 0, inserted, 0
+
+        # rows in the settle window are read again next time; park only the ones passed
+        parked = [UnmatchedKioskRow(source=KIOSK_SOURCE, raw_id=raw_id, name=name, time=as_aware(stamp))
+                  for raw_id, name, stamp in unmatched if raw_id <= position]
+        UnmatchedKioskRow.objects.bulk_create(parked, ignore_conflicts=True)
+        read = sum(1 for raw_id, _, _ in rows if raw_id <= position)
+        cursor.position = position
+        cursor.save(update_fields=['position', 'updated_at'])
+
+    if parked:
+        logger.warning("Kiosk ingestion: %d row(s) with names not matching any employee", len(parked))
+    return read, inserted, len(parked)
+
+
+def retry_unmatched(resolver):
+    """Ingest parked rows whose names now match an employee; returns the number inserted."""
+    with transaction.atomic():
+        pending = UnmatchedKioskRow.objects.select_for_update().filter(source=KIOSK_SOURCE)
+        rows = list(pending.values_list('raw_id', 'name', 'time'))
+        if not rows:
+            return 0
+        inserted, unmatched = record_check_ins(resolver, rows)
+        if len(unmatched) < len(rows):
+            pending.exclude(raw_id__in=[raw_id for raw_id, _, _ in unmatched]).delete()
+    return inserted
+
+
+def ingest_available(batch_size=DEFAULT_BATCH_SIZE, resolver=None):
+    """Drain everything currently in the raw table; returns totals."""
+    resolver = resolver or EmployeeResolver()
+    resolver.refresh()
+    totals = [0, 0, 0]
+    if resolver.retried_version != resolver.version:
+        totals[1] = retry_unmatched(resolver)
+        resolver.retried_version = resolver.version
+    while True:
+        read, inserted, unmatched = ingest_batch(resolver, batch_size)
+        totals[1] += inserted
+        if not read:
+            return tuple(totals)
+        totals[0] += read
+        totals[2] += unmatched
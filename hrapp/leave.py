@@ -0,0 +1,153 @@
+"""
+Leave calendar: overlap checks on submission, who is out over a date
+range, and approved leave for the attendance analytics.
+
+A leave is the closed interval start_date..end_date. Two intervals
+overlap when each starts no later than the other ends, so every lookup
+here is ``start_date <= end AND end_date >= start``
+(``LeaveQuerySet.overlapping``) and reads through one of two indexes:
+
+* ``leave_employee_period_idx`` (employee, end_date, start_date): one
+  employee's leaves. Used by the overlap check on submission and by the
+  attendance join in ``hrapp.analytics``, a correlated EXISTS per
+  attendance row;
+* ``leave_period_idx`` (end_date, start_date): everyone's leaves, for the
+  calendar.
+
+end_date leads (after the employee) because nearly all of the table is
+leave that ended in the past. The range scan starts at the window's
+first day, so it reads only leaves still running then or booked later.
+With start_date first, every lookup would also walk through all of the
+employee's earlier leave.
+
+Pending and approved leaves both block a new application for the same
+days. Only approved leave appears on the calendar by default and excuses
+an absence in the analytics.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Employee, LeaveApplication
+
+MAX_CALENDAR_DAYS = 92
+
+
+class LeaveOverlap(Exception):
+    """The application overlaps a pending or approved leave of the same employee."""
+
+    def __init__(self, leave):
+        self.leave = leave
+        super().__init__(
+            f"You already have {leave.get_status_display().lower()} leave from "
+            f"{leave.start_date:%d %b %Y} to {leave.end_date:%d %b %Y}.")
+
+
+def default_range(length=14):
+    """The next ``length`` days, starting today."""
+    start = timezone.localdate()
+    return start, start + timedelta(days=length - 1)
+
+
+def parse_statuses(value):
+    """'approved,pending' -> a tuple of statuses (default: approved only)."""
+    if not value:
+        return (LeaveApplication.APPROVED,)
+    statuses = tuple(part.strip() for part in value.split(',') if part.strip())
+    known = {status for status, _ in LeaveApplication.STATUS_CHOICES}
+    unknown = set(statuses) - known
+    if unknown or not statuses:
+        raise ValueError(f"status must be one or more of: {', '.join(sorted(known))}")
+    return statuses
+
+
+def days(start, end):
+    """Every date from ``start`` to ``end``, inclusive."""
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+# ---------- applying ----------
+def submit_leave(employee, leave_type, start, end, reason):
+    """
+    Record a pending leave application. Raises ValueError for an
+    inverted period and LeaveOverlap when it clashes with a booked leave.
+    """
+    if start > end:
+        raise ValueError("The leave cannot end before it starts.")
+    with transaction.atomic():
+        # serialize this employee's applications, so two submissions cannot both pass the check
+        Employee.objects.select_for_update().filter(pk=employee.pk).exists()
+        clash = (LeaveApplication.objects.booked()
+                 .filter(employee=employee)
+                 .overlapping(start, end)
+                 .order_by('start_date')
+                 .first())
+        if clash is not None:
+            raise LeaveOverlap(clash)
+        return LeaveApplication.objects.create(employee=employee, leave_type=leave_type,
+                                               start_date=start, end_date=end, reason=reason)
+
+
+def upcoming_leave(employee, today, limit=10):
+    """The employee's leaves that have not ended yet, soonest first."""
+    return list(LeaveApplication.objects.filter(employee=employee, end_date__gte=today)
+                .order_by('start_date')[:limit])
+
+
+# ---------- calendar ----------
+def who_is_out(start, end, department=None, statuses=(LeaveApplication.APPROVED,)):
+    """Leaves overlapping ``start..end`` as dicts, ordered by start date and name."""
+    qs = LeaveApplication.objects.overlapping(start, end).filter(status__in=statuses)
+    if department:
+        qs = qs.filter(employee__department=department)
+    return list(qs.order_by('start_date', 'employee__name', 'id').values(
+        'id', 'employee__employeeid', 'employee__name', 'employee__department',
+        'leave_type', 'start_date', 'end_date', 'status'))
+
+
+def leave_calendar(start, end, department=None, statuses=(LeaveApplication.APPROVED,)):
+    """
+    ``{'start', 'end', 'leaves', 'days'}``: the overlapping leaves, and for
+    each day of the range the employee ids out that day. Built from the
+    overlapping rows only; nothing is read per day.
+    """
+    leaves = who_is_out(start, end, department, statuses)
+    out = {day: [] for day in days(start, end)}
+    for leave in leaves:
+        for day in days(max(start, leave['start_date']), min(end, leave['end_date'])):
+            out[day].append(leave['employee__employeeid'])
+    return {
+        'start': start,
+        'end': end,
+        'leaves': [{
+            'id': leave['id'],
+            'employeeid': leave['employee__employeeid'],
+            'name': leave['employee__name'],
+            'department': leave['employee__department'],
+            'leave_type': leave['leave_type'],
+            'start_date': leave['start_date'],
+            'end_date': leave['end_date'],
+            'status': leave['status'],
+        } for leave in leaves],
+        'days': [{'date': day, 'out': ids} for day, ids in out.items()],
+    }
+
+
+# ---------- attendance ----------
+def approved_leave_days(start, end, employees=None):
+    """``{employee_id: set of dates}`` on approved leave within ``start..end``."""
+    qs = LeaveApplication.objects.approved().overlapping(start, end)
+    if employees is not None:
+        qs = qs.filter(employee__in=employees.values('id'))
+    on_leave = {}
+    for employee_id, first, last in qs.values_list('employee_id', 'start_date', 'end_date'):
+        on_leave.setdefault(employee_id, set()).update(days(max(start, first), min(end, last)))
+    return on_leave
+
+
+def leave_version(start, end):
+    """Changes whenever a leave overlapping ``start..end`` is added, approved, rejected or edited."""
+    row = LeaveApplication.objects.overlapping(start, end).aggregate(latest=Max('updated_at'), count=Count('id'))
+    return f"{row['count']}-{row['latest'].timestamp() if row['latest'] else 0}"
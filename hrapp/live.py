@@ -0,0 +1,261 @@
+"""
+Live dashboard counters, streamed to admins as server-sent events.
+
+``metrics`` is an in-memory aggregate for today: check-ins, helmet
+violations and current occupancy per camera. It only changes through
+events:
+
+* ``check_ins`` - new Attendance rows for today (the post_save signal
+  below, and ``hrapp.ingestion`` for its bulk inserts);
+* ``violation`` / ``occupancy`` - sent by the kiosk as it recognizes;
+* ``site_occupancy`` - people on site counted once across cameras, from
+  the kiosk's re-identification service (``vision.reid``). While it keeps
+  arriving it replaces the sum of the per-camera counts, which counts a
+  worker seen by two cameras twice.
+
+Occupancy counts, per camera and for the site, are also recorded in the
+ring buffers of ``hrapp.timeseries`` for the dashboard's charts.
+
+On PostgreSQL ``publish`` sends the event with ``NOTIFY`` on
+LIVE_METRICS_CHANNEL. Delivery happens on commit, to every web process.
+Each process runs one listener thread per database (the default and
+KIOSK_DB_ALIAS), so the kiosk can notify from its own connection. On
+other databases events are applied in-process on commit. Dashboards never
+query: the counters are seeded from the day's AttendanceRollup once, when
+the first stream opens in a process.
+
+Each update is encoded once and handed to every connected stream's
+queue. A stream that falls too far behind is sent a fresh snapshot
+instead of the backlog. A (re)connecting client gets a compact snapshot
+first, unless its Last-Event-ID shows it is already current.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Attendance, AttendanceRollup
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+# updates buffered per client before it is resynced with a snapshot
+QUEUE_SIZE = 64
+# the deduplicated site count falls back to the per-camera sum when older than this
+SITE_OCCUPANCY_SECONDS = 10
+RESYNC = None
+
+
+def encode(data):
+    return json.dumps(data, separators=(',', ':'))
+
+
+class LiveMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.boot = uuid.uuid4().hex[:8]
+        self.started = False
+        self.version = 0
+        self.day = None
+        self.check_ins = 0
+        self.violations = 0
+        self.occupancy = {}
+        self.site_occupancy = None
+        self.site_reported = 0.0
+        self.subscribers = {}
+
+    def event_id(self):
+        return f"{self.boot}-{self.version}"
+
+    def start(self):
+        """Seed today's check-ins and start listening; once per process."""
+        with self._lock:
+            if self.started:
+                return
+            self.started = True
+        for alias in listen_aliases():
+            threading.Thread(target=listen, args=(alias,), name=f'live-metrics-{alias}', daemon=True).start()
+        today = timezone.localdate()
+        seeded = (AttendanceRollup.objects
+                  .filter(period=AttendanceRollup.DAY, period_start=today,
+                          department=AttendanceRollup.ALL_DEPARTMENTS)
+                  .values_list('count', flat=True).first()) or 0
+        with self._lock:
+            self.rollover(today)
+            self.check_ins = max(self.check_ins, seeded)
+
+    def rollover(self, today):
+        if self.day != today:
+            self.day = today
+            self.check_ins = 0
+            self.violations = 0
+            self.occupancy = {}
+            self.site_occupancy = None
+
+    def on_site(self):
+        if self.site_occupancy is not None and time.monotonic() - self.site_reported < SITE_OCCUPANCY_SECONDS:
+            return self.site_occupancy
+        return sum(self.occupancy.values())
+
+    def state(self):
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'check_ins': self.check_ins,
+            'violations': self.violations,
+            'occupancy': self.on_site(),
+            'cameras': self.occupancy,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            self.rollover(timezone.localdate())
+            return self.event_id(), self.state()
+
+    def apply(self, event):
+        kind, count = event.get('type'), int(event.get('count', 1))
+        samples = []  # (camera, count) for the occupancy time series
+        with self._lock:
+            day = self.day
+            self.rollover(timezone.localdate())
+            if kind == 'check_ins':
+                self.check_ins += count
+            elif kind == 'violation':
+                self.violations += count
+            elif kind == 'occupancy':
+                camera = str(event.get('camera', 'kiosk'))
+                self.occupancy[camera] = max(count, 0)
+                samples.append((camera, self.occupancy[camera]))
+            elif kind == 'site_occupancy':
+                self.site_occupancy, self.site_reported = max(count, 0), time.monotonic()
+            else:
+                return
+            if kind in ('occupancy', 'site_occupancy'):
+                from . import timeseries  # numpy: loaded with the first occupancy report
+                # a camera's change also moves the site count while it falls back to the sum
+                samples.append((timeseries.SITE, self.on_site()))
+            self.version += 1
+            update = self.state() if day != self.day else {
+                'check_ins': {'check_ins': self.check_ins},
+                'violation': {'violations': self.violations},
+                'occupancy': {'occupancy': self.on_site(), 'cameras': self.occupancy},
+                'site_occupancy': {'occupancy': self.on_site()},
+            }[kind]
+            message = f"id: {self.event_id()}\nevent: update\ndata: {encode(update)}\n\n"
+            subscribers = list(self.subscribers.items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(deliver, queue, message)
+        for camera, value in samples:
+            timeseries.store.record(camera, value)
+
+    def subscribe(self):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self.subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self.subscribers.pop(queue, None)
+
+
+def deliver(queue, message):
+    if queue.full():
+        # too far behind: drop the backlog, the client gets a snapshot instead
+        while not queue.empty():
+            queue.get_nowait()
+        message = RESYNC
+    queue.put_nowait(message)
+
+
+metrics = LiveMetrics()
+
+
+# ---------- publishing ----------
+def publish(event):
+    """Apply ``event`` to the counters of every web process once the current transaction commits."""
+    connection = connections['default']
+    if connection.vendor == 'postgresql':
+        # NOTIFY is transactional: delivered on commit, dropped on rollback
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [settings.LIVE_METRICS_CHANNEL, encode(event)])
+    else:
+        from django.db import transaction
+        transaction.on_commit(lambda: metrics.apply(event))
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, **kwargs):
+    if created and instance.date == timezone.localdate():
+        publish({'type': 'check_ins', 'count': 1})
+
+
+# ---------- listening ----------
+def listen_aliases():
+    aliases = {'default', settings.KIOSK_DB_ALIAS}
+    return sorted(a for a in aliases if connections[a].vendor == 'postgresql')
+
+
+def apply_payload(payload):
+    try:
+        metrics.apply(json.loads(payload))
+    except (ValueError, TypeError, AttributeError):
+        logger.warning("Ignoring malformed live metrics event: %r", payload)
+
+
+def listen(alias):
+    """Apply NOTIFY events from ``alias`` forever; blocks on the socket, never polls with queries."""
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    connection = connections[alias]  # this thread's own connection
+    while True:
+        try:
+            connection.ensure_connection()
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {connection.ops.quote_name(settings.LIVE_METRICS_CHANNEL)}")
+            raw = connection.connection
+            if is_psycopg3:
+                for notify in raw.notifies():
+                    apply_payload(notify.payload)
+            else:
+                while True:
+                    if select.select([raw], [], [], 60) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        apply_payload(raw.notifies.pop(0).payload)
+        except Exception:
+            logger.exception("Live metrics listener on %s failed; reconnecting", alias)
+            connection.close()
+            time.sleep(5)
+
+
+# ---------- streaming ----------
+def snapshot_event():
+    event_id, state = metrics.snapshot()
+    return f"id: {event_id}\nevent: snapshot\ndata: {encode(state)}\n\n"
+
+
+async def stream(last_event_id=None):
+    queue = metrics.subscribe()
+    try:
+        event_id, _ = metrics.snapshot()
+        if last_event_id != event_id:
+            yield snapshot_event()
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield snapshot_event() if message is RESYNC else message
+    finally:
+        metrics.unsubscribe(queue)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from hrapp.footage import analyze_videos
+
+
+class Command(BaseCommand):
+    help = ("Analyze recorded camera footage (worker counts, line crossings, helmet violations) "
+            "for the camera page. Videos unchanged since their last analysis are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('videos', nargs='*', help="File names in VIDEO_ANALYTICS_DIR (default: all).")
+        parser.add_argument('--force', action='store_true', help="Re-analyze unchanged videos too.")
+
+    def handle(self, *args, **options):
+        outcomes = analyze_videos(options['videos'], force=options['force'], progress=self.report)
+        failed = sum(1 for outcome in outcomes.values() if outcome.startswith('failed'))
+        style = self.style.ERROR if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{len(outcomes)} video(s), {failed} failed."))
+
+    def report(self, name, outcome):
+        self.stdout.write(f"{name}: {outcome}")
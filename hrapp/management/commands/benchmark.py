@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management import call_command
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+from hrapp import benchmarks, reports
+
+
+class Command(BaseCommand):
+    help = ("Load-test the HR endpoints against a test database seeded with synthetic data: "
+            "latency percentiles, queries per request and peak memory per endpoint. "
+            "Save a baseline with --save and diff a later run against it with --compare.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help=f"Scenarios to run (default: all): {', '.join(s[0] for s in benchmarks.SCENARIOS)}.")
+        parser.add_argument('--employees', type=int, default=10000)
+        parser.add_argument('--attendance', type=int, default=500000, help="Attendance rows.")
+        parser.add_argument('--reviews', type=int, default=20000, help="Performance review rows.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Client threads per scenario.")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the test database, and reuse its data if it has the requested scale.")
+        parser.add_argument('--save', metavar='PATH', help="Write the results as a JSON baseline.")
+        parser.add_argument('--compare', metavar='PATH', help="Diff the results against a saved baseline.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative latency/memory increase reported as a regression (default 0.2).")
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - {s[0] for s in benchmarks.SCENARIOS}
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        baseline = benchmarks.load_baseline(options['compare']) if options['compare'] else None
+        scale = {name: options[name] for name in ('employees', 'attendance', 'reviews')}
+
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=options['verbosity'], interactive=False, keepdb=options['keepdb'])
+        try:
+            if benchmarks.seeded_counts() != scale:
+                call_command('flush', interactive=False, verbosity=0)
+                benchmarks.seed(batch_size=options['batch_size'], progress=self.stdout.write, **scale)
+            else:
+                self.stdout.write("Reusing the seeded test database.")
+            results = benchmarks.run(options['scenarios'], options['requests'], options['concurrency'],
+                                     progress=self.report)
+            # let the queued PDF job finish before its database goes away
+            reports.get_dispatcher().shutdown(wait=True)
+        finally:
+            teardown_databases(old_config, verbosity=options['verbosity'], keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['save']:
+            benchmarks.save_baseline(options['save'], scale, options['concurrency'], results)
+            self.stdout.write(f"Baseline written to {options['save']}.")
+        if baseline is not None:
+            self.compare(baseline, scale, results, options['threshold'])
+
+    def report(self, name, stats):
+        style = self.style.ERROR if stats['errors'] else str
+        self.stdout.write(style(
+            f"{name:<22} p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms  "
+            f"p99 {stats['p99_ms']:>8.1f} ms  {stats['rps']:>7.1f} req/s  {stats['queries']:>3} queries  "
+            f"peak {stats['peak_kib']:>9.1f} KiB  {stats['errors']} error(s) {stats['statuses']}"))
+
+    def compare(self, baseline, scale, results, threshold):
+        if baseline['scale'] != scale:
+            self.stdout.write(self.style.WARNING(f"Baseline was recorded at a different scale: {baseline['scale']}"))
+        rows, regressions = benchmarks.compare(baseline, results, threshold)
+        for row in rows:
+            name, metric, old, new, change = row
+            line = f"{name:<22} {metric:<9} {old:>10} -> {new:>10}  {change:+.0%}"
+            self.stdout.write(self.style.ERROR(line) if row in regressions else line)
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,44 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from hrapp.imports import DEFAULT_BATCH_SIZE, create_import, run_import
+from hrapp.models import EmployeeImport
+
+
+class Command(BaseCommand):
+    help = ("Create or update employees from a CSV/XLSX file, optionally enrolling faces "
+            "from a ZIP of photos named <employeeid>.jpg or <name>.jpg.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="CSV or XLSX with an employeeid and name column.")
+        parser.add_argument('--photos', help="ZIP archive of enrollment photos.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        paths = [options['file']] + ([options['photos']] if options['photos'] else [])
+        for path in paths:
+            if not os.path.isfile(path):
+                raise CommandError(f"No such file: {path}")
+
+        with open(options['file'], 'rb') as source:
+            photos = open(options['photos'], 'rb') if options['photos'] else None
+            try:
+                job = create_import(None, File(source), File(photos) if photos else None)
+            finally:
+                if photos:
+                    photos.close()
+
+        job = run_import(job.pk, options['batch_size'], progress=self.report_progress)
+        for line in job.row_errors.splitlines():
+            self.stderr.write(line)
+        if job.status == EmployeeImport.FAILED:
+            raise CommandError(job.error.strip().splitlines()[-1])
+        self.stdout.write(self.style.SUCCESS(
+            f"Import #{job.pk}: {job.created} created, {job.updated} updated, {job.invalid} invalid, "
+            f"{job.faces_enrolled} face(s) enrolled, {job.face_errors} photo error(s)."
+        ))
+
+    def report_progress(self, job):
+        self.stdout.write(f"{job.processed_rows}/{job.total_rows} row(s) processed")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from hrapp.ingestion import DEFAULT_BATCH_SIZE, EmployeeResolver, ingest_available
+
+
+class Command(BaseCommand):
+    help = ("Copy new rows from the kiosk's raw attendance table into hrapp.Attendance. "
+            "Safe to stop and restart at any point; each row is ingested exactly once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--follow', action='store_true',
+                            help="Keep running and poll for new rows.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep between polls with --follow.")
+
+    def handle(self, *args, **options):
+        resolver = EmployeeResolver()
+        while True:
+            started = time.monotonic()
+            read, inserted, unmatched = ingest_available(options['batch_size'], resolver)
+            if read or not options['follow']:
+                self.stdout.write(
+                    f"Read {read} raw row(s), inserted {inserted}, "
+                    f"{unmatched} unmatched, in {time.monotonic() - started:.1f}s"
+                )
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from hrapp.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = ("Recompute the headcount and attendance summary tables from scratch. "
+            "Run periodically (e.g. nightly) to fold in writes that bypassed signals.")
+
+    def handle(self, *args, **options):
+        rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS("Summary tables rebuilt."))
@@ -0,0 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from hrapp import timeseries
+from hrapp.live import metrics
+
+
+class Command(BaseCommand):
+    help = ("Record per-camera occupancy from the kiosk's live events and write minute/hour "
+            "rollups for the dashboard charts. Run one instance alongside the web workers.")
+
+    def handle(self, *args, **options):
+        # the same NOTIFY listener the dashboards use; it feeds timeseries.store
+        metrics.start()
+        while True:
+            time.sleep(settings.TIMESERIES_FLUSH_SECONDS)
+            written = timeseries.flush()
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Wrote {written} occupancy rollup(s).")
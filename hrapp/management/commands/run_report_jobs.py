@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from hrapp.reports import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Build any pending PDF report jobs (e.g. left over after a worker restart)."
+
+    def handle(self, *args, **options):
+        count = run_pending_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} pending report job(s)."))
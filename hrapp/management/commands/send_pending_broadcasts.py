@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from hrapp.notifications import send_unfinished_broadcasts
+
+
+class Command(BaseCommand):
+    help = "Finish sending broadcasts that were left unsent (e.g. after a worker restart)."
+
+    def handle(self, *args, **options):
+        count = send_unfinished_broadcasts()
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} unfinished broadcast(s)."))
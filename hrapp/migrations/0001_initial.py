@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Employee',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employeeid', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('phone_no', models.CharField(blank=True, max_length=20, null=True)),
+                ('address', models.TextField(blank=True, null=True)),
+                ('dob', models.DateField(blank=True, null=True)),
+                ('GENDER', models.CharField(blank=True, max_length=20, null=True)),
+                ('AGE', models.IntegerField(blank=True, null=True)),
+                ('JAN', models.IntegerField(default=0)),
+                ('FEB', models.IntegerField(default=0)),
+                ('MAR', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.FloatField()),
+                ('date', models.DateField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hrapp.employee')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaveApplication',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leave_type', models.CharField(max_length=100)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('reason', models.TextField()),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hrapp.employee')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PerformanceReview',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('performance', models.TextField(blank=True, null=True)),
+                ('feedbacks', models.TextField(blank=True, null=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hrapp.employee')),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:29
+
+from django.db import migrations, models
+
+
+# Trigram indexes matching the UPPER(col::text) LIKE '%q%' that icontains
+# compiles to on PostgreSQL, so the table search does not scan every row.
+# Other backends (e.g. SQLite in local runs) simply skip them.
+TRIGRAM_COLUMNS = ('employeeid', 'name', 'email')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS employee_{column}_trgm '
+            f'ON hrapp_employee USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS employee_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0002_employee_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['name', 'id'], name='employee_name_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:34
+
+from datetime import datetime, time, timedelta
+from itertools import groupby
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+LEGACY_MONTHS = ('JAN', 'FEB', 'MAR')
+
+
+def forwards(apps, schema_editor):
+    """
+    Turn the float ``time`` (read as hours after midnight on ``date``) into
+    a real ``check_in`` timestamp, fold same-day duplicates into one row
+    (earliest check-in, latest as check-out) so the (employee, date)
+    unique constraint can be added, and archive the JAN/FEB/MAR columns.
+    """
+    Attendance = apps.get_model('hrapp', 'Attendance')
+    Employee = apps.get_model('hrapp', 'Employee')
+    LegacyMonthlyAttendance = apps.get_model('hrapp', 'LegacyMonthlyAttendance')
+    tz = timezone.get_current_timezone()
+
+    def check_in(day, hours):
+        if hours is None or not 0 <= hours < 24:
+            hours = 0
+        return timezone.make_aware(datetime.combine(day, time.min), tz) + timedelta(hours=hours)
+
+    def flush(keep, drop):
+        Attendance.objects.bulk_update(keep, ['check_in', 'check_out'])
+        Attendance.objects.filter(pk__in=drop).delete()
+        keep.clear()
+        drop.clear()
+
+    # rows arrive grouped by (employee, date), so stream one day at a time
+    keep, drop = [], []
+    rows = Attendance.objects.order_by('employee_id', 'date', 'id').values_list('id', 'employee_id', 'date', 'time')
+    for _, entries in groupby(rows.iterator(chunk_size=2000), key=lambda row: (row[1], row[2])):
+        stamps = sorted((check_in(day, hours), pk) for pk, _, day, hours in entries)
+        first_stamp, first_pk = stamps[0]
+        keep.append(Attendance(pk=first_pk, check_in=first_stamp,
+                               check_out=stamps[-1][0] if len(stamps) > 1 else None))
+        drop.extend(pk for _, pk in stamps[1:])
+        if len(keep) >= 1000:
+            flush(keep, drop)
+    flush(keep, drop)
+
+    legacy = []
+    for employee_id, *counts in Employee.objects.values_list('id', *LEGACY_MONTHS).iterator():
+        legacy.extend(LegacyMonthlyAttendance(employee_id=employee_id, month=month, count=count)
+                      for month, count in zip(LEGACY_MONTHS, counts) if count)
+    LegacyMonthlyAttendance.objects.bulk_create(legacy, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0005_summary_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LegacyMonthlyAttendance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=3)),
+                ('count', models.IntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='hrapp.employee')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='check_in',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='check_out',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(blank=True),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
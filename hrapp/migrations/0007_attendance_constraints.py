@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+# Kept separate from 0006 so the data rewrite is committed before the
+# tables are altered (PostgreSQL refuses ALTER TABLE with pending triggers).
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0006_attendance_timestamps'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='attendance',
+            name='time',
+        ),
+        migrations.RemoveField(
+            model_name='employee',
+            name='FEB',
+        ),
+        migrations.RemoveField(
+            model_name='employee',
+            name='JAN',
+        ),
+        migrations.RemoveField(
+            model_name='employee',
+            name='MAR',
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'employee'], name='attendance_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('employee', 'date'), name='attendance_employee_day_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='legacymonthlyattendance',
+            constraint=models.UniqueConstraint(fields=('employee', 'month'), name='legacy_monthly_unique'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:04
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_existing(apps, schema_editor):
+    # encodings written by bulk imports before the gallery was versioned
+    Employee = apps.get_model('hrapp', 'Employee')
+    Employee.objects.exclude(face_encoding=None).update(face_encoded_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0011_employee_import'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='face_encoded_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(stamp_existing, migrations.RunPython.noop),
+    ]
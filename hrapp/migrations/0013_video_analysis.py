@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0012_employee_face_encoded_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoAnalysis',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video', models.CharField(max_length=255, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('frames', models.IntegerField(default=0)),
+                ('fps', models.FloatField(default=0)),
+                ('duration', models.FloatField(default=0)),
+                ('avg_workers', models.FloatField(default=0)),
+                ('peak_workers', models.IntegerField(default=0)),
+                ('crossings', models.IntegerField(default=0)),
+                ('violations', models.IntegerField(default=0)),
+                ('timeline', models.JSONField(blank=True, default=list)),
+                ('error', models.TextField(blank=True)),
+                ('analyzed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0013_video_analysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('camera', models.CharField(max_length=100)),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=6)),
+                ('start', models.DateTimeField()),
+                ('min', models.FloatField()),
+                ('avg', models.FloatField()),
+                ('max', models.FloatField()),
+                ('samples', models.IntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('camera', 'resolution', 'start'), name='occupancy_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0016_attendance_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnmatchedKioskRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=100)),
+                ('raw_id', models.BigIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('time', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'raw_id'), name='unmatched_kiosk_row_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:50
+
+import hrapp.models
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def delete_public_exports(apps, schema_editor):
+    # files written before this migration sit under MEDIA_ROOT; remove them
+    CredentialExport = apps.get_model('hrapp', 'CredentialExport')
+    for export in CredentialExport.objects.exclude(file=''):
+        if default_storage.exists(export.file.name):
+            default_storage.delete(export.file.name)
+        export.file = ''
+        export.save(update_fields=['file'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0018_broadcast_delivery_claims'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_public_exports, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='credentialexport',
+            name='file',
+            field=models.FileField(blank=True, storage=hrapp.models.private_storage, upload_to=hrapp.models.credential_export_path),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fail_duplicate_jobs(apps, schema_editor):
+    # keep the newest live job per version; older duplicates become failed
+    ReportJob = apps.get_model('hrapp', 'ReportJob')
+    seen = set()
+    for job in ReportJob.objects.exclude(status='failed').order_by('-created_at', '-id'):
+        if job.data_version in seen:
+            job.status = 'failed'
+            job.error = "Duplicate of a newer job for the same data"
+            job.save(update_fields=['status', 'error'])
+        seen.add(job.data_version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hrapp', '0019_private_credential_exports'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'failed'), _negated=True), fields=('data_version',), name='reportjob_live_version_unique'),
+        ),
+    ]
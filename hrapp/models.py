@@ -1,5 +1,12 @@
+import secrets
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.db.models.functions import TruncMonth
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Employee(models.Model):
     employeeid = models.CharField(max_length=50, unique=True)
@@ -10,28 +17,368 @@ class Employee(models.Model):
     dob = models.DateField(blank=True, null=True)
     GENDER = models.CharField(max_length=20, blank=True, null=True)
     AGE = models.IntegerField(blank=True, null=True)
-    JAN = models.IntegerField(default=0)
-    FEB = models.IntegerField(default=0)
-    MAR = models.IntegerField(default=0)
+    department = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    # enrollment photo and its 128-d face encoding (float64 bytes), maintained by hrapp.gallery
+    photo = models.ImageField(upload_to='employee_photos/', blank=True)
+    face_encoding = models.BinaryField(blank=True, null=True)
+    # set whenever face_encoding changes (also when cleared); the gallery version
+    face_encoded_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    # bumped on every save; drives incremental sync on the /data/ API
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='employee_updated_idx'),
+            # keyset sort on the employee table view (employeeid is already unique)
+            models.Index(fields=['name', 'id'], name='employee_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employeeid} - {self.name}"
 
+class AttendanceQuerySet(models.QuerySet):
+    def between(self, start, end):
+        """Rows with start <= date <= end (inclusive); uses attendance_date_idx."""
+        return self.filter(date__range=(start, end))
+
+    def counts_by_month(self):
+        """(first day of month, attendance count) pairs, oldest first."""
+        return (self.annotate(month=TruncMonth('date'))
+                .values_list('month')
+                .annotate(n=models.Count('id'))
+                .order_by('month'))
+
 class Attendance(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
-    time = models.FloatField()  # or DateTimeField if you have timestamps
-    date = models.DateField(auto_now_add=True)
+    # local calendar day of check_in; filled in by save() when not given
+    date = models.DateField(blank=True)
+    check_in = models.DateTimeField(default=timezone.now)
+    check_out = models.DateTimeField(blank=True, null=True)
+    # bumped by every save (check-out, corrections); versions cached analytics and reports
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AttendanceQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'date'], name='attendance_employee_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'employee'], name='attendance_date_idx'),
+            models.Index(fields=['updated_at'], name='attendance_updated_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.date is None:
+            self.date = timezone.localdate(self.check_in)
+        super().save(*args, **kwargs)
+
+class LegacyMonthlyAttendance(models.Model):
+    # The hand-entered JAN/FEB/MAR totals that used to live on Employee,
+    # kept for reference; they carry no year so cannot become Attendance rows.
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    month = models.CharField(max_length=3)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'month'], name='legacy_monthly_unique'),
+        ]
 
 class PerformanceReview(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
     performance = models.TextField(blank=True, null=True)
     feedbacks = models.TextField(blank=True, null=True)
 
+class LeaveQuerySet(models.QuerySet):
+    def overlapping(self, start, end):
+        """Leaves sharing at least one day with start..end (inclusive); see hrapp.leave for the indexes."""
+        return self.filter(start_date__lte=end, end_date__gte=start)
+
+    def booked(self):
+        """Pending or approved: the leaves a new application must not overlap."""
+        return self.exclude(status=LeaveApplication.REJECTED)
+
+    def approved(self):
+        return self.filter(status=LeaveApplication.APPROVED)
+
 class LeaveApplication(models.Model):
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (APPROVED, 'Approved'),
+        (REJECTED, 'Rejected'),
+    ]
+
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
     leave_type = models.CharField(max_length=100)
+    # both inclusive
     start_date = models.DateField()
     end_date = models.DateField()
     reason = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
     applied_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every save (approval, rejection); part of the analytics cache key
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = LeaveQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # one employee's leaves: the overlap check and the attendance join
+            models.Index(fields=['employee', 'end_date', 'start_date'], name='leave_employee_period_idx'),
+            # everyone's leaves around a date range (the calendar); see hrapp.leave
+            models.Index(fields=['end_date', 'start_date'], name='leave_period_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id}: {self.start_date} - {self.end_date} ({self.status})"
+
+    def clean(self):
+        if self.start_date and self.end_date and self.start_date > self.end_date:
+            raise ValidationError("The leave cannot end before it starts.")
+
+class ReportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    # fingerprint of the employee/attendance tables the report was built from
+    data_version = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    pdf = models.FileField(upload_to='reports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            # at most one live job per version, so concurrent first requests share it
+            models.UniqueConstraint(fields=['data_version'], condition=~models.Q(status='failed'),
+                                    name='reportjob_live_version_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['data_version', 'status'], name='reportjob_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"Report #{self.pk} ({self.status})"
+
+# ---------- precomputed summaries (maintained by hrapp.summaries) ----------
+class AttendanceRollup(models.Model):
+    DAY = 'day'
+    MONTH = 'month'
+    PERIOD_CHOICES = [(DAY, 'Day'), (MONTH, 'Month')]
+    ALL_DEPARTMENTS = ''
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # first day of the day/month bucket
+    period_start = models.DateField()
+    # ALL_DEPARTMENTS holds the site-wide total for the bucket
+    department = models.CharField(max_length=100, blank=True, default=ALL_DEPARTMENTS)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'department'],
+                                    name='attendance_rollup_unique'),
+        ]
+
+class EmployeeStat(models.Model):
+    TOTAL = 'total'
+    GENDER = 'gender'
+    DEPARTMENT = 'department'
+    KIND_CHOICES = [(TOTAL, 'Total'), (GENDER, 'Gender'), (DEPARTMENT, 'Department')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=100, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='employee_stat_unique'),
+        ]
+
+class IngestionCursor(models.Model):
+    # high-water mark of an external feed (e.g. the kiosk's raw attendance table)
+    source = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.position}"
+
+class UnmatchedKioskRow(models.Model):
+    # a raw kiosk row whose name matched no employee, kept for a retry once one does
+    source = models.CharField(max_length=100)
+    raw_id = models.BigIntegerField()
+    name = models.CharField(max_length=255)
+    time = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'raw_id'], name='unmatched_kiosk_row_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.source} #{self.raw_id})"
+
+class Broadcast(models.Model):
+    ALL = 'all'
+    DEPARTMENT = 'department'
+    SELECTED = 'selected'
+    TARGET_CHOICES = [(ALL, 'All employees'), (DEPARTMENT, 'Department'), (SELECTED, 'Selected employees')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    target = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    department = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.get_target_display()})"
+
+class BroadcastDelivery(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='deliveries')
+    employee = models.ForeignKey(Employee, on_delete=models.SET_NULL, blank=True, null=True)
+    email = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    # when a sender last claimed it (status SENDING) or last tried it (PENDING retry)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['broadcast', 'status'], name='delivery_status_idx'),
+        ]
+
+class PrivateFileStorage(FileSystemStorage):
+    """Files under PRIVATE_STORAGE_ROOT, outside MEDIA_ROOT. They have no URL; only views serve them."""
+
+    def url(self, name):
+        raise ValueError("Private files have no URL.")
+
+def private_storage():
+    return PrivateFileStorage(location=settings.PRIVATE_STORAGE_ROOT)
+
+def credential_export_path(instance, filename):
+    return f"credentials/{secrets.token_urlsafe(24)}.csv"
+
+class CredentialExport(models.Model):
+    CREATE = 'create'
+    RESET = 'reset'
+    ACTION_CHOICES = [(CREATE, 'Create accounts'), (RESET, 'Reset passwords')]
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # CSV of username,password; deleted on download or after CREDENTIAL_EXPORT_TTL_MINUTES
+    file = models.FileField(upload_to=credential_export_path, storage=private_storage, blank=True)
+    processed = models.IntegerField(default=0)
+    skipped = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    downloaded_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.get_action_display()} #{self.pk} ({self.status})"
+
+class EmployeeImport(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # CSV or XLSX of employees, plus an optional ZIP of photos named by employeeid or name
+    source = models.FileField(upload_to='imports/')
+    photos = models.FileField(upload_to='imports/', blank=True)
+    # counted before the first batch so progress can be shown
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    created = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    invalid = models.IntegerField(default=0)
+    faces_enrolled = models.IntegerField(default=0)
+    face_errors = models.IntegerField(default=0)
+    # "row N: message" per line (capped, see hrapp.imports.MAX_REPORTED_ERRORS)
+    row_errors = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Employee import #{self.pk} ({self.status})"
+
+class VideoAnalysis(models.Model):
+    # file name under VIDEO_ANALYTICS_DIR, e.g. "workerscount.mp4"
+    video = models.CharField(max_length=255, unique=True)
+    # SHA-256 of the file and analysis options; unchanged videos are skipped
+    fingerprint = models.CharField(max_length=64)
+    frames = models.IntegerField(default=0)
+    fps = models.FloatField(default=0)
+    duration = models.FloatField(default=0)
+    avg_workers = models.FloatField(default=0)
+    peak_workers = models.IntegerField(default=0)
+    crossings = models.IntegerField(default=0)
+    violations = models.IntegerField(default=0)
+    # [[second, avg workers, peak workers, helmet violations], ...]
+    timeline = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    analyzed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.video
+
+class OccupancyRollup(models.Model):
+    """Per-camera worker counts downsampled by hrapp.timeseries (min/avg/max per bucket)."""
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    RESOLUTION_CHOICES = [(MINUTE, 'Minute'), (HOUR, 'Hour')]
+
+    # camera name from the kiosk, or "site" for the deduplicated site-wide count
+    camera = models.CharField(max_length=100)
+    resolution = models.CharField(max_length=6, choices=RESOLUTION_CHOICES)
+    start = models.DateTimeField()
+    min = models.FloatField()
+    avg = models.FloatField()
+    max = models.FloatField()
+    # one-second samples in the bucket
+    samples = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # also the index the dashboard's range reads use
+            models.UniqueConstraint(fields=['camera', 'resolution', 'start'],
+                                    name='occupancy_rollup_unique'),
+        ]
@@ -0,0 +1,196 @@
+"""
+Broadcast e-mail notifications.
+
+``create_broadcast`` stores the rendered subject/body once, writes one
+``BroadcastDelivery`` row per recipient and hands the broadcast to a
+background dispatcher thread, so the admin's request returns straight
+away. ``send_broadcast`` then sends over a single reused mail connection,
+in batches, capped at NOTIFICATION_RATE_PER_MINUTE, retrying failed
+recipients up to NOTIFICATION_MAX_ATTEMPTS times and recording the
+outcome per recipient. Works with any EMAIL_BACKEND (smtp, locmem, file).
+
+Deliveries are claimed a batch at a time (PENDING -> SENDING, stamped
+``claimed_at``) before anything is sent, so the dispatcher and
+``manage.py send_pending_broadcasts`` can work on the same broadcast
+without mailing anyone twice. A claim older than the lease (one batch at
+the rate cap plus CLAIM_MARGIN) is assumed to belong to a dead sender
+and is taken over.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import workers
+from .models import Employee, Broadcast, BroadcastDelivery
+
+logger = logging.getLogger(__name__)
+
+# seconds to wait before retrying a failed recipient
+RETRY_BACKOFF = 30
+# seconds a claimed batch may take beyond its rate-capped send time
+CLAIM_MARGIN = 300
+
+get_dispatcher = workers.dispatcher('broadcasts')
+
+
+def build_message(post):
+    """
+    Validate the notification form and return ``(subject, body, error)``;
+    ``error`` is None when the form is usable.
+    """
+    email_type = post.get('email_type')
+    if email_type not in ('shift_change', 'custom_message'):
+        return None, None, "Invalid email type."
+
+    if email_type == 'shift_change':
+        shift_number = post.get('shift_number', '').strip()
+        shift_time = post.get('shift_time', '').strip()
+        if not shift_number or not shift_time:
+            return None, None, "Shift number and shift time are required for shift notifications."
+        subject = f"Shift Change Notification for Shift {shift_number}"
+        body = f"Dear Employee,\n\nYour shift has been changed to Shift {shift_number} at {shift_time}.\n\n"
+    else:
+        subject = post.get('custom_subject', '').strip() or "Notification"
+        body = post.get('custom_message', '').strip()
+        if not body:
+            return None, None, "Custom message cannot be empty."
+    return subject, body, None
+
+
+def recipients_for(target, department='', employee_ids=()):
+    qs = Employee.objects.exclude(email__isnull=True).exclude(email__exact='')
+    if target == Broadcast.DEPARTMENT:
+        qs = qs.filter(department=department)
+    elif target == Broadcast.SELECTED:
+        qs = qs.filter(pk__in=employee_ids)
+    return qs.order_by('id').values_list('id', 'email')
+
+
+def create_broadcast(subject, body, target, user=None, department='', employee_ids=()):
+    """Queue a broadcast; returns ``(broadcast, recipient_count)``."""
+    with transaction.atomic():
+        broadcast = Broadcast.objects.create(
+            subject=subject,
+            body=body,
+            target=target,
+            department=department if target == Broadcast.DEPARTMENT else '',
+            created_by=user if user is not None and user.is_authenticated else None,
+        )
+        deliveries, seen = [], set()
+        for employee_id, email in recipients_for(target, department, employee_ids).iterator():
+            if email.lower() in seen:
+                continue
+            seen.add(email.lower())
+            deliveries.append(BroadcastDelivery(broadcast=broadcast, employee_id=employee_id, email=email))
+        BroadcastDelivery.objects.bulk_create(deliveries, batch_size=1000)
+
+        broadcast_id = broadcast.id
+        transaction.on_commit(lambda: get_dispatcher().submit(send_broadcast, broadcast_id))
+    return broadcast, len(deliveries)
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def claim_batch(broadcast_id, size, max_attempts, lease, backoff):
+    """
+    Mark up to ``size`` sendable deliveries SENDING for this sender and
+    return them as ``[(id, email)]``. Sendable: never tried, failed more
+    than ``backoff`` seconds ago, or claimed longer than ``lease`` ago.
+    """
+    now = timezone.now()
+    sendable = (Q(status=BroadcastDelivery.PENDING, attempts=0)
+                | Q(status=BroadcastDelivery.PENDING, claimed_at__lte=now - backoff)
+                | Q(status=BroadcastDelivery.SENDING, claimed_at__lt=now - lease))
+    candidates = BroadcastDelivery.objects.filter(sendable, broadcast_id=broadcast_id, attempts__lt=max_attempts)
+    with transaction.atomic():
+        ids = list(candidates.select_for_update(skip_locked=True)
+                   .order_by('id').values_list('id', flat=True)[:size])
+        # conditional, so a sender on a backend without row locks cannot take the same rows
+        candidates.filter(pk__in=ids).update(status=BroadcastDelivery.SENDING, claimed_at=now)
+    return list(BroadcastDelivery.objects
+                .filter(pk__in=ids, status=BroadcastDelivery.SENDING, claimed_at=now)
+                .order_by('id').values_list('id', 'email'))
+
+
+def send_broadcast(broadcast_id, backoff=RETRY_BACKOFF):
+    close_old_connections()
+    try:
+        broadcast = Broadcast.objects.get(pk=broadcast_id)
+        max_attempts = settings.NOTIFICATION_MAX_ATTEMPTS
+        interval = 60.0 / max(settings.NOTIFICATION_RATE_PER_MINUTE, 1)
+        batch_size = settings.NOTIFICATION_BATCH_SIZE
+        lease = timedelta(seconds=batch_size * interval + CLAIM_MARGIN)
+        next_send = time.monotonic()
+
+        connection = get_connection()
+        connection.open()
+        try:
+            while True:
+                batch = claim_batch(broadcast_id, batch_size, max_attempts, lease, timedelta(seconds=backoff))
+                if not batch:
+                    unsent = broadcast.deliveries.filter(
+                        status__in=(BroadcastDelivery.PENDING, BroadcastDelivery.SENDING), attempts__lt=max_attempts)
+                    if not unsent.filter(status=BroadcastDelivery.PENDING).exists():
+                        # done, or the rest is claimed by another sender, which finishes it
+                        break
+                    time.sleep(backoff)
+                    continue
+                sent, failed = [], []
+                for delivery_id, email in batch:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_send = max(next_send, time.monotonic()) + interval
+                    message = EmailMessage(broadcast.subject, broadcast.body, to=[email], connection=connection)
+                    try:
+                        connection.send_messages([message])
+                        sent.append(delivery_id)
+                    except Exception as e:
+                        failed.append((delivery_id, str(e)))
+                        # the connection may be dead; start a fresh one for the rest
+                        connection.close()
+                        connection.open()
+                record_batch(sent, failed, max_attempts)
+        finally:
+            connection.close()
+
+        if not unsent.exists():
+            Broadcast.objects.filter(pk=broadcast_id, finished_at__isnull=True).update(finished_at=timezone.now())
+    except Exception:
+        logger.exception("Broadcast %s aborted", broadcast_id)
+    finally:
+        close_old_connections()
+
+
+def record_batch(sent, failed, max_attempts):
+    if sent:
+        BroadcastDelivery.objects.filter(pk__in=sent).update(
+            status=BroadcastDelivery.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, error='')
+    for delivery_id, error in failed:
+        # back to PENDING; claimed_at now marks the failed try for the retry backoff
+        BroadcastDelivery.objects.filter(pk=delivery_id).update(
+            status=BroadcastDelivery.PENDING, claimed_at=timezone.now(), attempts=F('attempts') + 1, error=error)
+    if failed:
+        BroadcastDelivery.objects.filter(
+            pk__in=[d for d, _ in failed], attempts__gte=max_attempts,
+        ).update(status=BroadcastDelivery.FAILED)
+
+
+def send_unfinished_broadcasts():
+    """
+    Synchronously finish broadcasts left unsent (e.g. after a restart).
+    Deliveries another sender is working on are left to it.
+    """
+    pending = list(Broadcast.objects.filter(finished_at__isnull=True).order_by('id').values_list('id', flat=True))
+    for broadcast_id in pending:
+        send_broadcast(broadcast_id)
+    return len(pending)
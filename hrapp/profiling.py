@@ -0,0 +1,227 @@
+"""
+Per-request profiling.
+
+``ProfilingMiddleware`` counts the SQL queries a request runs and the time
+spent in them (through ``execute_wrapper`` on every database alias), times
+template rendering (through ``ProfilingDjangoTemplates``, the template
+backend configured in settings) and measures the response size. The
+figures go out in a ``Server-Timing`` header and are folded into
+per-URL-name aggregates for the staff profiling page; those aggregates
+live in memory, one set per worker process.
+
+Views declare a query budget with ``@query_budget(n)`` (PROFILING_QUERY_BUDGETS
+overrides it by URL name). Going over budget logs a warning, or raises
+``QueryBudgetExceeded`` when PROFILING_STRICT_BUDGETS is on (the default
+with DEBUG and under ``manage.py test``), so any test-client request that
+hits an N+1 regression fails. ``hrapp.tests`` drives the budgeted views
+with seeded data.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED = '(unresolved)'
+SAVEPOINT_SQL = ('SAVEPOINT ', 'RELEASE SAVEPOINT ', 'ROLLBACK TO SAVEPOINT ')
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db_time', 'template_time', 'template_depth', 'budget')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.budget = None
+
+
+def query_budget(max_queries):
+    """Mark a view as expected to run at most ``max_queries`` SQL queries."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    # savepoint bookkeeping (atomic blocks, TestCase) is not a data query
+    if profile is None or sql.startswith(SAVEPOINT_SQL):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.db_time += time.perf_counter() - start
+
+
+# ---------- template timing ----------
+class TimedTemplate:
+    """Wraps a backend template so its ``render`` time is charged to the request."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        # nested renders (render_to_string inside a tag) are already being timed
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - start
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+# ---------- aggregates ----------
+class ViewStats:
+    __slots__ = ('requests', 'total_time', 'max_time', 'queries', 'max_queries',
+                 'db_time', 'template_time', 'bytes', 'budget', 'over_budget')
+
+    def __init__(self):
+        self.requests = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.bytes = 0
+        self.budget = None
+        self.over_budget = 0
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def record(name, profile, elapsed, size, budget, over_budget):
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = ViewStats()
+        stats.requests += 1
+        stats.total_time += elapsed
+        stats.max_time = max(stats.max_time, elapsed)
+        stats.queries += profile.queries
+        stats.max_queries = max(stats.max_queries, profile.queries)
+        stats.db_time += profile.db_time
+        stats.template_time += profile.template_time
+        stats.bytes += size
+        stats.budget = budget
+        stats.over_budget += over_budget
+
+
+def snapshot():
+    """Per-URL-name averages and maxima (times in ms), slowest in total first."""
+    with _stats_lock:
+        items = [(name, s.requests, s.total_time, s.max_time, s.queries, s.max_queries,
+                  s.db_time, s.template_time, s.bytes, s.budget, s.over_budget)
+                 for name, s in _stats.items()]
+    rows = []
+    for name, n, total, max_time, queries, max_queries, db, tpl, size, budget, over in items:
+        rows.append({
+            'name': name,
+            'requests': n,
+            'total_ms': total * 1000,
+            'avg_ms': total * 1000 / n,
+            'max_ms': max_time * 1000,
+            'avg_queries': queries / n,
+            'max_queries': max_queries,
+            'avg_db_ms': db * 1000 / n,
+            'avg_template_ms': tpl * 1000 / n,
+            'avg_bytes': size // n,
+            'budget': budget,
+            'over_budget': over,
+        })
+    rows.sort(key=lambda row: row['total_ms'], reverse=True)
+    return rows
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+# ---------- middleware ----------
+def response_size(response):
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    return 0 if response.streaming else len(response.content)
+
+
+def server_timing(profile, elapsed):
+    return (f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries", '
+            f'tpl;dur={profile.template_time * 1000:.1f}, '
+            f'total;dur={elapsed * 1000:.1f}')
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        name = match.view_name if match else UNRESOLVED
+        budget = settings.PROFILING_QUERY_BUDGETS.get(name, profile.budget)
+        over_budget = budget is not None and profile.queries > budget
+
+        response['Server-Timing'] = server_timing(profile, elapsed)
+        record(name, profile, elapsed, response_size(response), budget, over_budget)
+
+        if over_budget:
+            message = f"{name} ran {profile.queries} queries (budget {budget}) for {request.path}"
+            if settings.PROFILING_STRICT_BUDGETS:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.budget = getattr(view_func, 'query_budget', None)
@@ -0,0 +1,230 @@
+"""
+Background PDF report generation.
+
+``enqueue_report`` records a ``ReportJob`` and hands it to a single
+in-process dispatcher thread, so the request returns immediately. The job
+renders its charts in parallel on a process pool (matplotlib is CPU bound
+and not thread safe) and stores the finished PDF. Jobs are keyed by a
+fingerprint of the source tables: while the data is unchanged, every
+request reuses the same job and its PDF.
+"""
+import hashlib
+import io
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import workers
+from .models import Employee, Attendance, ReportJob
+from .routing import use_replica
+
+logger = logging.getLogger(__name__)
+
+# a pending/running job older than this is assumed lost (e.g. worker restart)
+STALE_AFTER = timedelta(minutes=10)
+
+get_dispatcher = workers.dispatcher('report-jobs')
+get_chart_pool = workers.process_pool('REPORT_CHART_WORKERS')
+
+
+# ---------- data version ----------
+def data_version():
+    """Cheap fingerprint of everything the report reads (two aggregate queries)."""
+    emp = Employee.objects.aggregate(n=Count('id'), last=Max('updated_at'))
+    att = Attendance.objects.aggregate(n=Count('id'), last=Max('updated_at'))
+    raw = f"{emp['n']}|{emp['last']}|{att['n']}|{att['last']}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# ---------- queue ----------
+def enqueue_report(user=None):
+    """
+    Return the job for the current data version, creating and scheduling
+    one if needed. Concurrent requests for the same data share one job.
+    """
+    version = data_version()
+    with transaction.atomic():
+        job = (ReportJob.objects.select_for_update()
+               .filter(data_version=version)
+               .exclude(status=ReportJob.FAILED)
+               .order_by('-created_at')
+               .first())
+        if job is not None and is_reusable(job):
+            return job
+        if job is not None:
+            job.status = ReportJob.FAILED
+            job.error = "Abandoned (stale or missing output)"
+            job.save(update_fields=['status', 'error'])
+
+        try:
+            with transaction.atomic():
+                job = ReportJob.objects.create(
+                    requested_by=user if user is not None and user.is_authenticated else None,
+                    data_version=version,
+                )
+        except IntegrityError:
+            # a concurrent request created the job first (nothing to lock before that)
+            return ReportJob.objects.exclude(status=ReportJob.FAILED).get(data_version=version)
+        job_id = job.id
+        transaction.on_commit(lambda: get_dispatcher().submit(run_report_job, job_id))
+    return job
+
+
+def is_reusable(job):
+    if job.status == ReportJob.DONE:
+        return bool(job.pdf) and job.pdf.storage.exists(job.pdf.name)
+    started = job.started_at or job.created_at
+    return timezone.now() - started < STALE_AFTER
+
+
+def run_report_job(job_id):
+    # Claim the job atomically so the dispatcher and the run_report_jobs
+    # command never build the same report twice.
+    close_old_connections()
+    try:
+        claimed = (ReportJob.objects
+                   .filter(pk=job_id, status=ReportJob.PENDING)
+                   .update(status=ReportJob.RUNNING, started_at=timezone.now()))
+        if not claimed:
+            return
+        job = ReportJob.objects.get(pk=job_id)
+        try:
+            # the heavy full-table reads go to the read replica when there is one
+            with use_replica():
+                pdf_bytes = build_report_pdf()
+        except Exception:
+            tb = traceback.format_exc()
+            logger.error("Report job %s failed:\n%s", job_id, tb)
+            job.status = ReportJob.FAILED
+            job.error = tb
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            return
+        job.pdf.save(f"employee_data_{job.data_version[:12]}.pdf", ContentFile(pdf_bytes), save=False)
+        job.status = ReportJob.DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['pdf', 'status', 'finished_at'])
+    finally:
+        close_old_connections()
+
+
+def run_pending_jobs():
+    """Synchronously drain pending jobs; returns how many were picked up."""
+    pending = list(ReportJob.objects.filter(status=ReportJob.PENDING)
+                   .order_by('created_at').values_list('id', flat=True))
+    for job_id in pending:
+        run_report_job(job_id)
+    return len(pending)
+
+
+# ---------- report data ----------
+EMPLOYEE_COLUMNS = ['GENDER', 'AGE']
+MONTHLY_COLUMNS = ['Month', 'Attendance']
+ATTENDANCE_COLUMNS = ['Name', 'Days']
+
+
+def default_period(months=12):
+    """(start, end) covering the current month and the ``months - 1`` before it."""
+    end = timezone.localdate()
+    start = end.replace(day=1)
+    for _ in range(months - 1):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start, end
+
+
+def monthly_attendance_rows(start, end):
+    return list(Attendance.objects.between(start, end).counts_by_month())
+
+
+def attendance_by_name_rows(start, end):
+    return list(Attendance.objects.between(start, end)
+                .values_list('employee__name')
+                .annotate(days=Count('id'))
+                .order_by('employee__name'))
+
+
+# ---------- report building ----------
+def load_reporting():
+    """
+    Import the chart and PDF libraries (matplotlib, pandas, reportlab).
+    They load on the first report or chart otherwise; workers dedicated to
+    reporting call this at startup (REPORTING_PRELOAD).
+    """
+    from . import charts  # noqa: F401
+    import reportlab.platypus  # noqa: F401
+
+
+def build_report_pdf():
+    from .charts import render_chart
+    start, end = default_period()
+    employees = list(Employee.objects.values_list(*EMPLOYEE_COLUMNS))
+
+    charts = [
+        ('attendance', monthly_attendance_rows(start, end), MONTHLY_COLUMNS, "Monthly Attendance Analysis"),
+        ('gender', employees, EMPLOYEE_COLUMNS, "Gender Distribution Analysis"),
+        ('age', employees, EMPLOYEE_COLUMNS, "Age Distribution Analysis"),
+        ('attendance_by_name', attendance_by_name_rows(start, end), ATTENDANCE_COLUMNS,
+         "Attendance Analysis (By Name)"),
+    ]
+    pool = get_chart_pool()
+    futures = [(caption, pool.submit(render_chart, kind, rows, columns))
+               for kind, rows, columns, caption in charts]
+
+    images = []
+    for caption, future in futures:
+        try:
+            png = future.result()
+        except Exception as e:
+            logger.warning("%s skipped: %s", caption, e)
+            continue
+        if png:
+            images.append((png, caption))
+    return build_pdf(images)
+
+
+def build_pdf(images):
+    """Lay out ``(png_bytes, caption)`` pairs in a single-column PDF."""
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import ImageReader
+
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter,
+                            leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
+    styles = getSampleStyleSheet()
+    story = []
+
+    story.append(Paragraph("Employee Data Visualization", styles['Title']))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph("Generated report", styles['Normal']))
+    story.append(Spacer(1, 18))
+
+    max_width = doc.width  # available width in points
+
+    for png, caption in images:
+        # preserve aspect ratio: scale width to max_width, compute height
+        try:
+            img_w, img_h = ImageReader(io.BytesIO(png)).getSize()
+            display_w = max_width
+            display_h = (img_h / float(img_w)) * display_w if img_w else display_w * 0.6
+        except Exception:
+            display_w = max_width
+            display_h = max_width * 0.6
+
+        story.append(RLImage(io.BytesIO(png), width=display_w, height=display_h))
+        story.append(Spacer(1, 6))
+        story.append(Paragraph(caption, styles['Italic']))
+        story.append(Spacer(1, 12))
+
+    if not images:
+        story.append(Paragraph("No plots available to include in the report.", styles['Normal']))
+
+    doc.build(story)
+    return pdf_buffer.getvalue()
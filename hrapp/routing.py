@@ -0,0 +1,174 @@
+"""
+Read-replica routing for the reporting and analytics views.
+
+Charts, exports, the data API and the historical dashboard read whole
+tables. Views marked ``@replica_reads`` (and report jobs, which render
+in the background) send those reads to the REPLICA_DB_ALIAS database.
+Everything else stays on ``default``, the primary: all writes, sessions
+and auth, and any model not in ``REPLICA_MODELS``. So the kiosk's
+check-ins and the portal's edits never wait behind a month-end report.
+
+Routing falls back to the primary when:
+
+* no replica alias is configured (the router is then a no-op);
+* the replica is unreachable, or lags by more than
+  REPLICA_MAX_LAG_SECONDS. A background thread per process checks this
+  every REPLICA_CHECK_SECONDS, so requests never pay for the check;
+* the client has just written (read-your-writes). ``PrimaryPinMiddleware``
+  sets a short-lived cookie after any non-GET request, and while it is
+  present the user's reads stay on the primary for REPLICA_PIN_SECONDS.
+
+To try it locally, point the replica at the same database as
+``default`` (e.g. DB_REPLICA_NAME=$DB_NAME with SQLite). Both aliases
+then exist and queries go through the router.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# models whose reads may be served slightly stale (lowercase model names, app hrapp)
+REPLICA_MODELS = {
+    'employee', 'attendance', 'performancereview', 'attendancerollup', 'employeestat',
+    'legacymonthlyattendance', 'videoanalysis', 'leaveapplication',
+}
+PIN_COOKIE = 'primary_pin'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+_lock = threading.Lock()
+_monitor = None
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is none."""
+    alias = settings.REPLICA_DB_ALIAS
+    return alias if alias and alias in settings.DATABASES else None
+
+
+# ---------- health ----------
+def replica_lag(alias):
+    """Seconds the replica is behind the primary (0 when it is caught up or not a standby)."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        connection.ensure_connection()
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() "
+            "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        return float(cursor.fetchone()[0] or 0)
+
+
+class ReplicaMonitor:
+    """Keeps ``healthy`` up to date from a daemon thread with its own connection."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.healthy = False
+        self.lag = None
+
+    def start(self):
+        self.check()
+        threading.Thread(target=self.run, name='replica-monitor', daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.REPLICA_CHECK_SECONDS)
+            self.check()
+
+    def check(self):
+        try:
+            self.lag = replica_lag(self.alias)
+            healthy = self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+            if not healthy:
+                logger.warning("Replica %s is %.1fs behind; reading from the primary", self.alias, self.lag)
+        except Exception:
+            logger.warning("Replica %s is unavailable; reading from the primary", self.alias, exc_info=True)
+            connections[self.alias].close()
+            healthy = False
+        if healthy and not self.healthy:
+            logger.info("Reading reports from replica %s", self.alias)
+        self.healthy = healthy
+
+
+def get_monitor():
+    global _monitor
+    with _lock:
+        if _monitor is None:
+            _monitor = ReplicaMonitor(replica_alias())
+            _monitor.start()
+        return _monitor
+
+
+# ---------- marking reads ----------
+@contextmanager
+def use_replica():
+    """Route reporting reads made inside the block to the replica (when healthy)."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view_func):
+    """Serve a read-only view's reporting queries from the replica, unless the client just wrote."""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if PIN_COOKIE in request.COOKIES:
+            return view_func(request, *args, **kwargs)
+        with use_replica():
+            return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+# ---------- router ----------
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or model._meta.app_label != 'hrapp':
+            return None
+        if model._meta.model_name not in REPLICA_MODELS:
+            return None
+        alias = replica_alias()
+        if alias is None or not get_monitor().healthy:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica is a copy of the primary; it is never migrated itself
+        return db != replica_alias()
+
+
+# ---------- read-your-writes ----------
+class PrimaryPinMiddleware:
+    """After a write request, keep the client's reads on the primary for REPLICA_PIN_SECONDS."""
+
+    def __init__(self, get_response):
+        if replica_alias() is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
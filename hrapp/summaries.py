@@ -0,0 +1,175 @@
+"""
+Summary layer for the historical data page.
+
+``EmployeeStat`` keeps headcount / gender / department totals and
+``AttendanceRollup`` keeps per-day and per-month attendance counts (site
+wide and per department). Both are adjusted incrementally from model
+signals; ``rebuild_summaries`` recomputes them from scratch and is what the
+``rebuild_summaries`` management command runs periodically to fold in any
+writes that bypassed signals (bulk_create, raw SQL, the kiosk table).
+
+Department rollups count a check-in against the employee's department at
+the time it was recorded; a rebuild can only use the current department,
+so it re-attributes history for employees who have since moved.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDay, TruncMonth, Upper
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Employee, Attendance, AttendanceRollup, EmployeeStat
+
+UNKNOWN_GENDER = 'UNKNOWN'
+UNASSIGNED_DEPARTMENT = 'Unassigned'
+
+
+def gender_key(gender):
+    return (gender or UNKNOWN_GENDER).upper()
+
+def department_key(department):
+    return department or UNASSIGNED_DEPARTMENT
+
+
+# ---------- incremental updates ----------
+def bump(model, lookup, delta):
+    """Add ``delta`` to ``model.count`` for the row matching ``lookup``, creating it if needed."""
+    if not model.objects.filter(**lookup).update(count=F('count') + delta):
+        try:
+            with transaction.atomic():
+                model.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # another writer created the row first
+            model.objects.filter(**lookup).update(count=F('count') + delta)
+
+def bump_employee(gender, department, delta):
+    bump(EmployeeStat, {'kind': EmployeeStat.TOTAL, 'key': ''}, delta)
+    bump(EmployeeStat, {'kind': EmployeeStat.GENDER, 'key': gender_key(gender)}, delta)
+    bump(EmployeeStat, {'kind': EmployeeStat.DEPARTMENT, 'key': department_key(department)}, delta)
+
+def bump_attendance(day, department, delta):
+    buckets = [(AttendanceRollup.DAY, day), (AttendanceRollup.MONTH, day.replace(day=1))]
+    for period, start in buckets:
+        for dept in (AttendanceRollup.ALL_DEPARTMENTS, department_key(department)):
+            bump(AttendanceRollup, {'period': period, 'period_start': start, 'department': dept}, delta)
+
+def bump_attendance_counts(counts):
+    """Apply ``{(day, department): n}`` from a bulk insert that skipped signals."""
+    merged = {}
+    for (day, department), n in counts.items():
+        for period, start in ((AttendanceRollup.DAY, day), (AttendanceRollup.MONTH, day.replace(day=1))):
+            for dept in (AttendanceRollup.ALL_DEPARTMENTS, department_key(department)):
+                merged[(period, start, dept)] = merged.get((period, start, dept), 0) + n
+    for (period, start, dept), n in merged.items():
+        bump(AttendanceRollup, {'period': period, 'period_start': start, 'department': dept}, n)
+
+
+@receiver(post_init, sender=Employee)
+def remember_employee_keys(sender, instance, **kwargs):
+    # what this row currently counts towards, so an edit can move it; skip
+    # deferred loads (.only()/.defer()) rather than query per instance
+    loaded = instance.__dict__
+    if 'GENDER' in loaded and 'department' in loaded:
+        instance._summary_keys = (gender_key(loaded['GENDER']), department_key(loaded['department']))
+    else:
+        instance._summary_keys = None
+
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, created, **kwargs):
+    new_keys = (gender_key(instance.GENDER), department_key(instance.department))
+    if created:
+        bump_employee(*new_keys, 1)
+    elif instance._summary_keys is not None and new_keys != instance._summary_keys:
+        bump_employee(*instance._summary_keys, -1)
+        bump_employee(*new_keys, 1)
+    instance._summary_keys = new_keys
+
+@receiver(post_delete, sender=Employee)
+def employee_deleted(sender, instance, **kwargs):
+    keys = instance._summary_keys or (gender_key(instance.GENDER), department_key(instance.department))
+    bump_employee(*keys, -1)
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, created, **kwargs):
+    if created:
+        department = Employee.objects.filter(pk=instance.employee_id).values_list('department', flat=True).first()
+        bump_attendance(instance.date, department, 1)
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    # on an employee cascade the employee row may already be gone
+    department = Employee.objects.filter(pk=instance.employee_id).values_list('department', flat=True).first()
+    bump_attendance(instance.date, department, -1)
+
+
+# ---------- full rebuild (compaction) ----------
+def rebuild_employee_stats():
+    stats = [EmployeeStat(kind=EmployeeStat.TOTAL, key='', count=Employee.objects.count())]
+    genders = {}
+    for gender, n in Employee.objects.values_list(Upper('GENDER')).annotate(n=Count('id')).order_by():
+        genders[gender_key(gender)] = genders.get(gender_key(gender), 0) + n
+    stats += [EmployeeStat(kind=EmployeeStat.GENDER, key=k, count=n) for k, n in genders.items()]
+    departments = {}
+    for department, n in Employee.objects.values_list('department').annotate(n=Count('id')).order_by():
+        departments[department_key(department)] = departments.get(department_key(department), 0) + n
+    stats += [EmployeeStat(kind=EmployeeStat.DEPARTMENT, key=k, count=n) for k, n in departments.items()]
+
+    with transaction.atomic():
+        EmployeeStat.objects.all().delete()
+        EmployeeStat.objects.bulk_create(stats)
+
+def rebuild_attendance_rollups():
+    rows = []
+    for period, trunc in ((AttendanceRollup.DAY, TruncDay), (AttendanceRollup.MONTH, TruncMonth)):
+        totals = {}
+        grouped = (Attendance.objects
+                   .annotate(bucket=trunc('date'))
+                   .values_list('bucket', 'employee__department')
+                   .annotate(n=Count('id'))
+                   .order_by())
+        for bucket, department, n in grouped:
+            for dept in (AttendanceRollup.ALL_DEPARTMENTS, department_key(department)):
+                totals[(bucket, dept)] = totals.get((bucket, dept), 0) + n
+        rows += [AttendanceRollup(period=period, period_start=bucket, department=dept, count=n)
+                 for (bucket, dept), n in totals.items()]
+
+    with transaction.atomic():
+        AttendanceRollup.objects.all().delete()
+        AttendanceRollup.objects.bulk_create(rows, batch_size=1000)
+
+def rebuild_summaries():
+    rebuild_employee_stats()
+    rebuild_attendance_rollups()
+
+
+# ---------- reads ----------
+def employee_summary():
+    """Headcount, gender and department totals in a single query."""
+    stats = list(EmployeeStat.objects.values_list('kind', 'key', 'count'))
+    if not stats:
+        rebuild_employee_stats()
+        stats = list(EmployeeStat.objects.values_list('kind', 'key', 'count'))
+    summary = {'total_employees': 0, 'gender_counts': {}, 'department_counts': {}}
+    for kind, key, count in stats:
+        if count <= 0:
+            continue
+        if kind == EmployeeStat.TOTAL:
+            summary['total_employees'] = count
+        elif kind == EmployeeStat.GENDER:
+            summary['gender_counts'][key] = count
+        else:
+            summary['department_counts'][key] = count
+    return summary
+
+def attendance_rollups(period, since, department=AttendanceRollup.ALL_DEPARTMENTS):
+    return list(AttendanceRollup.objects
+                .filter(period=period, department=department, period_start__gte=since)
+                .order_by('period_start')
+                .values_list('period_start', 'count'))
+
+def department_attendance(period, period_start):
+    return list(AttendanceRollup.objects
+                .filter(period=period, period_start=period_start)
+                .exclude(department=AttendanceRollup.ALL_DEPARTMENTS)
+                .order_by('-count')
+                .values_list('department', 'count'))
@@ -1,3 +1,846 @@
-from django.test import TestCase
+"""
+hrapp tests.
 
-# Create your tests here.
+Query budgets: every budgeted view is requested with seeded data under
+strict budgets (on by default under ``manage.py test``): an N+1
+regression makes the request raise ``QueryBudgetExceeded`` and the test
+fail.
+"""
+import os
+import shutil
+import struct
+import tempfile
+from datetime import date, datetime, time, timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail.backends import locmem
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.utils import load_backend
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+
+from vision.gallery import FaceIndex, open_gallery, save_gallery
+
+from . import (analytics, api, gallery, imports, ingestion, notifications, reports, routing, summaries,
+               timeseries)
+from .faces import pack_gallery, unpack_gallery
+from .models import (Attendance, Broadcast, BroadcastDelivery, Employee, EmployeeImport, IngestionCursor,
+                     LeaveApplication, OccupancyRollup, PerformanceReview, ReportJob, UnmatchedKioskRow)
+from .profiling import QueryBudgetExceeded, query_budget
+
+
+def seed(count, days=10, prefix='E'):
+    """``count`` employees with ``days`` of attendance, a review and a leave each."""
+    employees = Employee.objects.bulk_create([
+        Employee(employeeid=f"{prefix}{i:04}", name=f"Employee {i}", email=f"e{i}@example.com",
+                 GENDER='M' if i % 2 else 'F', AGE=str(20 + i % 40), department=f"D{i % 3}")
+        for i in range(count)
+    ])
+    start = timezone.localdate() - timedelta(days=days)
+    Attendance.objects.bulk_create([
+        Attendance(employee=employee, date=start + timedelta(days=d),
+                   check_in=timezone.make_aware(datetime.combine(start + timedelta(days=d), time(9, d % 30))))
+        for employee in employees for d in range(days)
+    ])
+    PerformanceReview.objects.bulk_create([
+        PerformanceReview(employee=employee, performance="Good", feedbacks="-") for employee in employees
+    ])
+    today = timezone.localdate()
+    LeaveApplication.objects.bulk_create([
+        LeaveApplication(employee=employee, leave_type="Annual", reason="-",
+                         start_date=today + timedelta(days=i % 5), end_date=today + timedelta(days=i % 5 + 1),
+                         status=LeaveApplication.APPROVED if i % 2 else LeaveApplication.PENDING)
+        for i, employee in enumerate(employees)
+    ])
+    # the bulk inserts skip the summary signals
+    summaries.rebuild_employee_stats()
+    summaries.rebuild_attendance_rollups()
+    return employees
+
+
+@query_budget(3)
+def attendance_per_employee(request):
+    # the N+1 shape the budgets exist to catch: one query per employee
+    days = sum(employee.attendance_set.count() for employee in Employee.objects.all())
+    return HttpResponse(str(days))
+
+
+urlpatterns = [
+    path('n-plus-one/', attendance_per_employee, name='n_plus_one'),
+    path('', include('hrapp.urls')),
+]
+
+
+class QueryBudgetTests(TestCase):
+    STAFF_URLS = [
+        '/homeadmin/',
+        '/homeadmin/notifications/',
+        '/homeadmin/historical_data/',
+        '/homeadmin/leave/?pending=1',
+        '/homeadmin/violations/',
+        '/homeadmin/profiling/',
+        '/homeadmin/occupancy/',
+        '/homeadmin/import/',
+        '/table/',
+        '/table/rows/?sort=-name',
+        '/generate_csv/',
+        '/plot/attendance/',
+        '/plot/gender/',
+        '/plot/age/',
+        '/plot/attendanceagain/',
+        '/data/',
+        '/data/attendance/',
+        '/data/attendance/analytics/',
+        '/data/leave/?status=approved,pending',
+        '/data/faces/',
+    ]
+    EMPLOYEE_URLS = [
+        '/home/',
+        '/performance_reviews/',
+        '/leave_application/',
+        '/self_service/',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employees = seed(30)
+        cls.staff = User.objects.create_user('admin', password='pw', is_staff=True, is_superuser=True)
+        cls.employee_user = User.objects.create_user(cls.employees[0].employeeid, password='pw')
+
+    def test_strict_budgets_under_tests(self):
+        self.assertTrue(settings.PROFILING_STRICT_BUDGETS)
+
+    def test_staff_views_stay_within_budget(self):
+        self.client.force_login(self.staff)
+        for url in self.STAFF_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_employee_views_stay_within_budget(self):
+        self.client.force_login(self.employee_user)
+        for url in self.EMPLOYEE_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_leave_application_post_stays_within_budget(self):
+        self.client.force_login(self.employee_user)
+        start = timezone.localdate() + timedelta(days=30)
+        response = self.client.post('/leave_application/', {
+            'leave_type': 'Annual', 'start_date': start, 'end_date': start + timedelta(days=2), 'reason': 'Trip',
+        })
+        self.assertIn(response.status_code, (200, 302))
+        self.assertTrue(LeaveApplication.objects.filter(employee=self.employees[0], start_date=start).exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.staff)
+        urls = ['/table/', '/data/', '/data/attendance/', '/data/attendance/analytics/', '/homeadmin/leave/?pending=1']
+        before = {}
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            before[url] = len(queries)
+        seed(60, prefix='X')
+        for url in urls:
+            cache.clear()
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            self.assertEqual(len(queries), before[url])
+
+    @override_settings(PROFILING_QUERY_BUDGETS={'data': 0})
+    def test_over_budget_raises(self):
+        self.client.force_login(self.staff)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/data/')
+
+    @override_settings(ROOT_URLCONF='hrapp.tests')
+    def test_n_plus_one_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/n-plus-one/')
+
+    @override_settings(ROOT_URLCONF='hrapp.tests')
+    def test_n_plus_one_within_budget_when_small(self):
+        Employee.objects.exclude(pk__in=[e.pk for e in self.employees[:2]]).delete()
+        self.assertEqual(self.client.get('/n-plus-one/').status_code, 200)
+
+
+class ApiAuthTests(TestCase):
+    URLS = ['/data/', '/data/attendance/', '/data/attendance/analytics/']
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(2)
+
+    def test_anonymous_requests_are_refused(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_non_staff_users_are_refused(self):
+        self.client.force_login(User.objects.create_user('E0000', password='pw'))
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 401)
+
+    @override_settings(KIOSK_API_TOKEN='kiosk-token')
+    def test_kiosk_token_is_accepted(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_AUTHORIZATION='Bearer kiosk-token')
+                self.assertEqual(response.status_code, 200)
+
+
+class ReportJobTests(TestCase):
+    def test_one_live_job_per_version(self):
+        ReportJob.objects.create(data_version='v1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ReportJob.objects.create(data_version='v1')
+        ReportJob.objects.create(data_version='v1', status=ReportJob.FAILED)
+
+    def test_concurrent_first_requests_share_the_job(self):
+        first = reports.enqueue_report()
+        # what a request that raced past the lookup does: its insert loses
+        with mock.patch.object(ReportJob.objects, 'select_for_update') as locked:
+            locked.return_value.filter.return_value.exclude.return_value.order_by.return_value.first.return_value = None
+            second = reports.enqueue_report()
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """locmem, except the first message to each address in ``fail_once`` raises."""
+    fail_once = set()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0] in self.fail_once:
+                self.fail_once.discard(message.to[0])
+                raise ConnectionError("421 try again later")
+        return super().send_messages(messages)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+# send_broadcast closes stale connections itself, which a TestCase transaction cannot survive
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   NOTIFICATION_RATE_PER_MINUTE=60000, NOTIFICATION_BATCH_SIZE=2, NOTIFICATION_MAX_ATTEMPTS=3)
+class BroadcastTests(TransactionTestCase):
+    def setUp(self):
+        seed(5)
+        # the tests run the sender themselves, not on the background dispatcher
+        with mock.patch.object(notifications, 'get_dispatcher'):
+            self.broadcast, self.count = notifications.create_broadcast("Subject", "Body", Broadcast.ALL)
+
+    def deliveries(self):
+        return self.broadcast.deliveries.order_by('id')
+
+    def test_every_recipient_is_mailed_once(self):
+        notifications.send_broadcast(self.broadcast.id, backoff=0)
+        notifications.send_broadcast(self.broadcast.id, backoff=0)
+        self.assertEqual(self.count, 5)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(self.deliveries().values_list('email', flat=True)))
+        self.assertEqual(set(self.deliveries().values_list('status', 'attempts')), {(BroadcastDelivery.SENT, 1)})
+        self.broadcast.refresh_from_db()
+        self.assertIsNotNone(self.broadcast.finished_at)
+
+    def test_claimed_deliveries_are_not_claimed_again(self):
+        lease, backoff = timedelta(minutes=5), timedelta(0)
+        first = notifications.claim_batch(self.broadcast.id, 3, 3, lease, backoff)
+        second = notifications.claim_batch(self.broadcast.id, 3, 3, lease, backoff)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({d for d, _ in first} & {d for d, _ in second})
+        self.assertEqual(notifications.claim_batch(self.broadcast.id, 3, 3, lease, backoff), [])
+
+    @override_settings(EMAIL_BACKEND='hrapp.tests.FlakyEmailBackend')
+    def test_transient_failure_is_retried(self):
+        flaky = self.deliveries().first()
+        FlakyEmailBackend.fail_once = {flaky.email}
+        notifications.send_broadcast(self.broadcast.id, backoff=0)
+        self.assertEqual([m.to[0] for m in mail.outbox].count(flaky.email), 1)
+        self.assertEqual(len(mail.outbox), 5)
+        flaky.refresh_from_db()
+        self.assertEqual((flaky.status, flaky.attempts), (BroadcastDelivery.SENT, 2))
+
+    @override_settings(NOTIFICATION_RATE_PER_MINUTE=60)
+    def test_sending_is_rate_limited(self):
+        clock = FakeClock()
+        with mock.patch.object(notifications, 'time', clock):
+            notifications.send_broadcast(self.broadcast.id, backoff=0)
+        self.assertEqual(len(mail.outbox), 5)
+        # one message a second: the first goes straight out, each later one waits
+        self.assertEqual(clock.slept, [1.0] * 4)
+
+    def test_stale_claim_is_taken_over(self):
+        stale, fresh, *rest = self.deliveries()
+        self.deliveries().exclude(pk__in=[stale.pk, fresh.pk]).update(status=BroadcastDelivery.SENT)
+        BroadcastDelivery.objects.filter(pk=stale.pk).update(
+            status=BroadcastDelivery.SENDING, claimed_at=timezone.now() - timedelta(days=1))
+        BroadcastDelivery.objects.filter(pk=fresh.pk).update(
+            status=BroadcastDelivery.SENDING, claimed_at=timezone.now())
+        notifications.send_broadcast(self.broadcast.id, backoff=0)
+        self.assertEqual([m.to[0] for m in mail.outbox], [stale.email])
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, BroadcastDelivery.SENDING)
+        # the live sender that holds ``fresh`` finishes the broadcast
+        self.broadcast.refresh_from_db()
+        self.assertIsNone(self.broadcast.finished_at)
+
+
+@override_settings(KIOSK_API_TOKEN='kiosk-token', REPLICA_MAX_LAG_SECONDS=30)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Routing against a second, separate SQLite database as the replica: a
+    read that reaches it sees its rows, not the primary's.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # a connection created here, not in DATABASES, so the runner leaves it alone
+        cls.replica_dir = tempfile.mkdtemp()
+        connections['replica'] = load_backend('django.db.backends.sqlite3').DatabaseWrapper({
+            **connections['default'].settings_dict,
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+            'OPTIONS': {},
+        }, 'replica')
+        cls.replica_alias = mock.patch.object(routing, 'replica_alias', return_value='replica')
+        cls.replica_alias.start()
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(Employee)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.replica_alias.stop()
+        connections['replica'].close()
+        del connections['replica']
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        Employee.objects.create(employeeid='E0000', name="On the primary")
+        Employee.objects.using('replica').create(employeeid='R0000', name="On the replica")
+        self.monitor = routing.ReplicaMonitor('replica')
+        self.monitor.check()
+        patcher = mock.patch.object(routing, '_monitor', self.monitor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.clear_replica)
+
+    def clear_replica(self):
+        # a plain DELETE: the replica has no tables for the cascade to visit
+        with connections['replica'].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Employee._meta.db_table}")
+
+    def names(self):
+        response = self.client.get('/data/?fields=name', HTTP_AUTHORIZATION='Bearer kiosk-token')
+        return [row['name'] for row in response.json()['results']]
+
+    def test_replica_reads_views_read_from_the_replica(self):
+        self.assertTrue(self.monitor.healthy)
+        self.assertEqual(self.names(), ["On the replica"])
+
+    def test_writes_and_unmarked_reads_use_the_primary(self):
+        self.assertEqual(list(Employee.objects.values_list('name', flat=True)), ["On the primary"])
+        with routing.use_replica():
+            self.assertEqual(list(Employee.objects.values_list('name', flat=True)), ["On the replica"])
+            Employee.objects.create(employeeid='E0001', name="Written")
+        self.assertTrue(Employee.objects.using('default').filter(employeeid='E0001').exists())
+        self.assertFalse(Employee.objects.using('replica').filter(employeeid='E0001').exists())
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        self.client.force_login(User.objects.create_user('E0000', password='pw'))
+        start = timezone.localdate() + timedelta(days=30)
+        response = self.client.post('/leave_application/', {
+            'leave_type': 'Annual', 'start_date': start, 'end_date': start, 'reason': 'Trip',
+        })
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.names(), ["On the primary"])
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        with mock.patch.object(routing, 'replica_lag', return_value=120.0):
+            self.monitor.check()
+        self.assertFalse(self.monitor.healthy)
+        self.assertEqual(self.names(), ["On the primary"])
+
+
+@override_settings(KIOSK_DB_ALIAS='default', KIOSK_ATTENDANCE_TABLE='kiosk_raw_attendance',
+                   KIOSK_INGEST_SETTLE_SECONDS=60)
+class KioskIngestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employees = seed(3, days=0)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE kiosk_raw_attendance (id INTEGER PRIMARY KEY, name TEXT, time TIMESTAMP)")
+
+    def kiosk_row(self, raw_id, name, age):
+        # the kiosk writes naive local times
+        stamp = (timezone.localtime() - age).replace(tzinfo=None, microsecond=0)
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO kiosk_raw_attendance (id, name, time) VALUES (%s, %s, %s)",
+                           [raw_id, name, stamp.isoformat(' ')])
+
+    def position(self):
+        return IngestionCursor.objects.get(source=ingestion.KIOSK_SOURCE).position
+
+    def test_replaying_a_batch_inserts_nothing(self):
+        self.kiosk_row(1, 'E0000', timedelta(hours=1))
+        self.kiosk_row(2, 'E0001', timedelta(hours=1))
+        self.assertEqual(ingestion.ingest_available(), (2, 2, 0))
+        # as after a crash between the insert and the mark
+        IngestionCursor.objects.filter(source=ingestion.KIOSK_SOURCE).update(position=0)
+        self.assertEqual(ingestion.ingest_available(), (2, 0, 0))
+        self.assertEqual(Attendance.objects.count(), 2)
+
+    def test_rows_in_the_settle_window_are_read_again(self):
+        self.kiosk_row(1, 'E0000', timedelta(hours=1))
+        self.kiosk_row(3, 'E0002', timedelta(seconds=5))
+        self.assertEqual(ingestion.ingest_available(), (1, 2, 0))
+        self.assertEqual(self.position(), 1)
+        # id 2's transaction commits after id 3's was ingested
+        self.kiosk_row(2, 'E0001', timedelta(seconds=10))
+        self.assertEqual(ingestion.ingest_available(), (0, 1, 0))
+        self.assertEqual(set(Attendance.objects.values_list('employee__employeeid', flat=True)),
+                         {'E0000', 'E0001', 'E0002'})
+        with override_settings(KIOSK_INGEST_SETTLE_SECONDS=0):
+            self.assertEqual(ingestion.ingest_available(), (2, 0, 0))
+        self.assertEqual(self.position(), 3)
+
+    def test_unmatched_rows_are_parked_until_the_employee_exists(self):
+        resolver = ingestion.EmployeeResolver()
+        self.kiosk_row(1, 'E0000', timedelta(hours=1))
+        self.kiosk_row(2, 'NEW0001', timedelta(hours=1))
+        self.assertEqual(ingestion.ingest_available(resolver=resolver), (2, 1, 1))
+        self.assertEqual(list(UnmatchedKioskRow.objects.values_list('raw_id', 'name')), [(2, 'NEW0001')])
+        self.assertEqual(self.position(), 2)
+
+        Employee.objects.create(employeeid='NEW0001', name="New hire")
+        self.assertEqual(ingestion.ingest_available(resolver=resolver), (0, 1, 0))
+        self.assertFalse(UnmatchedKioskRow.objects.exists())
+        self.assertTrue(Attendance.objects.filter(employee__employeeid='NEW0001').exists())
+
+
+@override_settings(KIOSK_API_TOKEN='kiosk-token')
+class EmployeeTableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employees = seed(60, days=1)
+
+    def walk(self, url, params, page_key, next_key, **headers):
+        rows, cursor = [], None
+        while True:
+            response = self.client.get(url, {**params, **({'cursor': cursor} if cursor else {})}, headers=headers)
+            page = response.context if page_key == 'employees' else response.json()
+            rows += page[page_key]
+            cursor = page[next_key]
+            if cursor is None:
+                return rows
+
+    def test_table_pages_cover_every_employee_once_in_order(self):
+        for sort in ['employeeid', '-name']:
+            with self.subTest(sort=sort):
+                rows = self.walk('/table/', {'sort': sort, 'size': 25}, 'employees', 'next_cursor')
+                expected = Employee.objects.order_by(sort, '-id' if sort.startswith('-') else 'id')
+                self.assertEqual([row['employeeid'] for row in rows],
+                                 list(expected.values_list('employeeid', flat=True)))
+
+    def test_api_pages_cover_every_employee_once(self):
+        rows = self.walk('/data/', {'fields': 'employeeid', 'limit': 7}, 'results', 'next_cursor',
+                         Authorization='Bearer kiosk-token')
+        self.assertEqual([row['employeeid'] for row in rows],
+                         list(Employee.objects.order_by('updated_at', 'id').values_list('employeeid', flat=True)))
+
+    def test_unchanged_page_is_not_modified(self):
+        auth = {'Authorization': 'Bearer kiosk-token'}
+        first = self.client.get('/data/', {'limit': 10}, headers=auth)
+        again = self.client.get('/data/', {'limit': 10}, headers={**auth, 'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        Employee.objects.filter(pk=self.employees[0].pk).update(name="Renamed")
+        changed = self.client.get('/data/', {'limit': 10}, headers={**auth, 'If-None-Match': first['ETag']})
+        self.assertEqual(changed.status_code, 200)
+
+    def test_bad_cursors_are_rejected(self):
+        for cursor in ['not-a-cursor', api.encode_cursor(['E0001']), api.encode_cursor(['E0001', 'x']),
+                       api.encode_cursor({'a': 1})]:
+            for url in ['/table/', '/table/rows/']:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {'error': "Invalid cursor"})
+
+
+class EmployeeImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employees = seed(3, days=0)
+        Employee.objects.filter(employeeid='E0000').update(face_encoding=bytes(1024))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def run_import(self, text):
+        job = imports.create_import(None, ContentFile(text.encode(), name='employees.csv'))
+        return imports.run_import(job.id)
+
+    def test_upsert_updates_listed_employees_and_leaves_others_alone(self):
+        untouched = {e.employeeid: (e.name, e.email, e.updated_at)
+                     for e in Employee.objects.filter(employeeid__in=['E0001', 'E0002'])}
+        job = self.run_import(
+            "employeeid,name,department\n"
+            "E0000,Renamed Zero,Welding\n"
+            "N0001,New Hire,Welding\n"
+            "N0002,,Welding\n"
+        )
+        self.assertEqual(job.status, EmployeeImport.DONE)
+        self.assertEqual((job.created, job.updated, job.invalid), (1, 1, 1))
+        self.assertIn("row 4: name is required", job.row_errors)
+
+        updated = Employee.objects.get(employeeid='E0000')
+        self.assertEqual((updated.name, updated.department), ("Renamed Zero", "Welding"))
+        # columns missing from the file, and the face encoding, are kept
+        self.assertEqual(updated.email, 'e0@example.com')
+        self.assertEqual(bytes(updated.face_encoding), bytes(1024))
+        self.assertEqual(Employee.objects.get(employeeid='N0001').name, "New Hire")
+        self.assertFalse(Employee.objects.filter(employeeid='N0002').exists())
+        self.assertEqual({e.employeeid: (e.name, e.email, e.updated_at)
+                          for e in Employee.objects.filter(employeeid__in=['E0001', 'E0002'])}, untouched)
+
+    def test_duplicate_rows_are_reported_not_applied_twice(self):
+        job = self.run_import("employeeid,name\nE0001,First\nE0001,Second\n")
+        self.assertEqual((job.updated, job.invalid), (1, 1))
+        self.assertEqual(Employee.objects.get(employeeid='E0001').name, "First")
+
+
+@override_settings(SHIFT_START='09:00', LATE_GRACE_MINUTES=10)
+class AttendanceAnalyticsTests(TestCase):
+    """
+    Hand-computed fixture over 2 - 7 March 2026. Nobody came in on the 5th,
+    so there are five open days and the 5th does not break a streak.
+    """
+    START, END = date(2026, 3, 2), date(2026, 3, 7)
+
+    @classmethod
+    def setUpTestData(cls):
+        check_ins = {
+            'A': {2: '09:00', 3: '09:20', 4: '09:05', 6: '09:15', 7: '08:50'},
+            'B': {2: '08:30', 3: '08:30', 6: '08:30'},
+            'C': {7: '10:00'},
+        }
+        for employeeid, days in check_ins.items():
+            employee = Employee.objects.create(employeeid=employeeid, name=f"Employee {employeeid}")
+            for day, hh_mm in days.items():
+                stamp = datetime.combine(date(2026, 3, day), time.fromisoformat(hh_mm))
+                Attendance.objects.create(employee=employee, date=stamp.date(),
+                                          check_in=timezone.make_aware(stamp))
+        # C's absence on 2 - 4 March is excused
+        LeaveApplication.objects.create(employee=Employee.objects.get(employeeid='C'), leave_type="Annual",
+                                        reason="-", start_date=date(2026, 3, 1), end_date=date(2026, 3, 4),
+                                        status=LeaveApplication.APPROVED)
+
+    def setUp(self):
+        cache.clear()
+        result = analytics.attendance_analytics(self.START, self.END)
+        self.open_days = result['open_days']
+        self.rows = {row['employeeid']: row for row in result['results']}
+
+    def test_open_days(self):
+        self.assertEqual(self.open_days, 5)
+
+    def test_streaks(self):
+        # A: every open day; B: 2nd-3rd, then the 6th only; C: the last day
+        self.assertEqual([(self.rows[e]['longest_streak'], self.rows[e]['current_streak']) for e in 'ABC'],
+                         [(5, 5), (2, 0), (1, 1)])
+
+    def test_lateness(self):
+        # late means after 09:10; minutes are counted from 09:00
+        self.assertEqual([(self.rows[e]['late_days'], self.rows[e]['avg_late_minutes']) for e in 'ABC'],
+                         [(2, 17.5), (0, None), (1, 60.0)])
+        self.assertEqual([self.rows[e]['avg_check_in'] for e in 'ABC'], ['09:06', '08:30', '10:00'])
+
+    def test_presence_excuses_approved_leave(self):
+        self.assertEqual([(self.rows[e]['days_present'], self.rows[e]['leave_days'], self.rows[e]['presence_rate'])
+                          for e in 'ABC'],
+                         [(5, 0, 1.0), (3, 0, 0.6), (1, 3, 0.5)])
+
+
+@override_settings(FACE_GALLERY_SETTLE_SECONDS=60)
+class FaceGalleryDeltaTests(TestCase):
+    def enroll(self, employeeid, age, value=1.0):
+        Employee.objects.update_or_create(employeeid=employeeid, defaults={
+            'name': employeeid, 'face_encoding': struct.pack('<128d', *[value] * 128),
+            'face_encoded_at': timezone.now() - age,
+        })
+
+    def delta(self, since):
+        _, _, body = gallery.export_gallery(since)
+        return unpack_gallery(body)
+
+    def test_version_stays_behind_recent_stamps(self):
+        self.enroll('OLD', timedelta(hours=1))
+        self.enroll('NEW', timedelta(seconds=5))
+        version, _ = gallery.gallery_state()
+        self.assertLess(gallery.from_version(version), Employee.objects.get(employeeid='NEW').face_encoded_at)
+        self.assertEqual(self.delta(version)[1]['employeeids'], ['NEW'])
+
+    def test_encoding_committed_late_is_still_sent(self):
+        self.enroll('B', timedelta(seconds=5))
+        version, _ = gallery.gallery_state()
+        # stamped before B, but only visible now
+        self.enroll('A', timedelta(seconds=10))
+        self.assertEqual(sorted(self.delta(version)[1]['employeeids']), ['A', 'B'])
+
+    def test_settled_gallery_version_is_the_newest_stamp(self):
+        self.enroll('OLD', timedelta(hours=1))
+        version, enrolled = gallery.gallery_state()
+        self.assertEqual(version, gallery.to_version(Employee.objects.get(employeeid='OLD').face_encoded_at))
+        self.assertEqual(enrolled, 1)
+        self.assertEqual(self.delta(version)[1]['employeeids'], [])
+
+
+class FaceGalleryFormatTests(SimpleTestCase):
+    @staticmethod
+    def encoding(value):
+        return struct.pack('<128d', *[value] * 128)
+
+    def test_pack_unpack_round_trip(self):
+        body = pack_gallery(42, ['E1', 'E2'], ["Ann", "Bob"], [self.encoding(1.0), self.encoding(2.5)],
+                            removed=['E9'], enrolled=2)
+        self.assertEqual(body[:8], b'HRFACES1')
+        version, index, encodings = unpack_gallery(body)
+        self.assertEqual(version, 42)
+        self.assertEqual(index, {'employeeids': ['E1', 'E2'], 'names': ["Ann", "Bob"],
+                                 'removed': ['E9'], 'enrolled': 2})
+        self.assertEqual(encodings.shape, (2, 128))
+        self.assertEqual((encodings[0, 0], encodings[1, 127]), (1.0, 2.5))
+
+    def test_unpack_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            unpack_gallery(b'\x89PNG' + bytes(64))
+
+    def test_memory_mapped_cache_round_trip(self):
+        index = FaceIndex(7, ['E1'], ["Ann"], unpack_gallery(pack_gallery(7, ['E1'], ["Ann"], [self.encoding(3.0)]))[2])
+        path = os.path.join(tempfile.mkdtemp(), 'gallery.bin')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        save_gallery(path, index)
+        cached = open_gallery(path)
+        self.assertEqual((cached.version, cached.employeeids, cached.names), (7, ['E1'], ["Ann"]))
+        self.assertEqual(cached.encodings[0, 0], 3.0)
+
+    def test_delta_merge_replaces_adds_and_removes(self):
+        _, _, encodings = unpack_gallery(pack_gallery(
+            1, ['E1', 'E2', 'E3'], ["Ann", "Bob", "Cy"], [self.encoding(v) for v in (1.0, 2.0, 3.0)]))
+        index = FaceIndex(1, ['E1', 'E2', 'E3'], ["Ann", "Bob", "Cy"], encodings)
+        _, delta, new = unpack_gallery(pack_gallery(
+            2, ['E2', 'E4'], ["Bobby", "Dee"], [self.encoding(20.0), self.encoding(4.0)], removed=['E3']))
+        merged = index.merge(2, delta['employeeids'], delta['names'], new, delta['removed'])
+
+        self.assertEqual(merged.version, 2)
+        self.assertEqual(merged.employeeids, ['E1', 'E2', 'E4'])
+        self.assertEqual(merged.names, ["Ann", "Bobby", "Dee"])
+        self.assertEqual(list(merged.encodings[:, 0]), [1.0, 20.0, 4.0])
+        # indexes are never changed in place
+        self.assertEqual((index.version, index.employeeids), (1, ['E1', 'E2', 'E3']))
+
+
+@skipUnless(find_spec('cv2'), "the kiosk's OpenCV is not installed")
+class ReidGalleryTests(SimpleTestCase):
+    def setUp(self):
+        from vision.reid import EMBEDDING_DIM, ReidGallery
+        self.dim = EMBEDDING_DIM
+        self.gallery = ReidGallery(capacity=3, ttl=30.0, threshold=0.85, hold_seconds=2.0, present_seconds=3.0)
+
+    def person(self, n, tweak=0.0):
+        """Unit embedding ``n``; a small ``tweak`` is the same person seen again."""
+        import numpy as np
+        embedding = np.zeros(self.dim, np.float32)
+        embedding[n] = 1.0
+        embedding[(n + 1) % self.dim] = tweak
+        return embedding / np.linalg.norm(embedding)
+
+    def test_same_person_on_another_camera_keeps_the_id(self):
+        [first] = self.gallery.assign('gate', [(1, self.person(0))], now=0.0)
+        [again] = self.gallery.assign('yard', [(7, self.person(0, tweak=0.1))], now=1.0)
+        [other] = self.gallery.assign('yard', [(8, self.person(5))], now=1.0)
+        self.assertEqual(again, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(self.gallery.occupancy(now=1.0), 2)
+
+    def test_two_tracks_on_one_camera_are_two_people(self):
+        ids = self.gallery.assign('gate', [(1, self.person(0)), (2, self.person(0, tweak=0.1))], now=0.0)
+        self.assertEqual(len(set(ids)), 2)
+
+    def test_ended_track_frees_its_person_for_the_same_camera(self):
+        [first] = self.gallery.assign('gate', [(1, self.person(0))], now=0.0)
+        # the tracker lost them and picked them up again as a new track
+        [again] = self.gallery.assign('gate', [(2, self.person(0, tweak=0.1))], ended=[1], now=0.5)
+        self.assertEqual(again, first)
+
+    def test_people_expire_after_the_ttl(self):
+        [first] = self.gallery.assign('gate', [(1, self.person(0))], now=0.0)
+        self.assertEqual(self.gallery.occupancy(now=10.0), 0)
+        [later] = self.gallery.assign('yard', [(1, self.person(0))], now=31.0)
+        self.assertNotEqual(later, first)
+
+    def test_full_gallery_reuses_the_least_recently_seen_row(self):
+        ids = [self.gallery.assign('gate', [(n, self.person(n))], now=float(n))[0] for n in range(3)]
+        [newcomer] = self.gallery.assign('gate', [(3, self.person(3))], now=3.0)
+        self.assertNotIn(newcomer, ids)
+        # person 0 was evicted; persons 1 and 2 are still matched
+        self.assertNotEqual(self.gallery.assign('yard', [(0, self.person(0))], now=4.0)[0], ids[0])
+        self.assertEqual(self.gallery.assign('yard', [(2, self.person(2))], now=4.0)[0], ids[2])
+
+
+class OccupancyRingTests(SimpleTestCase):
+    def test_wraparound_drops_buckets_older_than_the_ring(self):
+        ring = timeseries.Ring(4)
+        for bucket in range(6):
+            ring.add(bucket, bucket, bucket)
+        buckets, mins, avgs, maxs, counts = ring.window(0, 5)
+        self.assertEqual(buckets.tolist(), [2, 3, 4, 5])
+        self.assertEqual(mins.tolist(), [2, 3, 4, 5])
+        self.assertEqual(counts.tolist(), [1, 1, 1, 1])
+
+    def test_reused_slots_start_empty(self):
+        ring = timeseries.Ring(4)
+        ring.add(0, 3, 9)
+        # 4..6 land on the slots of 0..2, which must not keep the old 9s
+        ring.add(6, 6, 1)
+        buckets, mins, avgs, maxs, counts = ring.window(3, 6)
+        self.assertEqual(buckets.tolist(), [3, 4, 5, 6])
+        self.assertEqual(counts.tolist(), [1, 0, 0, 1])
+        self.assertEqual(maxs.tolist()[-1], 1)
+
+    def test_bucket_aggregates_min_avg_max(self):
+        ring = timeseries.Ring(4)
+        ring.add(0, 0, 2, count=3)
+        ring.add(0, 0, 8)
+        buckets, mins, avgs, maxs, counts = ring.window(0, 0)
+        self.assertEqual((mins[0], avgs[0], maxs[0], counts[0]), (2, 3.5, 8, 4))
+
+
+class OccupancyRollupTests(TestCase):
+    # hour-aligned, so the first minute and hour are joined 30 seconds in
+    base = 1_800_000_000
+
+    def rows(self, store, now):
+        return [(row.resolution, row.start.timestamp() - self.base, row.min, row.avg, row.max, row.samples)
+                for row in store.rollups(now=self.base + now)]
+
+    def test_rollups_skip_the_partial_bucket_and_rewrite_the_open_one(self):
+        store = timeseries.OccupancyStore()
+        store.record('gate', 2, now=self.base + 30)
+        store.record('gate', 4, now=self.base + 80)
+        # 60..79 held at 2, 80..119 at 4; 120..130 is the open minute
+        self.assertEqual(self.rows(store, 130), [
+            ('minute', 60, 2, 3.333, 4, 60),
+            ('minute', 120, 4, 4, 4, 11),
+        ])
+        self.assertEqual(self.rows(store, 140), [('minute', 120, 4, 4, 4, 21)])
+
+    def test_hold_stops_after_hold_seconds(self):
+        store = timeseries.OccupancyStore()
+        store.record('gate', 3, now=self.base + 30)
+        rows = self.rows(store, 30 + 3 * timeseries.HOLD_SECONDS)
+        self.assertEqual(sum(samples for *_, samples in rows),
+                         timeseries.HOLD_SECONDS - 29)
+
+    def test_flush_upserts_the_open_bucket(self):
+        store = timeseries.OccupancyStore()
+        with mock.patch.object(timeseries, 'store', store):
+            store.record('gate', 2, now=self.base + 30)
+            store.record('gate', 4, now=self.base + 80)
+            self.assertEqual(timeseries.flush(now=self.base + 130), 2)
+            store.record('gate', 6, now=self.base + 140)
+            self.assertEqual(timeseries.flush(now=self.base + 150), 1)
+        rows = OccupancyRollup.objects.order_by('start')
+        self.assertEqual([(row.max, row.samples) for row in rows], [(4, 60), (6, 31)])
+
+
+class LeaveOverlapTests(TestCase):
+    def setUp(self):
+        employee = Employee.objects.create(employeeid='L', name="Leave Taker")
+        # 10..14 March, both days inclusive
+        self.leave = LeaveApplication.objects.create(employee=employee, leave_type="Annual", reason="-",
+                                                     start_date=date(2026, 3, 10), end_date=date(2026, 3, 14))
+
+    def overlaps(self, start, end):
+        return LeaveApplication.objects.overlapping(date(2026, 3, start), date(2026, 3, end)).exists()
+
+    def test_shared_first_or_last_day_overlaps(self):
+        self.assertTrue(self.overlaps(5, 10))
+        self.assertTrue(self.overlaps(14, 20))
+        self.assertTrue(self.overlaps(14, 14))
+
+    def test_adjacent_ranges_do_not_overlap(self):
+        self.assertFalse(self.overlaps(5, 9))
+        self.assertFalse(self.overlaps(15, 20))
+
+    def test_containing_and_contained_ranges_overlap(self):
+        self.assertTrue(self.overlaps(1, 31))
+        self.assertTrue(self.overlaps(11, 12))
+
+    def test_rejected_leave_is_not_booked(self):
+        self.leave.status = LeaveApplication.REJECTED
+        self.leave.save()
+        self.assertTrue(self.overlaps(11, 12))
+        self.assertFalse(LeaveApplication.objects.booked().overlapping(date(2026, 3, 11), date(2026, 3, 12)).exists())
+
+
+@override_settings(KIOSK_DB_ALIAS='default', KIOSK_VIOLATIONS_TABLE='kiosk_violations')
+class ViolationPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employees = seed(2, days=0)
+        cls.staff = User.objects.create_user('admin', password='pw', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE kiosk_violations (id INTEGER PRIMARY KEY, name TEXT, camera TEXT,"
+                           " time TIMESTAMP, image TEXT)")
+            # the last row is from before the kiosk recorded employeeids
+            for raw_id, name in enumerate(['E0000', 'UNRECOGNIZED', 'E0001', 'EMPLOYEE 1'], start=1):
+                cursor.execute("INSERT INTO kiosk_violations VALUES (%s, %s, 'gate', '2026-03-02 08:00:00', 'x.jpg')",
+                               [raw_id, name])
+        self.client.force_login(self.staff)
+
+    def test_names_are_resolved_from_the_employeeid(self):
+        response = self.client.get('/homeadmin/violations/')
+        self.assertEqual([(row['employeeid'], row['name']) for row in response.context['rows']], [
+            ('EMPLOYEE 1', 'EMPLOYEE 1'),
+            ('E0001', 'Employee 1'),
+            ('UNRECOGNIZED', 'UNRECOGNIZED'),
+            ('E0000', 'Employee 0'),
+        ])
+
+    def test_filter_matches_the_employeeid(self):
+        rows = self.client.get('/homeadmin/violations/?employeeid=E0001').context['rows']
+        self.assertEqual([row['id'] for row in rows], [3])
+        rows = self.client.get('/homeadmin/violations/?employeeid=unrecognized').context['rows']
+        self.assertEqual([row['id'] for row in rows], [2])
@@ -0,0 +1,249 @@
+"""
+Occupancy time series per camera, in fixed-size ring buffers.
+
+The kiosk reports a camera's worker count when it changes (``occupancy``
+live events), and the re-ID service reports the deduplicated site total
+(``site_occupancy``, kept here under SITE). ``hrapp.live`` hands every
+count to ``store.record``. The count is held until the next report, so
+each camera has one sample per second. Every sample lands in three rings
+of min/sum/count/max buckets:
+
+* SECOND: 3600 one-second buckets (the last hour);
+* MINUTE: 1440 one-minute buckets (the last day);
+* HOUR: 744 one-hour buckets (the last 31 days).
+
+The rings are numpy arrays allocated once and indexed by absolute bucket
+number modulo their size. So memory is fixed per camera, and reading a
+window is one slice whatever the traffic. A count that is not refreshed
+for HOLD_SECONDS is no longer carried forward (the camera is presumed
+down) and the chart shows a gap.
+
+Only the minute and hour rings are persisted. ``manage.py
+record_occupancy`` listens for the events and upserts them into
+``OccupancyRollup`` every TIMESERIES_FLUSH_SECONDS, including the
+still-open buckets. It never writes a bucket it only saw part of, such
+as the minute it started in. ``series`` answers a dashboard window from
+this process's rings when they cover it, and otherwise from a fixed
+number of rollup rows (60, 1440 or 744).
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import OccupancyRollup
+
+SITE = 'site'
+SECOND, MINUTE, HOUR = 'second', OccupancyRollup.MINUTE, OccupancyRollup.HOUR
+STEPS = {SECOND: 1, MINUTE: 60, HOUR: 3600}
+SLOTS = {SECOND: 3600, MINUTE: 1440, HOUR: 31 * 24}
+# how long a camera's last count is carried forward without a new report
+HOLD_SECONDS = 300
+
+# dashboard window -> (seconds, in-memory resolution, stored resolution)
+WINDOWS = {
+    'hour': (3600, SECOND, MINUTE),
+    'day': (86400, MINUTE, MINUTE),
+    'month': (31 * 86400, HOUR, HOUR),
+}
+
+
+class Ring:
+    """min/sum/count/max over ``slots`` consecutive buckets; bucket n lives in slot n % slots."""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.mins = np.full(slots, np.inf)
+        self.maxs = np.full(slots, -np.inf)
+        self.sums = np.zeros(slots)
+        self.counts = np.zeros(slots, np.int64)
+        self.head = None  # newest bucket number
+
+    def clear(self, first, last):
+        idx = np.arange(max(first, last - self.slots + 1), last + 1) % self.slots
+        self.mins[idx] = np.inf
+        self.maxs[idx] = -np.inf
+        self.sums[idx] = 0
+        self.counts[idx] = 0
+
+    def advance(self, bucket):
+        if self.head is None:
+            self.clear(bucket, bucket)
+            self.head = bucket
+        elif bucket > self.head:
+            self.clear(self.head + 1, bucket)
+            self.head = bucket
+
+    def add(self, first, last, value, count=1):
+        """``count`` samples of ``value`` in each of buckets ``first..last``."""
+        self.advance(last)
+        first = max(first, self.head - self.slots + 1)
+        if first > last:
+            return
+        idx = np.arange(first, last + 1) % self.slots
+        self.mins[idx] = np.minimum(self.mins[idx], value)
+        self.maxs[idx] = np.maximum(self.maxs[idx], value)
+        self.sums[idx] += value * count
+        self.counts[idx] += count
+
+    def window(self, first, last):
+        """``(buckets, mins, avgs, maxs, counts)`` for ``first..last``; buckets outside the ring are dropped."""
+        if self.head is None:
+            first = last + 1
+        else:
+            first = max(first, self.head - self.slots + 1)
+            last = min(last, self.head)
+        buckets = np.arange(first, last + 1)
+        idx = buckets % self.slots
+        counts = self.counts[idx]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avgs = self.sums[idx] / counts
+        return buckets, self.mins[idx], avgs, self.maxs[idx], counts
+
+
+class CameraSeries:
+    def __init__(self, now):
+        self.rings = {resolution: Ring(slots) for resolution, slots in SLOTS.items()}
+        self.since = int(now)      # first second this process saw
+        self.filled = self.since - 1  # last second with a sample
+        self.value = None
+        self.reported = None
+
+    def add(self, first, last, value):
+        """One sample of ``value`` for every second ``first..last``."""
+        self.rings[SECOND].add(first, last, value)
+        for resolution in (MINUTE, HOUR):
+            step = STEPS[resolution]
+            for bucket in range(first // step, last // step + 1):
+                seconds = min(last, (bucket + 1) * step - 1) - max(first, bucket * step) + 1
+                self.rings[resolution].add(bucket, bucket, value, seconds)
+
+    def hold(self, until):
+        """Carry the last count forward to second ``until`` (at most HOLD_SECONDS past its report)."""
+        if self.value is None:
+            return
+        last = min(until, self.reported + HOLD_SECONDS)
+        if last > self.filled:
+            self.add(self.filled + 1, last, self.value)
+            self.filled = last
+
+    def record(self, value, now):
+        second = int(now)
+        self.hold(second - 1)
+        # a second report within the same second adds a second sample
+        self.add(second, second, value)
+        self.filled = max(self.filled, second)
+        self.value, self.reported = value, second
+
+
+def bucket_time(bucket, resolution):
+    return datetime.fromtimestamp(bucket * STEPS[resolution], tz=dt_timezone.utc)
+
+
+class OccupancyStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cameras = {}
+        self.flushed = {}  # (camera, resolution) -> last bucket written (re-written while open)
+
+    def record(self, camera, value, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self.cameras.get(camera)
+            if series is None:
+                series = self.cameras[camera] = CameraSeries(now)
+            series.record(value, now)
+
+    def points(self, camera, seconds, resolution, now=None):
+        """In-memory points for the last ``seconds``, or None if this process has not seen them all."""
+        now = time.time() if now is None else now
+        step = STEPS[resolution]
+        with self._lock:
+            series = self.cameras.get(camera)
+            if series is None or series.since > now - seconds:
+                return None
+            series.hold(int(now))
+            buckets, mins, avgs, maxs, counts = series.rings[resolution].window(
+                int(now - seconds) // step + 1, int(now) // step)
+        return [point(bucket * step, lo, avg, hi) for bucket, lo, avg, hi, n
+                in zip(buckets.tolist(), mins.tolist(), avgs.tolist(), maxs.tolist(), counts.tolist()) if n]
+
+    def rollups(self, now=None):
+        """``OccupancyRollup`` rows for every minute/hour bucket changed since the last flush."""
+        now = time.time() if now is None else now
+        rows = []
+        with self._lock:
+            for camera, series in self.cameras.items():
+                series.hold(int(now))
+                for resolution in (MINUTE, HOUR):
+                    step = STEPS[resolution]
+                    ring = series.rings[resolution]
+                    if ring.head is None:
+                        continue
+                    # skip the bucket this process joined part-way through
+                    first_full = -(-series.since // step)
+                    first = max(first_full, self.flushed.get((camera, resolution), first_full))
+                    buckets, mins, avgs, maxs, counts = ring.window(first, ring.head)
+                    for bucket, lo, avg, hi, n in zip(buckets.tolist(), mins.tolist(), avgs.tolist(),
+                                                      maxs.tolist(), counts.tolist()):
+                        if n:
+                            rows.append(OccupancyRollup(camera=camera, resolution=resolution,
+                                                        start=bucket_time(bucket, resolution),
+                                                        min=lo, avg=round(avg, 3), max=hi, samples=n))
+                    # the newest bucket is still open: write it again next time
+                    self.flushed[(camera, resolution)] = max(first, ring.head)
+        return rows
+
+
+store = OccupancyStore()
+
+
+def point(epoch_seconds, lo, avg, hi):
+    return [int(epoch_seconds * 1000), lo, round(avg, 2), hi]
+
+
+# ---------- persistence ----------
+def flush(now=None):
+    """Upsert changed minute/hour buckets and drop minute rows past retention; returns rows written."""
+    rows = store.rollups(now)
+    if rows:
+        OccupancyRollup.objects.bulk_create(
+            rows, update_conflicts=True,
+            unique_fields=['camera', 'resolution', 'start'],
+            update_fields=['min', 'avg', 'max', 'samples'],
+        )
+    cutoff = timezone.now() - timedelta(days=settings.TIMESERIES_MINUTE_RETENTION_DAYS)
+    OccupancyRollup.objects.filter(resolution=MINUTE, start__lt=cutoff).delete()
+    return len(rows)
+
+
+# ---------- queries ----------
+def series(camera, window, now=None):
+    """
+    ``(resolution, [[epoch ms, min, avg, max], ...])`` for the last
+    ``window`` ('hour', 'day' or 'month'), oldest first. Costs the same
+    for any amount of recorded data: one ring slice, or at most
+    SLOTS[resolution] rows read through the unique index.
+    """
+    seconds, memory_resolution, stored_resolution = WINDOWS[window]
+    points = store.points(camera, seconds, memory_resolution, now)
+    if points is not None:
+        return memory_resolution, points
+    now = time.time() if now is None else now
+    rows = (OccupancyRollup.objects
+            .filter(camera=camera, resolution=stored_resolution,
+                    start__gt=datetime.fromtimestamp(now - seconds, tz=dt_timezone.utc))
+            .order_by('start')
+            .values_list('start', 'min', 'avg', 'max'))
+    return stored_resolution, [point(start.timestamp(), lo, avg, hi) for start, lo, avg, hi in rows]
+
+
+def cameras():
+    """Cameras with stored rollups, SITE first."""
+    names = set(OccupancyRollup.objects.filter(resolution=HOUR).values_list('camera', flat=True).distinct())
+    names.update(store.cameras)
+    names.discard(SITE)
+    return [SITE] + sorted(names)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 urlpatterns = [
     path('', views.login_view, name='login'),
@@ -14,12 +14,28 @@ urlpatterns = [
     path('plot/age/', views.plot_age, name='plot_age'),
     path('plot/attendanceagain/', views.plot_attendanceagain, name='plot_attendanceagain'),
     path('generate_pdf/', views.generate_pdf, name='generate_pdf'),
+    path('reports/<int:job_id>/', views.report_status, name='report_status'),
+    path('reports/<int:job_id>/download/', views.report_download, name='report_download'),
     path('generate_csv/', views.generate_csv, name='generate_csv'),
     path('performance_reviews/', views.performance_reviews, name='performance_reviews'),
     path('leave_application/', views.leave_application, name='leave_application'),
+    path('homeadmin/leave/', views.leave_calendar, name='leave_calendar'),
     path('send_notification/', views.send_notification, name='send_notification'),
     path('table/', views.table, name='table'),
-    path('data/', views.data, name='data'),
+    path('table/rows/', views.table_rows, name='table_rows'),
+    path('data/', api.employee_data, name='data'),
+    path('data/attendance/', api.attendance_data, name='attendance_data'),
+    path('data/attendance/analytics/', api.attendance_analytics, name='attendance_analytics'),
+    path('data/leave/', api.leave_calendar, name='leave_calendar_data'),
+    path('data/faces/', api.face_gallery, name='face_gallery'),
     path('homeadmin/add-review/', views.add_performance_review, name='add_performance_review'),
+    path('homeadmin/credentials/<int:export_id>/', views.credential_export_download, name='credential_export_download'),
+    path('homeadmin/profiling/', views.profiling_stats, name='profiling_stats'),
+    path('homeadmin/live/', views.live_metrics, name='live_metrics'),
+    path('homeadmin/occupancy/', views.occupancy_series, name='occupancy_series'),
+    path('homeadmin/violations/', views.violation_list, name='violation_list'),
+    path('homeadmin/violations/<int:violation_id>/snapshot/', views.violation_snapshot, name='violation_snapshot'),
+    path('homeadmin/import/', views.employee_import, name='employee_import'),
+    path('homeadmin/import/<int:import_id>/errors/', views.employee_import_errors, name='employee_import_errors'),
 
 ]
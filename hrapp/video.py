@@ -0,0 +1,143 @@
+"""
+Frame-range analysis of recorded camera footage.
+
+Like ``charts`` and ``faces``, this module does not import Django:
+``probe_video`` and ``analyze_range`` run in worker processes and only
+receive a file path, a frame range and plain options. OpenCV and
+ultralytics are imported lazily, and each worker process loads its YOLO
+models once and reuses them for every range it is given.
+
+For every ``sample_every``-th frame the person detector counts workers.
+When a helmet model is configured, a worker counts as a violation if no
+helmet box sits in the top third of their box. A crossing is counted when
+a worker's centre moves across the horizontal counting line (``line``, a
+fraction of the frame height) between two sampled frames. People are
+matched to the nearest centre in the previous sample. Ranges must start
+on a multiple of ``sample_every``. Each range also decodes the sample
+just before it, so crossings at a range boundary are not lost.
+"""
+import math
+
+PERSON_CLASS = 0  # COCO "person"
+
+_models = {}
+
+
+def get_model(path):
+    model = _models.get(path)
+    if model is None:
+        from ultralytics import YOLO
+        model = _models[path] = YOLO(path)
+    return model
+
+
+def probe_video(path):
+    """``(frame_count, fps)`` of a video file."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"cannot open video {path}")
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    finally:
+        cap.release()
+    return frames, fps
+
+
+def detect(model, frame, conf, classes=None):
+    boxes = []
+    for result in model(frame, conf=conf, classes=classes, verbose=False):
+        if result.boxes is None:
+            continue
+        boxes.extend(tuple(box) for box in result.boxes.xyxy.tolist())
+    return boxes
+
+
+def wears_helmet(person, helmets):
+    x1, y1, x2, y2 = person
+    head_bottom = y1 + (y2 - y1) / 3
+    for hx1, hy1, hx2, hy2 in helmets:
+        cx, cy = (hx1 + hx2) / 2, (hy1 + hy2) / 2
+        if x1 <= cx <= x2 and y1 - (y2 - y1) / 6 <= cy <= head_bottom:
+            return True
+    return False
+
+
+def count_crossings(previous, current, line_y, max_jump):
+    """Crossings of ``line_y`` by greedily matching each centre to its nearest previous one."""
+    crossings = 0
+    unmatched = list(previous)
+    for x, y in current:
+        if not unmatched:
+            break
+        nearest = min(unmatched, key=lambda p: (p[0] - x) ** 2 + (p[1] - y) ** 2)
+        if math.dist(nearest, (x, y)) > max_jump:
+            continue
+        unmatched.remove(nearest)
+        if (nearest[1] < line_y) != (y < line_y):
+            crossings += 1
+    return crossings
+
+
+def analyze_range(path, start, stop, fps, options):
+    """
+    Stats for frames ``[start, stop)``: sample count, worker totals, peak,
+    crossings and per-second buckets ``{second: [sum, samples, peak,
+    violations]}`` (violations is the peak helmetless count that second).
+    """
+    import cv2
+
+    sample_every = options['sample_every']
+    person_model = get_model(options['person_model'])
+    helmet_model = get_model(options['helmet_model']) if options['helmet_model'] else None
+
+    first = max(start - sample_every, 0)
+    cap = cv2.VideoCapture(path)
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    samples = workers = peak = crossings = 0
+    buckets = {}
+    previous = None
+    try:
+        for index in range(first, stop):
+            # grab() skips the colour conversion of frames that are not sampled
+            if not cap.grab():
+                break
+            if index % sample_every:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+
+            height, width = frame.shape[:2]
+            people = detect(person_model, frame, options['conf'], classes=[PERSON_CLASS])
+            centres = [((x1 + x2) / 2, (y1 + y2) / 2) for x1, y1, x2, y2 in people]
+            if previous is not None and index >= start:
+                crossings += count_crossings(previous, centres, options['line'] * height,
+                                             max_jump=0.15 * math.hypot(width, height))
+            previous = centres
+            if index < start:
+                continue
+
+            violations = 0
+            if helmet_model is not None and people:
+                helmets = detect(helmet_model, frame, options['conf'])
+                violations = sum(1 for person in people if not wears_helmet(person, helmets))
+
+            count = len(people)
+            samples += 1
+            workers += count
+            peak = max(peak, count)
+            bucket = buckets.setdefault(int(index / fps), [0, 0, 0, 0])
+            bucket[0] += count
+            bucket[1] += 1
+            bucket[2] = max(bucket[2], count)
+            bucket[3] = max(bucket[3], violations)
+    finally:
+        cap.release()
+
+    return {'samples': samples, 'workers': workers, 'peak': peak,
+            'crossings': crossings, 'buckets': buckets}
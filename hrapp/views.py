@@ -1,18 +1,30 @@
 import io
+import os
+from datetime import timedelta
+from functools import wraps
 
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
+from django.db.models import Count, Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib.auth import authenticate, login, logout
-from django.http import HttpResponse, JsonResponse, FileResponse
-from .models import Employee, Attendance, PerformanceReview, LeaveApplication
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, FileResponse, StreamingHttpResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from .models import (
+    Employee, Attendance, PerformanceReview, LeaveApplication, ReportJob, AttendanceRollup,
+    Broadcast, BroadcastDelivery, CredentialExport, EmployeeImport, VideoAnalysis,
+)
+from . import accounts, api, footage, imports, leave, live, profiling, reports, summaries, violations
+from . import notifications as notifications_svc
+from .profiling import query_budget
+from .routing import replica_reads
 from django.core.mail import send_mail
-import pandas as pd
 
-from reportlab.lib.pagesizes import letter
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import FileResponse, JsonResponse
@@ -20,16 +32,8 @@ from django.contrib.admin.views.decorators import staff_member_required
 
 from django.core.mail import EmailMessage
 
-from reportlab.pdfgen import canvas
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-
-from PIL import Image
+import csv
 import io
-import traceback
 
 from .models import Employee
 from django.shortcuts import render
@@ -53,26 +57,44 @@ def login_view(request):
     return render(request, 'login.html', {'error': error})
 
 #------------------Admin Page----------------------
+@query_budget(3)
 @staff_member_required(login_url='login')
 def homeadmin(request):
     return render(request, 'homeadmin.html')
 
 
 # ---------- Data fetch helpers ----------
+# every column except the binary face encoding, which has no place in tables or exports
+EMPLOYEE_VALUE_FIELDS = [f.attname for f in Employee._meta.concrete_fields if f.name != 'face_encoding']
+
 def fetch_employee_queryset():
     return Employee.objects.all()
 
 def df_from_queryset(qs):
-    # convert to dataframe; select relevant fields
-    qs_vals = qs.values()
-    return pd.DataFrame.from_records(qs_vals)
+    # convert to dataframe; select relevant fields (pandas loads on first use)
+    from .charts import frame
+    return frame(list(qs.values(*EMPLOYEE_VALUE_FIELDS)))
 
 
+@query_budget(6)
 @staff_member_required(login_url='login')
 def notifications(request):
     # pass a queryset of employees (or list of tuples if you prefer)
-    employees = Employee.objects.exclude(email__isnull=True).exclude(email__exact='').order_by('employeeid')
-    return render(request, 'notifications.html', {'employees': employees})
+    employees = (Employee.objects.exclude(email__isnull=True).exclude(email__exact='')
+                 .order_by('employeeid').values('pk', 'employeeid', 'name', 'email'))
+    departments = (Employee.objects.exclude(department__isnull=True).exclude(department__exact='')
+                   .order_by('department').values_list('department', flat=True).distinct())
+    broadcasts = (Broadcast.objects.order_by('-created_at')
+                  .annotate(
+                      sent=Count('deliveries', filter=Q(deliveries__status=BroadcastDelivery.SENT)),
+                      failed=Count('deliveries', filter=Q(deliveries__status=BroadcastDelivery.FAILED)),
+                      total=Count('deliveries'),
+                  )[:10])
+    return render(request, 'notifications.html', {
+        'employees': employees,
+        'departments': departments,
+        'broadcasts': broadcasts,
+    })
 
 # -------------Notifications--------------------
 @staff_member_required(login_url='login')
@@ -81,33 +103,37 @@ def send_notification(request):
         return redirect('notifications')
 
     # basic server-side validation
-    email = request.POST.get('email')
-    email_type = request.POST.get('email_type')
-
-    if not email or '@' not in email:
-        messages.error(request, "Invalid recipient email.")
+    target = request.POST.get('target', 'single')
+    if target not in ('single', Broadcast.ALL, Broadcast.DEPARTMENT, Broadcast.SELECTED):
+        messages.error(request, "Invalid recipients.")
         return redirect('notifications')
 
-    if email_type not in ('shift_change', 'custom_message'):
-        messages.error(request, "Invalid email type.")
+    subject, message_body, error = notifications_svc.build_message(request.POST)
+    if error:
+        messages.error(request, error)
         return redirect('notifications')
 
-    subject = "Notification"
-    message_body = ""
-    if email_type == 'shift_change':
-        shift_number = request.POST.get('shift_number', '').strip()
-        shift_time = request.POST.get('shift_time', '').strip()
-        if not shift_number or not shift_time:
-            messages.error(request, "Shift number and shift time are required for shift notifications.")
+    if target != 'single':
+        department = request.POST.get('department', '').strip()
+        employee_ids = request.POST.getlist('employee_ids')
+        if target == Broadcast.DEPARTMENT and not department:
+            messages.error(request, "Please choose a department.")
             return redirect('notifications')
-        subject = f"Shift Change Notification for Shift {shift_number}"
-        message_body = f"Dear Employee,\n\nYour shift has been changed to Shift {shift_number} at {shift_time}.\n\n"
-    else:
-        subject = request.POST.get('custom_subject', '').strip() or "Notification"
-        message_body = request.POST.get('custom_message', '').strip()
-        if not message_body:
-            messages.error(request, "Custom message cannot be empty.")
+        if target == Broadcast.SELECTED and not employee_ids:
+            messages.error(request, "Please select at least one employee.")
             return redirect('notifications')
+        broadcast, count = notifications_svc.create_broadcast(
+            subject, message_body, target, request.user, department=department, employee_ids=employee_ids)
+        if count:
+            messages.success(request, f"Broadcast queued for {count} employee(s).")
+        else:
+            messages.error(request, "No employees with an email address match that selection.")
+        return redirect('notifications')
+
+    email = request.POST.get('email')
+    if not email or '@' not in email:
+        messages.error(request, "Invalid recipient email.")
+        return redirect('notifications')
 
     try:
         EmailMessage(subject, message_body, to=[email]).send()
@@ -117,59 +143,62 @@ def send_notification(request):
 
     return redirect('notifications')
 # ----------------------Camera Feeds---------------------
+# (file in hrapp/static/videos, caption); stats come from manage.py analyze_videos
+CAMERA_FEEDS = [
+    ('myclassdetectf.mp4', 'Our Classroom'),
+    ('bsndetect1.mp4', 'BSN Block Entrance'),
+    ('trespassingcomplete.mp4', 'Trespassing Detection'),
+    ('workerscount.mp4', 'Worker Detection & Count'),
+    ('crowdlimit.mp4', 'Factory Floor Zone Limit'),
+    ('trespass2.mp4', 'Trespassing (Camera 2)'),
+]
+
+@query_budget(3)
 @staff_member_required(login_url='login')
 def camera_feeds(request):
-    return render(request, 'camera_feeds.html')
+    analyses = {a.video: a for a in VideoAnalysis.objects.all()}
+    feeds = []
+    for video, caption in CAMERA_FEEDS:
+        analysis = analyses.get(video)
+        feeds.append({
+            'video': video,
+            'caption': caption,
+            'analysis': analysis,
+            'sparkline': footage.sparkline(analysis.timeline) if analysis else '',
+        })
+    return render(request, 'camera_feeds.html', {'feeds': feeds})
 
 
 # ---------- plotting helpers ----------
+# The chart views import hrapp.charts (matplotlib, pandas) inside the view,
+# so workers that only serve forms and the portal never load it.
 def fig_to_response(fig):
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    return HttpResponse(buf.getvalue(), content_type='image/png')
-
-def plot_monthly_attendance_df(df):
-    for col in ['JAN','FEB','MAR']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-    attendance = df[['JAN','FEB','MAR']].sum()
-    fig, ax = plt.subplots(figsize=(8,6))
-    attendance.plot(kind='bar', ax=ax)
-    ax.set_title('Monthly Attendance Analysis')
-    ax.set_xlabel('Month')
-    ax.set_ylabel('Total Attendance')
-    return fig
-
-def plot_gender_distribution_df(df):
-    if 'GENDER' in df.columns:
-        df['GENDER'] = df['GENDER'].fillna('UNKNOWN').str.upper()
-        gender_distribution = df['GENDER'].value_counts()
-        fig, ax = plt.subplots(figsize=(8,6))
-        gender_distribution.plot(kind='pie', autopct='%1.1f%%', ax=ax)
-        ax.set_ylabel('')
-        return fig
-    return None
-
-def plot_age_distribution_df(df):
-    if 'AGE' in df.columns:
-        fig, ax = plt.subplots(figsize=(10,6))
-        ax.hist(df['AGE'].dropna(), bins=10, edgecolor='black')
-        ax.set_title('Age Distribution Analysis')
-        ax.set_xlabel('AGE')
-        ax.set_ylabel('Number of Employees')
-        return fig
-    return None
+    from .charts import fig_to_png
+    return HttpResponse(fig_to_png(fig), content_type='image/png')
 
 # ---------- views that render plots ----------
+def report_period(request):
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, defaulting to the last 12 months
+    start, end = reports.default_period()
+    start = parse_date(request.GET.get('start') or '') or start
+    end = parse_date(request.GET.get('end') or '') or end
+    return start, end
+
+@query_budget(4)
+@replica_reads
 def plot_attendance(request):
-    qs = fetch_employee_queryset()
-    df = df_from_queryset(qs)
-    fig = plot_monthly_attendance_df(df)
+    start, end = report_period(request)
+    from .charts import frame, plot_monthly_attendance_df
+    rows = reports.monthly_attendance_rows(start, end)
+    fig = plot_monthly_attendance_df(frame(rows, reports.MONTHLY_COLUMNS))
+    if fig is None:
+        return HttpResponse("No attendance data")
     return fig_to_response(fig)
 
+@query_budget(4)
+@replica_reads
 def plot_gender(request):
+    from .charts import plot_gender_distribution_df
     qs = fetch_employee_queryset()
     df = df_from_queryset(qs)
     fig = plot_gender_distribution_df(df)
@@ -177,7 +206,10 @@ def plot_gender(request):
         return fig_to_response(fig)
     return HttpResponse("No gender data available")
 
+@query_budget(4)
+@replica_reads
 def plot_age(request):
+    from .charts import plot_age_distribution_df
     qs = fetch_employee_queryset()
     df = df_from_queryset(qs)
     fig = plot_age_distribution_df(df)
@@ -185,152 +217,273 @@ def plot_age(request):
         return fig_to_response(fig)
     return HttpResponse("No age data available")
 
-# ---------- alternate attendance plot (name/time) ----------
+# ---------- alternate attendance plot (days present per name) ----------
+@query_budget(4)
+@replica_reads
 def plot_attendanceagain(request):
-    # Build DataFrame from Attendance table
-    rows = Attendance.objects.select_related('employee').values_list('employee__name', 'time')
-    df = pd.DataFrame(list(rows), columns=['Name','Time'])
-    if df.empty:
+    start, end = report_period(request)
+    from .charts import frame, plot_attendance_by_name_df
+    rows = reports.attendance_by_name_rows(start, end)
+    fig = plot_attendance_by_name_df(frame(rows, reports.ATTENDANCE_COLUMNS))
+    if fig is None:
         return HttpResponse("No attendance data")
-    fig, ax = plt.subplots(figsize=(10,6))
-    df.groupby('Name')['Time'].sum().plot(kind='bar', ax=ax)
-    ax.set_title('Attendance Analysis')
-    ax.set_xlabel('Name')
-    ax.set_ylabel('Time')
-    plt.xticks(rotation=45, ha='right')
     return fig_to_response(fig)
 
 # ---------- table & data endpoints ----------
-def table(request):
-    qs = fetch_employee_queryset()
-    employees = list(qs.values())
-    return render(request, 'table.html', {'employees': employees})
+TABLE_FIELDS = ('employeeid', 'department', 'phone_no', 'email',
+                'address', 'name', 'AGE', 'GENDER')
+# only NOT NULL columns, so the keyset cursor never has to compare NULLs
+TABLE_SORT_FIELDS = ('employeeid', 'name')
+TABLE_PAGE_SIZES = (25, 50, 100, 200)
+
+
+def employee_table_page(request):
+    """
+    One keyset page of the employee table for ?q=, ?sort=, ?size= and
+    ?cursor=. Cost depends on the page size, not on the table size: there
+    is no OFFSET and no COUNT(*). Raises ValueError for a bad cursor.
+    """
+    query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', 'employeeid')
+    if sort.lstrip('-') not in TABLE_SORT_FIELDS:
+        sort = 'employeeid'
+    try:
+        size = int(request.GET.get('size', TABLE_PAGE_SIZES[0]))
+    except ValueError:
+        size = TABLE_PAGE_SIZES[0]
+    if size not in TABLE_PAGE_SIZES:
+        size = TABLE_PAGE_SIZES[0]
 
-def data(request):
     qs = fetch_employee_queryset()
-    df = df_from_queryset(qs)
-    return HttpResponse(df.to_json(orient='records'), content_type='application/json')
+    if query:
+        qs = qs.filter(Q(employeeid__icontains=query) | Q(name__icontains=query) | Q(email__icontains=query))
+
+    order = (sort, '-id' if sort.startswith('-') else 'id')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            values = api.decode_cursor(cursor)
+            qs = qs.filter(api.after_cursor(order, values))
+            if not isinstance(values[0], str) or not isinstance(values[1], int):
+                raise ValueError
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor") from None
+
+    employees, next_cursor = api.keyset_page(qs.values, TABLE_FIELDS, order, size)
+    return {
+        'employees': employees,
+        'next_cursor': next_cursor,
+        'q': query,
+        'sort': sort,
+        'size': size,
+        'page_sizes': TABLE_PAGE_SIZES,
+        'sort_fields': TABLE_SORT_FIELDS,
+    }
+
+
+@query_budget(4)
+@replica_reads
+def table(request):
+    try:
+        page = employee_table_page(request)
+    except ValueError as e:
+        return api.bad_request(str(e))
+    return render(request, 'table.html', page)
+
+
+@query_budget(4)
+@replica_reads
+def table_rows(request):
+    # JSON fragment used by the "Load more" button on table.html
+    try:
+        page = employee_table_page(request)
+    except ValueError as e:
+        return api.bad_request(str(e))
+    html = render_to_string('table_rows.html', page, request=request)
+    return JsonResponse({'html': html, 'next_cursor': page['next_cursor']})
+
 @staff_member_required(login_url='login')
 # ---------- generate CSV ----------
+@query_budget(4)
+@replica_reads
 def generate_csv(request):
+    # plain csv rather than a DataFrame: an export should not have to load pandas
     qs = fetch_employee_queryset()
-    df = df_from_queryset(qs)
     csv_buf = io.StringIO()
-    df.to_csv(csv_buf, index=False)
-    csv_buf.seek(0)
+    writer = csv.writer(csv_buf)
+    writer.writerow(EMPLOYEE_VALUE_FIELDS)
+    writer.writerows(qs.values_list(*EMPLOYEE_VALUE_FIELDS).iterator(chunk_size=2000))
     return HttpResponse(csv_buf.getvalue(), content_type='text/csv', headers={
         'Content-Disposition': 'attachment; filename="employee_data.csv"'
     })
 
 
+# ---------- PDF report jobs ----------
+@query_budget(10)
 @staff_member_required(login_url='login')
+@replica_reads
 def generate_pdf(request):
-    try:
-        qs = fetch_employee_queryset()
-        df = df_from_queryset(qs)
+    # Queue (or reuse) a report job instead of rendering inside the request.
+    job = reports.enqueue_report(request.user)
+    payload = report_job_payload(job)
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(payload, status=200 if job.status == ReportJob.DONE else 202)
+    return render(request, 'report_job.html', {'job': payload})
+
+def report_job_payload(job):
+    payload = {
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('report_status', args=[job.id]),
+        'download_url': None,
+        'error': job.error or None,
+    }
+    if job.status == ReportJob.DONE:
+        payload['download_url'] = reverse('report_download', args=[job.id])
+    return payload
 
-        images = []
+@query_budget(3)
+@staff_member_required(login_url='login')
+def report_status(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id)
+    return JsonResponse(report_job_payload(job))
 
-        # helper to create a PNG BytesIO from a matplotlib fig
-        def fig_to_buf(fig):
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png', bbox_inches='tight')
-            plt.close(fig)
-            buf.seek(0)
-            return buf
+@query_budget(3)
+@staff_member_required(login_url='login')
+def report_download(request, job_id):
+    job = get_object_or_404(ReportJob, pk=job_id, status=ReportJob.DONE)
+    return FileResponse(job.pdf.open('rb'), as_attachment=True, filename='employee_data.pdf')
 
-        # Attendance
-        try:
-            fig = plot_monthly_attendance_df(df)
-            buf = fig_to_buf(fig)
-            images.append((buf, "Monthly Attendance Analysis"))
-        except Exception as e:
-            print("Attendance plot skipped:", e)
+# ---------- admin credential exports ----------
+@staff_member_required(login_url='login')
+def credential_export_download(request, export_id):
+    export = get_object_or_404(CredentialExport, pk=export_id, requested_by=request.user)
+    if export.status == CredentialExport.PENDING:
+        return HttpResponse("Still processing; refresh this page in a moment.")
+    gone = HttpResponse("This credentials file is not available (failed, expired or already downloaded).", status=410)
+    if export.status == CredentialExport.FAILED or not export.file or accounts.is_expired(export):
+        accounts.expire_exports()
+        return gone
+    # one-time download: claim it, so two concurrent requests cannot both get the passwords
+    claimed = (CredentialExport.objects.filter(pk=export.pk, downloaded_at__isnull=True)
+               .update(downloaded_at=timezone.now()))
+    if not claimed:
+        return gone
+    with export.file.open('rb') as f:
+        content = f.read()
+    export.file.delete(save=True)
+    return HttpResponse(content, content_type='text/csv', headers={
+        'Content-Disposition': 'attachment; filename="credentials.csv"',
+        'Cache-Control': 'no-store',
+    })
 
-        # Gender
-        try:
-            fig = plot_gender_distribution_df(df)
-            if fig:
-                buf = fig_to_buf(fig)
-                images.append((buf, "Gender Distribution Analysis"))
-        except Exception as e:
-            print("Gender plot skipped:", e)
-
-        # Age
-        try:
-            fig = plot_age_distribution_df(df)
-            if fig:
-                buf = fig_to_buf(fig)
-                images.append((buf, "Age Distribution Analysis"))
-        except Exception as e:
-            print("Age plot skipped:", e)
-
-        # Attendance by name (explicitly build fig here, avoid calling the view)
-        try:
-            rows = Attendance.objects.select_related('employee').values_list('employee__name', 'time')
-            df2 = pd.DataFrame(list(rows), columns=['Name', 'Time'])
-            if not df2.empty:
-                fig, ax = plt.subplots(figsize=(10,6))
-                df2.groupby('Name')['Time'].sum().plot(kind='bar', ax=ax)
-                ax.set_title('Attendance Analysis (By Name)')
-                ax.set_xlabel('Name')
-                ax.set_ylabel('Time')
-                plt.xticks(rotation=45, ha='right')
-                buf = fig_to_buf(fig)
-                images.append((buf, "Attendance Analysis (By Name)"))
-        except Exception as e:
-            print("Attendance-by-name skipped:", e)
-
-        # Build PDF
-        pdf_buffer = io.BytesIO()
-        doc = SimpleDocTemplate(pdf_buffer, pagesize=letter,
-                                leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
-        styles = getSampleStyleSheet()
-        story = []
-
-        story.append(Paragraph("Employee Data Visualization", styles['Title']))
-        story.append(Spacer(1, 12))
-        story.append(Paragraph("Generated report", styles['Normal']))
-        story.append(Spacer(1, 18))
-
-        max_width = doc.width  # available width in points
-
-        for img_buf, caption in images:
-            # Use ImageReader to get the original image size (w,h)
-            try:
-                img_buf.seek(0)
-                ir = ImageReader(img_buf)
-                img_w, img_h = ir.getSize()  # returns width, height (pixels or units)
-                # preserve aspect ratio: scale width to max_width in points, compute height
-                # treat img_w/img_h as ratio only — set display width to max_width
-                display_w = max_width
-                display_h = (img_h / float(img_w)) * display_w if img_w else display_w * 0.6
-            except Exception:
-                # fallback sizing
-                display_w = max_width
-                display_h = max_width * 0.6
-                img_buf.seek(0)
-
-            # Reset buffer pointer and create ReportLab Image with computed size
-            img_buf.seek(0)
-            rl_image = RLImage(img_buf, width=display_w, height=display_h)
-            story.append(rl_image)
-            story.append(Spacer(1, 6))
-            story.append(Paragraph(caption, styles['Italic']))
-            story.append(Spacer(1, 12))
-
-        if not images:
-            story.append(Paragraph("No plots available to include in the report.", styles['Normal']))
-
-        doc.build(story)
-        pdf_buffer.seek(0)
-        return FileResponse(pdf_buffer, as_attachment=True, filename='employee_data.pdf')
+# ---------- bulk employee import ----------
+@query_budget(4)
+@staff_member_required(login_url='login')
+def employee_import(request):
+    if request.method == 'POST':
+        source = request.FILES.get('source')
+        photos = request.FILES.get('photos')
+        if not source or not source.name.lower().endswith(('.csv', '.xlsx')):
+            messages.error(request, "Please choose a .csv or .xlsx employee file.")
+        elif photos and not photos.name.lower().endswith('.zip'):
+            messages.error(request, "Photos must be uploaded as a .zip archive.")
+        else:
+            job = imports.start_import(request.user, source, photos)
+            messages.success(request, f"Import #{job.pk} queued.")
+        return redirect('employee_import')
 
-    except Exception as e:
-        tb = traceback.format_exc()
-        print("generate_pdf platypus error:", tb)
-        return JsonResponse({'error': str(e), 'trace': tb}, status=500)
+    jobs = EmployeeImport.objects.order_by('-created_at')[:10]
+    active = any(job.status in (EmployeeImport.PENDING, EmployeeImport.RUNNING) for job in jobs)
+    return render(request, 'employee_import.html', {'jobs': jobs, 'active': active})
+
+@staff_member_required(login_url='login')
+def employee_import_errors(request, import_id):
+    job = get_object_or_404(EmployeeImport, pk=import_id)
+    report = job.row_errors or "No row errors."
+    if job.error:
+        report = f"{job.error}\n{report}"
+    return HttpResponse(report, content_type='text/plain; charset=utf-8')
+
+# ---------- helmet violations ----------
+# one more query when the kiosk has not created its table yet (the existence check)
+@query_budget(4)
+@staff_member_required(login_url='login')
+def violation_list(request):
+    employeeid = request.GET.get('employeeid', '').strip()
+    day = parse_date(request.GET.get('date') or '')
+    try:
+        before = int(request.GET.get('before') or 0)
+    except ValueError:
+        before = 0
+    rows, next_before = violations.violation_page(before, employeeid, day)
+    return render(request, 'violations.html', {
+        'rows': rows,
+        'next_before': next_before,
+        'employeeid': employeeid,
+        'date': day,
+    })
 
+@query_budget(4)
+@staff_member_required(login_url='login')
+def violation_snapshot(request, violation_id):
+    path = violations.snapshot_path(violation_id)
+    if path is None:
+        raise Http404("No snapshot for this violation")
+    response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+    # snapshots never change once written
+    response['Cache-Control'] = 'private, max-age=86400, immutable'
+    return response
+
+# ---------- request profiling ----------
+@query_budget(3)
+@staff_member_required(login_url='login')
+def profiling_stats(request):
+    if request.method == 'POST':
+        profiling.reset_stats()
+        return redirect('profiling_stats')
+    return render(request, 'profiling.html', {
+        'rows': profiling.snapshot(),
+        'pid': os.getpid(),
+    })
+
+# ---------- live dashboard counters ----------
+@query_budget(3)
+@staff_member_required(login_url='login')
+async def live_metrics(request):
+    # seeds the counters once per process; streams themselves never query
+    await sync_to_async(live.metrics.start)()
+    if isinstance(request, ASGIRequest):
+        events = live.stream(request.headers.get('Last-Event-ID'))
+    else:
+        # WSGI cannot hold the connection open without a thread per client:
+        # send one snapshot and let EventSource reconnect
+        events = iter([f"retry: 5000\n{live.snapshot_event()}"])
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# ---------- occupancy charts ----------
+@query_budget(4)
+@staff_member_required(login_url='login')
+def occupancy_series(request):
+    from . import timeseries  # numpy, only needed here
+    window = request.GET.get('window', 'hour')
+    if window not in timeseries.WINDOWS:
+        return JsonResponse({'error': f"window must be one of {', '.join(timeseries.WINDOWS)}"}, status=400)
+    camera = request.GET.get('camera', timeseries.SITE)
+    resolution, points = timeseries.series(camera, window)
+    return JsonResponse({
+        'camera': camera,
+        'window': window,
+        'resolution': resolution,
+        # [epoch ms, min, avg, max]
+        'points': points,
+        'cameras': timeseries.cameras(),
+    })
+
+@query_budget(4)
 @staff_member_required(login_url='login')
 def add_performance_review(request):
     if request.method == 'POST':
@@ -355,45 +508,27 @@ def add_performance_review(request):
         return redirect('add_performance_review')
 
     # GET: show form
-    employees = Employee.objects.order_by('employeeid').all()
+    employees = Employee.objects.order_by('employeeid').values('employeeid', 'name')
     return render(request, 'admin_add_review.html', {'employees': employees})
 # ---------------------------
-# Helper: summary statistics
-# ---------------------------
-def calculate_summary_statistics_from_df(df: pd.DataFrame):
-    total_employees = len(df)
-    if 'GENDER' in df.columns:
-        # keep case-insensitive grouping and handle missing
-        gender_counts = df['GENDER'].fillna('UNKNOWN').str.upper().value_counts().to_dict()
-    else:
-        gender_counts = {}
-    return {
-        'total_employees': total_employees,
-        'gender_counts': gender_counts
-    }
-
-# ---------------------------
 # historical_data view
 # ---------------------------
+@query_budget(12)
+@replica_reads
 def historical_data(request):
     try:
-        # If you have the fetch_employee_queryset + df_from_queryset helpers:
-        try:
-            qs = fetch_employee_queryset()
-            df = df_from_queryset(qs)
-        except NameError:
-            # fallback: import model and build dataframe directly
-            from .models import Employee
-            qs = Employee.objects.all().values()
-            df = pd.DataFrame.from_records(qs)
-
-        summary_stats = calculate_summary_statistics_from_df(df)
-
-        # Pass summary and optional sample rows to template
-        sample_rows = df.head(10).to_dict(orient='records') if not df.empty else []
+        # all figures come from the precomputed summary tables (hrapp.summaries)
+        today = timezone.localdate()
+        this_month = today.replace(day=1)
+        summary_stats = summaries.employee_summary()
         context = {
             'summary_stats': summary_stats,
-            'sample_employees': sample_rows,
+            'sample_employees': list(fetch_employee_queryset().order_by('id').values(*EMPLOYEE_VALUE_FIELDS)[:10]),
+            'monthly_attendance': summaries.attendance_rollups(
+                AttendanceRollup.MONTH, (this_month - timedelta(days=365)).replace(day=1)),
+            'daily_attendance': summaries.attendance_rollups(
+                AttendanceRollup.DAY, today - timedelta(days=30)),
+            'department_attendance': summaries.department_attendance(AttendanceRollup.MONTH, this_month),
         }
         return render(request, 'historical_data.html', context)
     except Exception as e:
@@ -414,12 +549,14 @@ def employee_only(view_func):
 #------------------------------------------------------------------
 #                       Employee Related functions
 #------------------------------------------------------------------
+@query_budget(3)
 @employee_only
 def home(request):
     return render(request, 'home.html')
 
 
 # ---------- performance reviews / leave application ----------
+@query_budget(5)
 @employee_only
 def performance_reviews(request):
     # logged-in user identity
@@ -437,6 +574,7 @@ def performance_reviews(request):
         'employee': employee,
         'reviews': reviews
     })
+@query_budget(8)
 @employee_only
 def leave_application(request):
     # Determine the logged-in employee
@@ -451,29 +589,62 @@ def leave_application(request):
     error_message = None
 
     if request.method == 'POST':
-        leave_type = request.POST.get('leave_type')
-        start_date = request.POST.get('start_date')
-        end_date = request.POST.get('end_date')
-        reason = request.POST.get('reason')
+        leave_type = request.POST.get('leave_type', '').strip()
+        start_date = parse_date(request.POST.get('start_date') or '')
+        end_date = parse_date(request.POST.get('end_date') or '')
+        reason = request.POST.get('reason', '').strip()
 
-        try:
-            LeaveApplication.objects.create(
-                employee=employee,
-                leave_type=leave_type,
-                start_date=start_date,
-                end_date=end_date,
-                reason=reason
-            )
-            success = "Leave application submitted successfully!"
-        except Exception as e:
-            error_message = f"An error occurred: {e}"
+        if not (leave_type and start_date and end_date and reason):
+            error_message = "Please fill in the leave type, both dates and a reason."
+        else:
+            try:
+                leave.submit_leave(employee, leave_type, start_date, end_date, reason)
+                success = "Leave application submitted successfully!"
+            except (ValueError, leave.LeaveOverlap) as e:
+                error_message = str(e)
 
     return render(request, 'leave_application.html', {
         'employee': employee,
         'success_message': success,
         'error_message': error_message,
+        'upcoming': leave.upcoming_leave(employee, timezone.localdate()),
+    })
+
+@query_budget(3)
+@staff_member_required(login_url='login')
+@replica_reads
+def leave_calendar(request):
+    # day-by-day grid of who is out; the same data as /data/leave/
+    start, end = leave.default_range()
+    start = parse_date(request.GET.get('start') or '') or start
+    end = parse_date(request.GET.get('end') or '') or end
+    end = min(max(end, start), start + timedelta(days=leave.MAX_CALENDAR_DAYS - 1))
+    department = request.GET.get('department', '').strip()
+    show_pending = request.GET.get('pending') == '1'
+    statuses = (LeaveApplication.APPROVED, LeaveApplication.PENDING) if show_pending else (LeaveApplication.APPROVED,)
+    calendar = leave.leave_calendar(start, end, department or None, statuses)
+
+    # one row per employee on leave, one cell per day
+    rows = {}
+    for item in calendar['leaves']:
+        row = rows.setdefault(item['employeeid'], {'name': item['name'], 'department': item['department'],
+                                                   'leaves': [], 'cells': {}})
+        row['leaves'].append(item)
+        for day in leave.days(max(start, item['start_date']), min(end, item['end_date'])):
+            row['cells'][day] = item
+    dates = [day['date'] for day in calendar['days']]
+    grid = [{**row, 'employeeid': employeeid, 'cells': [row['cells'].get(day) for day in dates]}
+            for employeeid, row in sorted(rows.items(), key=lambda kv: kv[1]['name'])]
+    return render(request, 'leave_calendar.html', {
+        'start': start,
+        'end': end,
+        'department': department,
+        'show_pending': show_pending,
+        'days': calendar['days'],
+        'grid': grid,
     })
 
+@query_budget(6)
 @employee_only
 def self_service(request):
     # logged-in user identity
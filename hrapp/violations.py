@@ -0,0 +1,72 @@
+"""
+Helmet-violation snapshots recorded by the kiosk (``vision.violations``).
+
+The kiosk writes JPEGs under VIOLATION_SNAPSHOT_DIR and one row per
+capture into its raw ``helmet_violations`` table, like it does for
+attendance (see ``hrapp.ingestion``). Pages are read newest first with a
+keyset on id, so page 500 costs the same as page 1. The kiosk records the
+employeeid (its ``name`` column); names are looked up for the page's rows
+in one query. An employeeid filter uses the table's (name, id) index.
+Until the kiosk has run once the table does not exist, and every page is
+empty.
+"""
+import os
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+
+from .ingestion import query_kiosk_table
+from .models import Employee
+
+PAGE_SIZE = 50
+# vision.violations.UNRECOGNIZED (that module needs OpenCV)
+UNRECOGNIZED = "UNRECOGNIZED"
+
+
+def query(sql, params):
+    """Rows from the kiosk's violations table; none while the kiosk has not created it."""
+    return query_kiosk_table(settings.KIOSK_VIOLATIONS_TABLE, sql, params)
+
+
+def violation_page(before=None, employeeid=None, day=None, limit=PAGE_SIZE):
+    """``(rows, next_before)``; rows are dicts, newest first; ``next_before`` is None on the last page."""
+    clauses, params = [], []
+    if before:
+        clauses.append("id < %s")
+        params.append(before)
+    if employeeid:
+        employeeid = employeeid.strip()
+        clauses.append("name = %s")
+        params.append(UNRECOGNIZED if employeeid.upper() == UNRECOGNIZED else employeeid)
+    if day:
+        # the kiosk stores naive local timestamps
+        clauses.append("time >= %s AND time < %s")
+        start = datetime.combine(day, time.min)
+        params += [start, start + timedelta(days=1)]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = query(f"SELECT id, name, camera, time, image FROM {{table}} {where} ORDER BY id DESC LIMIT %s",
+                 params + [limit + 1])
+
+    next_before = rows[limit - 1][0] if len(rows) > limit else None
+    columns = ('id', 'employeeid', 'camera', 'time', 'image')
+    page = [dict(zip(columns, row)) for row in rows[:limit]]
+    employeeids = {row['employeeid'] for row in page} - {UNRECOGNIZED}
+    names = {}
+    if employeeids:
+        names = dict(Employee.objects.filter(employeeid__in=employeeids).values_list('employeeid', 'name'))
+    for row in page:
+        # rows from before the kiosk recorded employeeids hold the name itself
+        row['name'] = names.get(row['employeeid'], row['employeeid'])
+    return page, next_before
+
+
+def snapshot_path(violation_id):
+    """Absolute path of a violation's JPEG, or None if unknown or outside the snapshot directory."""
+    rows = query("SELECT image FROM {table} WHERE id = %s", [violation_id])
+    if not rows:
+        return None
+    root = os.path.realpath(settings.VIOLATION_SNAPSHOT_DIR)
+    path = os.path.realpath(os.path.join(root, rows[0][0]))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
@@ -0,0 +1,51 @@
+"""
+Process-wide executors for the background jobs.
+
+Each module that hands work off the request declares its executors here
+once, at import time, and calls them to get the shared instance:
+
+    get_dispatcher = workers.dispatcher('report-jobs')
+    get_chart_pool = workers.process_pool('REPORT_CHART_WORKERS')
+
+Nothing is started until the first call, so management commands and
+tests that never submit a job never pay for a thread or a worker
+process. Pool sizes are read from settings at that first call.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class Lazy:
+    """Calls ``factory`` once, on first use, and returns the same result after that."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+
+    def __call__(self):
+        with self._lock:
+            if self._value is None:
+                self._value = self._factory()
+            return self._value
+
+
+def dispatcher(name):
+    """One background thread that runs ``name`` jobs in submission order."""
+    return Lazy(lambda: ThreadPoolExecutor(max_workers=1, thread_name_prefix=name))
+
+
+def process_pool(workers_setting, initializer=None, initargs=()):
+    """A process pool with ``settings.<workers_setting>`` workers."""
+    def start():
+        # spawn, not fork: the parent may be a threaded web worker
+        return ProcessPoolExecutor(
+            max_workers=getattr(settings, workers_setting),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=initializer,
+            initargs=initargs,
+        )
+    return Lazy(start)
@@ -0,0 +1,121 @@
+"""
+Per-frame preprocessing for the kiosk, into buffers allocated once.
+
+Every tick needs three views of the camera frame: the YOLO input (an RGB
+letterboxed ``imgsz`` square, scaled to 0-1 and laid out as NCHW), a
+quarter-size RGB image for face detection, and the full BGR frame that
+is drawn on and shown. ``FramePipeline`` keeps one buffer per view and
+fills each with ``dst=``/``out=`` writes:
+
+* the camera decodes straight into the frame buffer (``cap.read(frame)``);
+* the model input is a float32 array shared with a torch tensor, which
+  ultralytics uses as-is and skips its own letterbox and colour
+  conversion; the BGR->RGB swap and HWC->CHW transpose are strided views
+  folded into the 1/255 scaling write;
+* the display QImage wraps the frame buffer without copying.
+
+A pipeline built with ``face_scale=None`` skips the face view (the
+helmet detector in ``vision.inference`` only needs the model input).
+
+Buffers are reallocated only when the camera resolution changes. With
+``reuse=False`` they are rebuilt every frame, which matches the old
+per-frame allocations. ``AllocationMeter`` reports bytes allocated per
+frame, so the two modes can be compared on the same camera.
+"""
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+LETTERBOX_FILL = 114 / 255  # ultralytics' padding grey
+
+
+class FramePipeline:
+    def __init__(self, imgsz=640, face_scale=0.25, reuse=True):
+        self.imgsz = imgsz
+        self.face_scale = face_scale
+        self.reuse = reuse
+        self.shape = None
+        self.allocations = 0
+        self.frame = None
+
+    def allocate(self, shape):
+        import torch
+
+        height, width = shape[:2]
+        self.shape = shape
+        self.allocations += 1
+
+        self.scale = min(self.imgsz / width, self.imgsz / height)
+        self.resized_size = (round(width * self.scale), round(height * self.scale))
+        self.pad_x = (self.imgsz - self.resized_size[0]) // 2
+        self.pad_y = (self.imgsz - self.resized_size[1]) // 2
+        self.resized = np.empty((self.resized_size[1], self.resized_size[0], 3), np.uint8)
+        self.input_array = np.full((1, 3, self.imgsz, self.imgsz), LETTERBOX_FILL, np.float32)
+        self.model_input = torch.from_numpy(self.input_array)
+        # the image area inside the letterbox padding, as a view
+        self.input_area = self.input_array[0, :, self.pad_y:self.pad_y + self.resized_size[1],
+                                           self.pad_x:self.pad_x + self.resized_size[0]]
+
+        if self.face_scale:
+            self.small_size = (int(width * self.face_scale), int(height * self.face_scale))
+            self.small_bgr = np.empty((self.small_size[1], self.small_size[0], 3), np.uint8)
+            self.small_rgb = np.empty_like(self.small_bgr)
+
+    def read(self, cap):
+        """Grab the next camera frame into the frame buffer and prepare every view of it."""
+        ok, frame = cap.read(self.frame if self.reuse else None)
+        if not ok:
+            return False, None
+        self.frame = frame
+        self.prepare(frame)
+        return True, frame
+
+    def prepare(self, frame):
+        if not self.reuse or frame.shape != self.shape:
+            self.allocate(frame.shape)
+
+        cv2.resize(frame, self.resized_size, dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        np.multiply(self.resized[:, :, ::-1].transpose(2, 0, 1), 1 / 255, out=self.input_area)
+
+        if self.face_scale:
+            cv2.resize(frame, self.small_size, dst=self.small_bgr)
+            cv2.cvtColor(self.small_bgr, cv2.COLOR_BGR2RGB, dst=self.small_rgb)
+
+    def to_frame(self, box):
+        """Map an ``(x1, y1, x2, y2)`` box from model-input to frame coordinates."""
+        x1, y1, x2, y2 = box
+        return ((x1 - self.pad_x) / self.scale, (y1 - self.pad_y) / self.scale,
+                (x2 - self.pad_x) / self.scale, (y2 - self.pad_y) / self.scale)
+
+
+class AllocationMeter:
+    """
+    Peak Python-heap bytes allocated during each frame, averaged over
+    ``every`` frames and printed. numpy arrays, including OpenCV outputs,
+    are traced; torch's own allocator is not.
+    """
+
+    def __init__(self, every=100):
+        self.every = every
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        tracemalloc.start()
+
+    def start(self):
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+        self.started = time.perf_counter()
+
+    def stop(self, pipeline=None):
+        self.bytes += tracemalloc.get_traced_memory()[1] - self.base
+        self.seconds += time.perf_counter() - self.started
+        self.frames += 1
+        if self.frames == self.every:
+            buffers = f", {pipeline.allocations} buffer set(s) allocated" if pipeline else ""
+            print(f"[STATS] {self.bytes / self.frames / 1024:.0f} KiB allocated/frame, "
+                  f"{self.seconds * 1000 / self.frames:.1f} ms/frame over {self.frames} frames{buffers}")
+            self.frames = self.bytes = 0
+            self.seconds = 0.0
@@ -0,0 +1,240 @@
+"""
+Kiosk side of the face gallery (format: hrapp.faces, server: hrapp.gallery).
+
+Recognition matches against a ``FaceIndex``. Indexes are never modified in
+place: a refresh builds a new one, and the UI thread swaps it in between
+frames (``GalleryWatcher.take``), so a frame always sees one consistent
+set of encodings and names.
+
+Two sources keep the index current, polled on a background thread:
+
+* ``ServerGallery`` - the HR server's ``/data/faces/``. The last gallery is
+  cached on disk and memory-mapped at startup; after that only entries
+  changed since the cached version are downloaded, and a poll with no
+  changes is a 304. Deleted employees are not in a delta, so when the
+  merged index disagrees with the server's enrolled count the whole
+  gallery is downloaded again.
+* ``ImageFolder`` - a local folder of ``<name>.jpg`` photos. Only files
+  added, changed (size/mtime) or removed since the last scan are encoded.
+"""
+import mmap
+import os
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from hrapp.faces import ENCODING_DIM, pack_gallery, unpack_gallery
+
+
+class FaceIndex:
+    """Row ``i`` of ``encodings`` belongs to ``employeeids[i]`` / ``names[i]``."""
+    __slots__ = ('version', 'employeeids', 'names', 'encodings')
+
+    def __init__(self, version, employeeids, names, encodings):
+        self.version = version
+        self.employeeids = employeeids
+        self.names = names
+        self.encodings = encodings
+
+    @classmethod
+    def empty(cls):
+        import numpy as np
+        return cls(0, [], [], np.empty((0, ENCODING_DIM)))
+
+    def __len__(self):
+        return len(self.employeeids)
+
+    def merge(self, version, employeeids, names, encodings, removed=()):
+        """A new index with ``employeeids`` added or replaced and ``removed`` dropped."""
+        import numpy as np
+        drop = set(employeeids) | set(removed)
+        keep = [i for i, e in enumerate(self.employeeids) if e not in drop]
+        new = np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_DIM)
+        return FaceIndex(
+            version,
+            [self.employeeids[i] for i in keep] + list(employeeids),
+            [self.names[i] for i in keep] + list(names),
+            np.concatenate([self.encodings[keep], new]),
+        )
+
+
+# ---------- server gallery ----------
+def fetch_gallery(url, token, since=0, etag=None, timeout=10):
+    """
+    ``(etag, version, index, encodings)`` for the entries changed after
+    ``since``, or None when the server answers 304 to ``etag``.
+    """
+    headers = {}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    if etag:
+        headers['If-None-Match'] = etag
+    if since:
+        url = f"{url}{'&' if '?' in url else '?'}{urllib.parse.urlencode({'since': since})}"
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as resp:
+            body = resp.read()
+            etag = resp.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+    return (etag, *unpack_gallery(body))
+
+
+def open_gallery(cache_path):
+    """Memory-map a cached gallery as a ``FaceIndex``."""
+    with open(cache_path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    version, index, encodings = unpack_gallery(buffer)
+    return FaceIndex(version, index['employeeids'], index['names'], encodings)
+
+
+def save_gallery(cache_path, index):
+    # write-then-rename so a crash never leaves a half-written gallery
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pack_gallery(index.version, index.employeeids, index.names,
+                             [row.tobytes() for row in index.encodings]))
+    os.replace(tmp_path, cache_path)
+
+
+class ServerGallery:
+    def __init__(self, url, token, cache_path):
+        self.url = url
+        self.token = token
+        self.cache_path = cache_path
+        self.etag = None
+
+    def load(self):
+        """The cached gallery, or an empty index; ``refresh`` brings it up to date."""
+        if os.path.exists(self.cache_path):
+            try:
+                return open_gallery(self.cache_path)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Ignoring unreadable gallery cache {self.cache_path}: {e}")
+        return FaceIndex.empty()
+
+    def refresh(self, index):
+        delta = fetch_gallery(self.url, self.token, since=index.version, etag=self.etag)
+        if delta is None:
+            return None
+        self.etag, version, changes, encodings = delta
+        merged = index.merge(version, changes['employeeids'], changes['names'], encodings, changes['removed'])
+        if len(merged) != changes['enrolled']:
+            # a deleted employee leaves no trace in a delta; start over
+            self.etag, version, changes, encodings = fetch_gallery(self.url, self.token)
+            merged = FaceIndex(version, changes['employeeids'], changes['names'], encodings)
+        elif not changes['employeeids'] and not changes['removed'] and version == index.version:
+            return None
+        try:
+            save_gallery(self.cache_path, merged)
+        except OSError as e:
+            # e.g. the old cache is still mapped on Windows; retried on the next change
+            print(f"[WARN] Could not update gallery cache {self.cache_path}: {e}")
+        print(f"[INFO] Face gallery {version}: {len(changes['employeeids'])} updated, "
+              f"{len(changes['removed'])} removed, {len(merged)} total")
+        return merged
+
+
+# ---------- image folder ----------
+def encode_image(path):
+    """First face encoding in an image file, or None."""
+    import cv2
+    import face_recognition
+
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    encodes = face_recognition.face_encodings(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return encodes[0] if encodes else None
+
+
+class ImageFolder:
+    def __init__(self, path):
+        self.path = path
+        self.seen = {}  # file name -> (mtime_ns, size) at the last scan
+
+    def load(self):
+        return FaceIndex.empty()
+
+    def scan(self):
+        if not os.path.isdir(self.path):
+            return {}
+        files = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def refresh(self, index):
+        files = self.scan()
+        changed = [f for f, signature in files.items() if self.seen.get(f) != signature]
+        removed = [os.path.splitext(f)[0] for f in self.seen if f not in files]
+        if not changed and not removed:
+            return None
+
+        names, encodings = [], []
+        for filename in changed:
+            name = os.path.splitext(filename)[0]
+            encoding = encode_image(os.path.join(self.path, filename))
+            if encoding is None:
+                print(f"[WARN] No face found in image for {name}, skipping")
+                removed.append(name)
+                continue
+            names.append(name)
+            encodings.append(encoding)
+            print(f"[INFO] Registered person: {name}")
+        self.seen = files
+        return index.merge(index.version + 1, names, names, encodings, removed)
+
+
+# ---------- background refresh ----------
+class GalleryWatcher:
+    """
+    Refreshes ``source`` every ``interval`` seconds on a daemon thread. The
+    UI thread calls ``take`` once per frame and swaps in the returned index.
+    """
+
+    def __init__(self, source, index, interval):
+        self.source = source
+        self.latest = index
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='gallery-watcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def refresh_now(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def take(self):
+        """The newest index not yet taken, or None."""
+        with self._lock:
+            index, self._pending = self._pending, None
+        return index
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                index = self.source.refresh(self.latest)
+            except Exception as e:
+                print(f"[WARN] Face gallery refresh failed: {e}")
+            else:
+                if index is not None:
+                    self.latest = index
+                    with self._lock:
+                        self._pending = index
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,308 @@
+"""
+Helmet detection and face recognition for the kiosk, run either
+in-process or in worker processes that read frames from shared memory.
+
+``HelmetDetector`` and ``FaceRecognizer`` each take one BGR camera frame.
+The kiosk can call them on its UI thread, as it always has. With
+KIOSK_INFERENCE_WORKERS it runs them in worker processes instead, so
+decoding, inference and drawing are no longer serialized by the GIL and
+recognition throughput scales with the number of cores.
+
+Frames are never pickled:
+
+* ``FrameRing`` is one shared-memory block of ``slots`` frames, created
+  by the kiosk. The camera decodes straight into a free slot
+  (``cap.read(ring.frames[slot])``).
+* Each worker maps the block once and reads slots as numpy views. The
+  only traffic between processes is a few integers per frame (ring,
+  slot, frame number) going out, and the boxes and names coming back.
+* A slot is handed out again only after every job has answered for its
+  frame and the kiosk has drawn and shown it. While every slot is busy,
+  the kiosk drops camera frames (``cap.grab()``) instead of queueing them.
+
+``InferencePool`` starts ``python -m vision.inference`` subprocesses and
+talks to each over ``multiprocessing.connection``, authenticated with a
+random key. (A ``multiprocessing`` pool would re-run the kiosk script in
+every worker, including its database connection and model loading.)
+Every frame goes to one worker of each job in turn, and results are
+returned in frame order. Several cameras can share one pool, each with
+its own ring.
+"""
+import itertools
+import os
+import secrets
+import socket
+import subprocess
+import sys
+from collections import deque
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener, wait
+
+import numpy as np
+
+from hrapp.faces import ENCODING_DIM
+
+
+# ---------- jobs ----------
+def helmet_class_ids(names):
+    """Classes whose name contains 'helmet', or every class if none does."""
+    ids = [i for i, n in names.items() if "helmet" in str(n).lower()]
+    return ids or list(names.keys())
+
+
+class HelmetDetector:
+    """Helmet boxes ``(x1, y1, x2, y2)`` in frame coordinates."""
+
+    def __init__(self, model_path, conf=0.5, reuse=True):
+        from ultralytics import YOLO
+
+        from .frames import FramePipeline
+
+        self.model = YOLO(model_path)
+        print("Helmet model classes:", self.model.names)
+        self.class_ids = helmet_class_ids(self.model.names)
+        print("Using helmet class ids:", self.class_ids)
+        self.conf = conf
+        self.frames = FramePipeline(face_scale=None, reuse=reuse)
+
+    def __call__(self, frame):
+        self.frames.prepare(frame)
+        return self.detect(self.frames)
+
+    def detect(self, pipeline):
+        """Boxes for the frame a ``FramePipeline`` has just prepared."""
+        boxes = []
+        for result in self.model(pipeline.model_input, conf=self.conf, verbose=False):
+            if result.boxes is None:
+                continue
+            for box in result.boxes:
+                if int(box.cls[0]) in self.class_ids:
+                    x1, y1, x2, y2 = pipeline.to_frame(box.xyxy[0].tolist())
+                    boxes.append((int(x1), int(y1), int(x2), int(y2)))
+        return boxes
+
+
+class FaceRecognizer:
+    """
+    ``[(face box, label or None)]`` for the faces in a frame, with boxes
+    as ``(left, top, right, bottom)`` in frame coordinates. A face gets
+    the label (the kiosk uses employeeids) of the closest gallery encoding
+    when it is within
+    ``tolerance``; faces are found on a ``scale``-size copy.
+    """
+
+    def __init__(self, scale=0.25, tolerance=0.5):
+        self.scale = scale
+        self.tolerance = tolerance
+        self.encodings = np.empty((0, ENCODING_DIM))
+        self.names = []
+        self.shape = None
+
+    def set_gallery(self, encodings, names):
+        self.encodings, self.names = encodings, names
+
+    def __call__(self, frame):
+        import cv2
+
+        if frame.shape != self.shape:
+            self.shape = frame.shape
+            height, width = frame.shape[:2]
+            self.small_size = (int(width * self.scale), int(height * self.scale))
+            self.small_bgr = np.empty((self.small_size[1], self.small_size[0], 3), np.uint8)
+            self.small_rgb = np.empty_like(self.small_bgr)
+        cv2.resize(frame, self.small_size, dst=self.small_bgr)
+        cv2.cvtColor(self.small_bgr, cv2.COLOR_BGR2RGB, dst=self.small_rgb)
+        return self.recognize(self.small_rgb)
+
+    def recognize(self, small_rgb):
+        """Faces in an already reduced RGB image."""
+        import face_recognition
+
+        locations = face_recognition.face_locations(small_rgb)
+        encodings = face_recognition.face_encodings(small_rgb, locations)
+        factor = round(1 / self.scale)
+        faces = []
+        for encoding, (top, right, bottom, left) in zip(encodings, locations):
+            name = None
+            if len(self.encodings):
+                distances = face_recognition.face_distance(self.encodings, encoding)
+                best = int(np.argmin(distances))
+                if distances[best] <= self.tolerance:
+                    name = self.names[best]
+            faces.append(((left * factor, top * factor, right * factor, bottom * factor), name))
+        return faces
+
+
+# ---------- shared frames ----------
+class FrameRing:
+    """``slots`` uint8 frames of ``shape`` in one shared-memory block, owned by the capturing process."""
+
+    def __init__(self, shape, slots=8):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * int(np.prod(self.shape)))
+        self.name = self.shm.name
+        self.frames = np.ndarray((slots, *self.shape), np.uint8, buffer=self.shm.buf)
+        self.free = deque(range(slots))
+
+    def acquire(self):
+        """A free slot, or None while every slot is in flight."""
+        return self.free.popleft() if self.free else None
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def idle(self):
+        return len(self.free) == self.slots
+
+    def close(self):
+        self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a view is still referenced; the mapping goes with it
+        self.shm.unlink()
+
+
+def attach(name, shape, slots):
+    """``(shared memory, frames)`` for a ring created by another process."""
+    shm = shared_memory.SharedMemory(name=name)
+    # attaching registers the block with this process's resource tracker,
+    # which would unlink it when the worker exits; the kiosk owns it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, np.ndarray((slots, *shape), np.uint8, buffer=shm.buf)
+
+
+# ---------- worker processes ----------
+class InferencePool:
+    """
+    Worker processes for ``jobs``, ``{name: (factory, args, processes)}``.
+    Each worker calls ``factory(*args)`` once and then calls the result
+    with a frame for every frame it is sent. Results are pickled back, so
+    they should stay small.
+    """
+
+    def __init__(self, jobs, start_timeout=60):
+        authkey = secrets.token_bytes(32)
+        # bounds the wait for workers to connect, e.g. when one fails to import
+        default_timeout = socket.getdefaulttimeout()
+        socket.setdefaulttimeout(start_timeout)
+        try:
+            self.listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        finally:
+            socket.setdefaulttimeout(default_timeout)
+        host, port = self.listener.address
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, INFERENCE_AUTHKEY=authkey.hex())
+
+        self.processes = [
+            subprocess.Popen([sys.executable, "-m", "vision.inference", f"{host}:{port}"], cwd=root, env=env)
+            for _, _, processes in jobs.values() for _ in range(processes)
+        ]
+        self.workers = {}  # job name -> connections
+        self.jobs = {}     # connection -> job name
+        try:
+            for name, (factory, args, processes) in jobs.items():
+                for _ in range(processes):
+                    connection = self.listener.accept()
+                    connection.send((factory, args))
+                    self.workers.setdefault(name, []).append(connection)
+                    self.jobs[connection] = name
+        except Exception:
+            self.close()
+            raise
+        self.turns = {name: itertools.cycle(connections) for name, connections in self.workers.items()}
+        self.frame_numbers = itertools.count()
+        self.next_frame = 0
+        self.pending = {}  # frame number -> (ring, slot, {job name: result})
+
+    def submit(self, ring, slot):
+        """Queue the frame in ``ring.frames[slot]`` for every job; returns its frame number."""
+        frame_no = next(self.frame_numbers)
+        self.pending[frame_no] = (ring, slot, {})
+        message = ("frame", ring.name, ring.shape, ring.slots, slot, frame_no)
+        for turn in self.turns.values():
+            next(turn).send(message)
+        return frame_no
+
+    def completed(self, timeout=0):
+        """``[(ring, slot, {job name: result})]`` for frames every job has answered, oldest first."""
+        for connection in wait(list(self.jobs), timeout):
+            name = self.jobs[connection]
+            while connection.poll():
+                try:
+                    frame_no, result, error = connection.recv()
+                except EOFError:
+                    raise RuntimeError(f"The {name} worker exited") from None
+                if error:
+                    print(f"{name} worker error:", error)
+                self.pending[frame_no][2][name] = result
+        done = []
+        while self.next_frame in self.pending and len(self.pending[self.next_frame][2]) == len(self.workers):
+            done.append(self.pending.pop(self.next_frame))
+            self.next_frame += 1
+        return done
+
+    def call(self, name, method, *args):
+        """Call ``method(*args)`` on the job in every ``name`` worker (e.g. a new face gallery)."""
+        for connection in self.workers[name]:
+            connection.send(("call", method, args))
+
+    def forget(self, ring):
+        """Let the workers unmap a ring that will not be used again."""
+        for connection in self.jobs:
+            connection.send(("forget", ring.name))
+
+    def close(self):
+        for connection in self.jobs:
+            try:
+                connection.send(("stop",))
+            except OSError:
+                pass
+            connection.close()
+        self.listener.close()
+        for process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def serve(address, authkey):
+    """Worker side of ``InferencePool``: build the job, then answer frames until stopped."""
+    with Client(address, authkey=authkey) as connection:
+        factory, args = connection.recv()
+        job = factory(*args)
+        rings = {}  # ring name -> (shared memory, frames)
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                return
+            kind = message[0]
+            if kind == "frame":
+                _, ring, shape, slots, slot, frame_no = message
+                if ring not in rings:
+                    rings[ring] = attach(ring, shape, slots)
+                try:
+                    result, error = job(rings[ring][1][slot]), None
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+                connection.send((frame_no, result, error))
+            elif kind == "call":
+                _, method, args = message
+                getattr(job, method)(*args)
+            elif kind == "forget":
+                shm = rings.pop(message[1], (None, None))[0]
+                if shm is not None:
+                    try:
+                        shm.close()
+                    except BufferError:
+                        pass
+            elif kind == "stop":
+                return
+
+
+if __name__ == "__main__":
+    host, _, port = sys.argv[1].rpartition(":")
+    serve((host, int(port)), bytes.fromhex(os.environ["INFERENCE_AUTHKEY"]))
@@ -0,0 +1,293 @@
+"""
+Site-wide re-identification of workers across cameras.
+
+Each camera tracks people on its own, so a worker who walks past three
+cameras is three tracks. Cameras send an appearance embedding for each
+confirmed track to one shared ``ReidGallery``. The gallery gives the
+track a global person id: either the id of a matching person seen
+recently anywhere on site, or a new one. Counting distinct ids seen in
+the last few seconds gives deduplicated site occupancy.
+
+The gallery is a preallocated ``capacity x dim`` float32 matrix of
+unit-length embeddings, with parallel arrays for the last sighting time,
+person id and holding camera. All of it is allocated once:
+
+* a new track is matched with one matrix-vector product over every row,
+  so a lookup costs the same few microseconds at 10 or 500 active people;
+* a track that already has an id just blends its embedding into its row
+  (an exponential moving average), with no search;
+* rows not seen for ``ttl`` seconds are evicted with one vectorized
+  mask. When the matrix is full, the least recently seen row is reused;
+* a row currently held by another live track on the same camera is
+  never matched, because two people in one view are not the same person.
+
+The gallery accepts any unit-length embedding of the configured size.
+``appearance_embedding`` is a compact colour descriptor (hue/saturation
+histograms of the upper and lower body, 64 floats) that needs no extra
+model. A learned re-ID network can replace it without changing the
+gallery.
+
+The gallery runs in one process for the whole site (``python -m
+vision.reid``). ``ReidServer`` serves it over
+``multiprocessing.connection``, authenticated with a shared key, and
+``ReidClient`` is the camera side: one round trip per frame for all of
+the frame's tracks.
+"""
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from .violations import iou
+
+HUE_BINS, SATURATION_BINS = 8, 4
+EMBEDDING_DIM = 2 * HUE_BINS * SATURATION_BINS
+
+
+# ---------- embeddings ----------
+def appearance_embedding(frame, box):
+    """
+    Unit-length colour descriptor of the person in ``box`` (x1, y1, x2,
+    y2): square roots of the upper- and lower-half hue/saturation
+    histograms, so the dot product of two embeddings is their
+    Bhattacharyya coefficient. Returns None for an empty box.
+    """
+    import cv2
+
+    height, width = frame.shape[:2]
+    x1, y1, x2, y2 = (int(v) for v in box)
+    x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+    if x2 - x1 < 2 or y2 - y1 < 4:
+        return None
+    hsv = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2HSV)
+    middle = hsv.shape[0] // 2
+    parts = [cv2.calcHist([half], [0, 1], None, [HUE_BINS, SATURATION_BINS], [0, 180, 0, 256])
+             for half in (hsv[:middle], hsv[middle:])]
+    embedding = np.sqrt(np.concatenate(parts).ravel() / max(1, hsv.shape[0] * hsv.shape[1]))
+    norm = np.linalg.norm(embedding)
+    return (embedding / norm).astype(np.float32) if norm else None
+
+
+def body_box(face_box, shape):
+    """Torso and legs below a face box, for cameras that only find faces."""
+    left, top, right, bottom = face_box
+    width, height = right - left, bottom - top
+    frame_height, frame_width = shape[:2]
+    return (max(0, int(left - width / 2)), min(frame_height, int(bottom)),
+            min(frame_width, int(right + width / 2)), min(frame_height, int(bottom + 5 * height)))
+
+
+# ---------- per-camera tracking ----------
+class BoxTracker:
+    """
+    Greedy IoU tracker for one camera. A track is confirmed after
+    ``min_hits`` consecutive frames, and ends when it has not been
+    matched for ``max_age`` seconds.
+    """
+
+    def __init__(self, min_hits=3, max_age=1.0, min_iou=0.3):
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.min_iou = min_iou
+        self.tracks = {}  # track id -> [box, hits, last matched]
+        self.next_id = 1
+
+    def update(self, boxes, now=None):
+        """``(confirmed, ended)``: ``[(track id, box)]`` for this frame and the track ids that ended."""
+        now = time.monotonic() if now is None else now
+        unmatched = dict(self.tracks)
+        confirmed = []
+        for box in boxes:
+            best, best_iou = None, self.min_iou
+            for track_id, (previous, _, _) in unmatched.items():
+                overlap = iou(previous, box)
+                if overlap >= best_iou:
+                    best, best_iou = track_id, overlap
+            if best is None:
+                best = self.next_id
+                self.next_id += 1
+                self.tracks[best] = [box, 0, now]
+            else:
+                del unmatched[best]
+            track = self.tracks[best]
+            track[0], track[1], track[2] = box, track[1] + 1, now
+            if track[1] >= self.min_hits:
+                confirmed.append((best, box))
+        ended = [track_id for track_id, (_, _, seen) in unmatched.items() if now - seen > self.max_age]
+        for track_id in ended:
+            del self.tracks[track_id]
+        return confirmed, ended
+
+
+# ---------- gallery ----------
+class ReidGallery:
+    def __init__(self, dim=EMBEDDING_DIM, capacity=1024, ttl=30.0, threshold=0.85,
+                 momentum=0.2, hold_seconds=2.0, present_seconds=3.0):
+        self.ttl = ttl
+        self.threshold = threshold
+        self.momentum = momentum
+        self.hold_seconds = hold_seconds
+        self.present_seconds = present_seconds
+        self.embeddings = np.zeros((capacity, dim), np.float32)
+        self.last_seen = np.full(capacity, -np.inf)
+        self.person_ids = np.zeros(capacity, np.int64)
+        self.holders = np.full(capacity, -1, np.int32)  # camera code of the track last seen on the row
+        self.active = np.zeros(capacity, bool)
+        self.scores = np.empty(capacity, np.float32)
+        self.tracks = {}   # (camera, track) -> (row, person id)
+        self.cameras = {}  # camera name -> code
+        self.next_id = 1
+        self._lock = threading.Lock()
+
+    def assign(self, camera, tracks, ended=(), now=None):
+        """
+        Global person ids for ``tracks``, a list of ``(track id, embedding)``
+        from one camera frame. ``ended`` lists that camera's finished tracks.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            code = self.cameras.setdefault(camera, len(self.cameras))
+            for track in ended:
+                row, person_id = self.tracks.pop((camera, track), (None, None))
+                if row is not None and self.person_ids[row] == person_id and self.holders[row] == code:
+                    self.holders[row] = -1
+            self.expire(now)
+            return [self.assign_one(code, camera, track, embedding, now) for track, embedding in tracks]
+
+    def assign_one(self, code, camera, track, embedding, now):
+        row, person_id = self.tracks.get((camera, track), (None, None))
+        if row is None or not self.active[row] or self.person_ids[row] != person_id:
+            row = self.match(code, embedding, now)
+            self.tracks[(camera, track)] = (row, self.person_ids[row])
+        else:
+            # a known track: follow changes in appearance (lighting, turning around)
+            blended = self.embeddings[row]
+            blended *= 1 - self.momentum
+            blended += self.momentum * embedding
+            blended /= np.linalg.norm(blended) or 1
+        self.last_seen[row] = now
+        self.holders[row] = code
+        return int(self.person_ids[row])
+
+    def match(self, code, embedding, now):
+        np.matmul(self.embeddings, embedding, out=self.scores)
+        excluded = ~self.active | ((self.holders == code) & (self.last_seen > now - self.hold_seconds))
+        self.scores[excluded] = -np.inf
+        best = int(np.argmax(self.scores))
+        if self.scores[best] >= self.threshold:
+            return best
+        # a free row, or else the least recently seen one
+        row = int(np.argmin(np.where(self.active, self.last_seen, -np.inf)))
+        self.active[row] = True
+        self.embeddings[row] = embedding
+        self.person_ids[row] = self.next_id
+        self.next_id += 1
+        return row
+
+    def expire(self, now):
+        self.active &= self.last_seen > now - self.ttl
+        if len(self.tracks) > 4 * len(self.active):
+            # drop tracks whose row was evicted or reused
+            self.tracks = {key: (row, pid) for key, (row, pid) in self.tracks.items()
+                           if self.active[row] and self.person_ids[row] == pid}
+
+    def occupancy(self, now=None):
+        """Distinct people seen on any camera in the last ``present_seconds``."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return int(np.count_nonzero(self.active & (self.last_seen > now - self.present_seconds)))
+
+
+# ---------- service ----------
+class ReidServer:
+    """
+    Serves one gallery to every camera. Each request is ``(camera, tracks,
+    ended)`` and gets ``(person ids, site occupancy)`` back.
+    """
+
+    def __init__(self, address, authkey, gallery):
+        self.gallery = gallery
+        self.listener = Listener(address, authkey=authkey)
+
+    def serve_forever(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                print("Re-ID connection refused:", e)
+                continue
+            threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    camera, tracks, ended = connection.recv()
+                except (EOFError, OSError):
+                    return
+                ids = self.gallery.assign(camera, tracks, ended)
+                connection.send((ids, self.gallery.occupancy()))
+
+
+class ReidClient:
+    """
+    Camera side of ``ReidServer``. ``assign`` returns ``(person ids, site
+    occupancy)``, or None while the service is unreachable or slow: the
+    camera carries on, and reconnects at most every ``retry_seconds``.
+    """
+
+    def __init__(self, address, authkey, camera, timeout=0.05, retry_seconds=5.0):
+        self.address = address
+        self.authkey = authkey
+        self.camera = camera
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.connection = None
+        self.last_attempt = -retry_seconds
+
+    def assign(self, tracks, ended=()):
+        if self.connection is None:
+            now = time.monotonic()
+            if now - self.last_attempt < self.retry_seconds:
+                return None
+            self.last_attempt = now
+            try:
+                self.connection = Client(self.address, authkey=self.authkey)
+            except (OSError, AuthenticationError) as e:
+                print("Re-ID service unavailable:", e)
+                return None
+        try:
+            self.connection.send((self.camera, tracks, list(ended)))
+            if self.connection.poll(self.timeout):
+                return self.connection.recv()
+            print("Re-ID service too slow; reconnecting")
+        except (EOFError, OSError) as e:
+            print("Re-ID service error:", e)
+        # a late reply would be read as the answer to the next request
+        self.close()
+        return None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+if __name__ == "__main__":
+    address = parse_address(os.environ.get("REID_ADDRESS", "127.0.0.1:6010"))
+    authkey = os.environ["REID_AUTHKEY"].encode()
+    gallery = ReidGallery(
+        capacity=int(os.environ.get("REID_CAPACITY", "1024")),
+        ttl=float(os.environ.get("REID_TTL_SECONDS", "30")),
+        threshold=float(os.environ.get("REID_THRESHOLD", "0.85")),
+    )
+    print(f"Re-ID gallery listening on {address[0]}:{address[1]}")
+    ReidServer(address, authkey, gallery).serve_forever()
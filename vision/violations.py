@@ -0,0 +1,180 @@
+"""
+Helmet-violation evidence captured by the kiosk.
+
+``ViolationRecorder.report`` runs in the frame loop, so it does only
+cheap work:
+
+* it debounces: a recognized worker is recorded at most once per
+  ``repeat_seconds``. An unrecognized face is tracked by its box (IoU
+  against recent sightings), so one stranger does not fill the disk;
+* ``flush`` then copies the frame once into a preallocated snapshot
+  buffer (the frame buffer is reused on the next tick) and hands it to a
+  small thread pool, however many violations the frame holds.
+
+Cropping, JPEG encoding (``cv2.imencode`` releases the GIL), the file
+write and the metadata insert all happen on the pool. When every
+snapshot buffer is still in use, the frame's captures are dropped and
+counted rather than waited for, so a burst never backs up into the frame
+loop.
+
+Violations are keyed by employeeid (or UNRECOGNIZED), not by display
+name: two workers can share a name, and the HR app resolves the current
+name when it renders the page.
+
+Files are written to ``<directory>/YYYY/MM/DD/HHMMSS_<camera>_<name>_<n>.jpg``.
+Each one gets a row in the ``helmet_violations`` table, which stores the
+path relative to ``directory``. The HR app pages through that table
+(``hrapp.violations``).
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+UNRECOGNIZED = "UNRECOGNIZED"
+TRACK_IOU = 0.3
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS helmet_violations (
+    id SERIAL PRIMARY KEY,
+    -- the employeeid, or UNRECOGNIZED
+    name TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    time TIMESTAMP NOT NULL,
+    image TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS helmet_violations_time_idx ON helmet_violations (time);
+CREATE INDEX IF NOT EXISTS helmet_violations_name_idx ON helmet_violations (name, id);
+"""
+
+
+def iou(a, b):
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def evidence_box(face_box, shape):
+    """The face box widened to take in the head, shoulders and any helmet above it."""
+    left, top, right, bottom = face_box
+    width, height = right - left, bottom - top
+    frame_height, frame_width = shape[:2]
+    return (max(0, int(left - width)), max(0, int(top - height)),
+            min(frame_width, int(right + width)), min(frame_height, int(bottom + 2 * height)))
+
+
+class ViolationRecorder:
+    def __init__(self, directory, connect, camera, repeat_seconds=60, workers=2, buffers=4, quality=85):
+        self.directory = directory
+        self.camera = camera
+        self.repeat_seconds = repeat_seconds
+        self.quality = quality
+        self.last_seen = {}  # name -> monotonic time of the last capture
+        self.tracks = []     # [box, monotonic time] of recent unrecognized captures
+        self.batch = []      # captures reported during the current frame
+        self.free = []       # frame snapshot buffers not in use by the pool
+        self.buffers = buffers
+        self.allocated = 0
+        self.dropped = 0
+        self.sequence = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='violations')
+        # the pool's own connection; the frame loop's cursor is never shared
+        self._conn = connect()
+        self._db_lock = threading.Lock()
+
+    def is_new(self, name, box, now):
+        if name != UNRECOGNIZED:
+            if now - self.last_seen.get(name, -self.repeat_seconds) < self.repeat_seconds:
+                return False
+            self.last_seen[name] = now
+            return True
+        self.tracks = [t for t in self.tracks if now - t[1] < self.repeat_seconds]
+        for track in self.tracks:
+            if iou(track[0], box) >= TRACK_IOU:
+                track[0] = box  # follow the face as it moves
+                return False
+        self.tracks.append([box, now])
+        return True
+
+    def report(self, name, face_box):
+        """Queue a violation for this frame unless it repeats a recent one; True if queued."""
+        if not self.is_new(name, face_box, time.monotonic()):
+            return False
+        self.sequence += 1
+        self.batch.append((name, face_box, datetime.now(), self.sequence))
+        return True
+
+    def flush(self, frame):
+        """
+        Hand this frame's captures to the pool. Call once per frame, before
+        anything is drawn on it: the frame is copied into a snapshot buffer
+        (one copy however many violations), cropped and encoded off-thread.
+        """
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        with self._lock:
+            buffer = self.free.pop() if self.free else None
+            if buffer is None and self.allocated < self.buffers:
+                self.allocated += 1
+                buffer = np.empty_like(frame)
+            if buffer is None:
+                # every buffer is still being encoded: drop rather than wait
+                self.dropped += len(batch)
+                return
+        if buffer.shape != frame.shape:
+            buffer = np.empty_like(frame)
+        np.copyto(buffer, frame)
+        self._pool.submit(self.store, buffer, batch)
+
+    def store(self, snapshot, batch):
+        rows = []
+        try:
+            for name, face_box, seen_at, sequence in batch:
+                x1, y1, x2, y2 = evidence_box(face_box, snapshot.shape)
+                ok, jpeg = cv2.imencode(".jpg", snapshot[y1:y2, x1:x2], [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not ok:
+                    print(f"Violation capture error: JPEG encoding failed for {name}")
+                    continue
+                safe_name = re.sub(r"[^A-Za-z0-9_-]+", "-", name)[:40]
+                relative = "/".join([
+                    f"{seen_at:%Y}", f"{seen_at:%m}", f"{seen_at:%d}",
+                    f"{seen_at:%H%M%S}_{self.camera}_{safe_name}_{sequence}.jpg",
+                ])
+                path = os.path.join(self.directory, *relative.split("/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(jpeg.tobytes())
+                rows.append((name, self.camera, seen_at, relative))
+        except Exception as e:
+            print("Violation capture error:", e)
+        finally:
+            with self._lock:
+                self.free.append(snapshot)
+        if rows:
+            self.insert(rows)
+
+    def insert(self, rows):
+        with self._db_lock:
+            try:
+                with self._conn.cursor() as cursor:
+                    cursor.executemany(
+                        "INSERT INTO helmet_violations (name, camera, time, image) VALUES (%s, %s, %s, %s);",
+                        rows,
+                    )
+                self._conn.commit()
+            except Exception as e:
+                print("Violation capture error:", e)
+                self._conn.rollback()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self._conn.close()